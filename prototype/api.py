@@ -1,68 +1,317 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Blueprint, Flask, current_app, request, jsonify, render_template, Response, stream_with_context
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 import os
 import json
+import tempfile
 from datetime import datetime
-from parser import parse_netscape_bookmarks
-from chrome_parser import parse_chrome_bookmarks
-from env_scan_v2 import get_browser_profiles
-from database import db, Bookmark, SyncBatch, PendingChange, Tag, BookmarkHistory
+from database import db, Bookmark, SyncBatch, PendingChange, Tag, BookmarkHistory, SyncState, Folder, bookmark_tags
+import search_index
+import migrations
+from url_normalizer import normalize_url
+import diff_engine
+import batch_commit
+import bulk_upload
+import duplicates
+import folders
+import tag_facets
+import bulk_tags
+import batch_review
+import response_cache
+import storage
+import history
+import jobs
+import logs
+import metrics
+import slow_queries
 
-# ... (Previous code)
+from config import Config
 
+# Routes live on a blueprint; create_app() builds an app around it. Parsers and
+# readers are imported where they are used, and schema setup (create_all plus
+# migrations) is a separate step: init_schema(), `flask --app api init-db`,
+# the dev server below or once in serve.py's master process - never per worker.
+bp = Blueprint('api', __name__)
 
-from config import Config
+log = logs.get_logger("api")
+
+
+def create_app(config=None):
+    """A configured app: Config, then any overrides in `config` (a dict)."""
+    app = Flask(__name__, template_folder='.')
+    app.config.from_object(Config)
+    app.config.update(config or {})
+
+    logs.init_app(app) # First, so setup below is logged too
+    db.init_app(app)
+    storage.init_app(app)
+    response_cache.init_app(app)
+    metrics.init_app(app)
+    slow_queries.init_app(app)
+    jobs.manager.init_app(app)
+    app.register_blueprint(bp)
+    CORS(app)
+
+    @app.cli.command("init-db")
+    def init_db():
+        """Creates missing tables and applies migrations."""
+        init_schema(app)
 
-app = Flask(__name__, template_folder='.')
-app.config.from_object(Config)
+    return app
 
-from database import db
-db.init_app(app)
 
-with app.app_context():
-    if app.config['FLASK_ENV'] != 'testing':
+def init_schema(app):
+    """Creates missing tables; migrations run from create_all's after_create hook."""
+    with app.app_context():
         db.create_all()
 
-CORS(app)
 
-@app.route('/')
-@app.route('/dashboard')
+def __getattr__(name):
+    # `from api import app` (tests, benchmarks, `flask --app api`): a default
+    # app, built on first access rather than at import
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@bp.route('/')
+@bp.route('/dashboard')
 def dashboard():
     return render_template('dashboard.html')
 
-@app.route('/onboarding')
+@bp.route('/onboarding')
 def onboarding():
     return render_template('index.html')
 
-@app.route('/tools')
+@bp.route('/tools')
 def tools():
     return render_template('tools.html')
 
-@app.route('/audit-history')
+@bp.route('/audit-history')
 def audit_history():
     return render_template('history.html')
 
-# ... (Previous code)
 BOOKMARKS_DB = [
     {"title": "Documentation Hub", "url": "/docs/", "source": "System"}
 ]
 
-def save_history(bookmark):
-    """Saves a snapshot of the current bookmark state to history."""
-    history = BookmarkHistory(
-        bookmark_id=bookmark.id,
-        version=bookmark.version,
-        url=bookmark.url,
-        title=bookmark.title,
-        folder_path=bookmark.folder_path
+def run_firefox_sync(profile_path, incremental=False):
+    """
+    Reads a Firefox profile and stages a review batch.
+    With `incremental`, only items changed since the last committed sync of
+    this profile are read (falls back to a full read without a usable mark).
+    Shared by /sync_firefox and the 'sync_firefox' background job.
+    """
+    from firefox_reader import get_firefox_bookmarks, get_firefox_changes
+    places_path = os.path.join(profile_path, "places.sqlite")
+    state = SyncState.query.filter_by(profile_path=profile_path).first()
+    since = state.high_water_mark if state and incremental else None
+    # Nothing is written until the diff: hand the writer connection back for the read
+    db.session.close()
+
+    # 1. Read Incoming Data (The Feed)
+    jobs.report("read")
+    with metrics.sync_stage("firefox", "read"):
+        if since is not None:
+            result = jobs.offload(get_firefox_changes, places_path, since)
+            # The profile was replaced or restored: marks went backwards, rescan fully
+            if result["metadata"]["high_water_mark"] < since:
+                since = None
+        if since is None:
+            result = jobs.offload(get_firefox_bookmarks, places_path)
+    incoming_bookmarks = result["bookmarks"]
+    metadata = result["metadata"]
+    
+    # 2. Diff against existing firefox bookmarks and stage the batch
+    jobs.report("diff", 0, len(incoming_bookmarks))
+    batch, change_counts = diff_engine.stage_sync(
+        "firefox_incremental" if since is not None else "firefox_manual", "firefox%", incoming_bookmarks,
+        incremental=since is not None, live_urls=result.get("live_urls")
+    )
+    batch.rows_read = metadata["processed"]
+
+    # 3. Remember the mark this batch covers; it becomes the base once committed
+    state = SyncState.query.filter_by(profile_path=profile_path).first()
+    if state is None:
+        state = SyncState(source="firefox", profile_path=profile_path)
+        db.session.add(state)
+    state.pending_mark = metadata["high_water_mark"]
+    state.pending_batch_id = batch.id
+    if change_counts["total_changes"] == 0:
+        SyncState.promote(batch.id)
+    db.session.commit()
+    metrics.count_rows("firefox", read=batch.rows_read, new=batch.rows_new, updated=batch.rows_updated,
+                       deleted=batch.rows_deleted)
+    
+    # Build count report
+    counts = {
+        "mode": "incremental" if since is not None else "full",
+        "source_total": metadata["source_total"],
+        "tags_filtered": metadata.get("tags_filtered", 0),
+        "invalid_urls": metadata.get("invalid_urls", 0),
+        "processed": metadata["processed"],
+        **change_counts
+    }
+    
+    # Verify count integrity (full reads only; incremental reads are partial by design)
+    warnings = []
+    expected_processed = metadata["source_total"] - metadata.get("tags_filtered", 0) - metadata.get("invalid_urls", 0)
+    if since is None and metadata["processed"] != expected_processed:
+        warnings.append(f"Count mismatch: Expected {expected_processed} processed, got {metadata['processed']}")
+    
+    # Log to server for debugging
+    log.info("[SYNC VERIFICATION] Firefox: %s", counts)
+    if warnings:
+        log.warning("[SYNC WARNING] %s", warnings)
+    
+    return {"batch_id": batch.id, "counts": counts, "warnings": warnings}
+
+def run_chrome_sync(profile_path):
+    """
+    Reads a Chrome profile's 'Bookmarks' JSON and stages a review batch.
+    Shared by /sync_chrome and the 'sync_chrome' background job.
+    """
+    from chrome_parser import parse_chrome_bookmarks, spool_chrome_bookmarks, read_spool, STREAM_THRESHOLD
+    bookmarks_file = os.path.join(profile_path, "Bookmarks")
+    if not os.path.exists(bookmarks_file):
+        raise FileNotFoundError("Bookmarks file not found")
+
+    # 1. Read Incoming Data (before touching the database writer)
+    jobs.report("read")
+    spool_path = None
+    try:
+        if os.path.getsize(bookmarks_file) >= STREAM_THRESHOLD:
+            # Large files are streamed to a spool file instead of held in memory;
+            # the diff engine's feed is then loaded from it
+            with tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False) as spool:
+                spool_path = spool.name
+            with metrics.sync_stage("chrome", "parse"):
+                metadata = jobs.offload(spool_chrome_bookmarks, bookmarks_file, spool_path)
+            incoming_bookmarks = read_spool(spool_path)
+        else:
+            with metrics.sync_stage("chrome", "parse"):
+                result = jobs.offload(parse_chrome_bookmarks, bookmarks_file)
+            incoming_bookmarks = result["bookmarks"]
+            metadata = result["metadata"]
+
+        # 2. Diff against existing chrome bookmarks and stage the batch
+        jobs.report("diff")
+        batch, change_counts = diff_engine.stage_sync("chrome_manual", "chrome%", incoming_bookmarks)
+    finally:
+        if spool_path:
+            os.remove(spool_path)
+    batch.rows_read = metadata["processed"]
+    db.session.commit()
+    metrics.count_rows("chrome", read=batch.rows_read, new=batch.rows_new, updated=batch.rows_updated,
+                       deleted=batch.rows_deleted)
+    
+    # Build count report
+    counts = {
+        "source_total": metadata["source_total"],
+        "processed": metadata["processed"],
+        **change_counts
+    }
+    
+    # Verify count integrity
+    warnings = []
+    if metadata["processed"] != metadata["source_total"]:
+        warnings.append(f"Count mismatch: Source has {metadata['source_total']} bookmarks, but only {metadata['processed']} were processed")
+    if "error" in metadata:
+        warnings.append(f"Parser error: {metadata['error']}")
+    
+    # Log to server for debugging
+    log.info("[SYNC VERIFICATION] Chrome: %s", counts)
+    if warnings:
+        log.warning("[SYNC WARNING] %s", warnings)
+    
+    return {"batch_id": batch.id, "counts": counts, "warnings": warnings}
+
+def run_commit(batch_id, change_ids=None):
+    """
+    Applies selected (or all) changes of a pending batch.
+    Shared by /sync/commit and the 'commit' background job.
+    """
+    batch = db.session.get(SyncBatch, batch_id)
+    if batch is None:
+        raise LookupError(f"Batch {batch_id} not found")
+    if batch.status != 'pending_review':
+        raise ValueError("Batch already processed")
+
+    log.info("[SYNC COMMIT] Processing batch #%s...", batch.id)
+
+    # Progress is reported once per committed chunk
+    def report(done, total):
+        log.info("[SYNC COMMIT] Processed %s/%s changes...", done, total)
+        jobs.report("commit", done, total)
+
+    source = metrics.source_label(batch.source)
+    with metrics.sync_stage(source, "commit"):
+        count, remaining_count = batch_commit.commit_changes(batch, change_ids, progress=report)
+    
+    log.info("[SYNC COMMIT] Finalizing %s changes...", count)
+    batch.rows_committed = (batch.rows_committed or 0) + count
+    
+    # If all changes are gone, mark batch as committed
+    if remaining_count == 0:
+        batch.status = 'committed'
+        batch.completed_at = datetime.utcnow()
+        SyncState.promote(batch.id)
+        
+    db.session.commit()
+    metrics.count_rows(source, committed=count)
+    return {"count": count, "remaining": remaining_count}
+
+def run_duplicates(near=True, cross_source=False, stage=False):
+    """
+    Scans the whole library for duplicate groups. With `stage`, the groups are
+    proposed as a 'merge' review batch. Shared by /duplicates and the 'duplicates' job.
+    """
+    jobs.report("read")
+    with storage.read_only(): # The scan below is CPU-bound: don't hold the writer through it
+        rows = duplicates.load_rows()
+    jobs.report("match", 0, len(rows))
+    groups = duplicates.find_duplicates(rows, near=near, cross_source=cross_source)
+    summary = duplicates.summarize(groups)
+    log.info("[DUPLICATES] %s bookmarks scanned: %s groups, %s exact and %s near duplicates",
+             len(rows), summary['groups'], summary['exact'], summary['near'])
+    if not stage:
+        return {"summary": summary, "groups": groups}
+
+    if not groups:
+        return {"batch_id": None, "summary": summary}
+    jobs.report("stage", 0, summary["duplicates"])
+    batch, summary = duplicates.propose_merges(groups)
+    db.session.commit()
+    return {"batch_id": batch.id, "summary": summary}
+
+def run_duplicates_report(near=True, cross_source=False):
+    """
+    GET /duplicates' report, built by the 'duplicates_report' job: the summary
+    plus the first duplicates.REPORT_GROUPS groups, tagged with the library
+    version read before the scan (a result for an older version is stale).
+    """
+    with storage.read_only():
+        version = response_cache.version()
+    result = run_duplicates(near, cross_source)
+    return {"version": version, "summary": result["summary"], "groups": result["groups"][:duplicates.REPORT_GROUPS]}
+
+def run_history_compaction(keep_versions=None, keep_days=None, tombstone_days=None):
+    """
+    History retention and compaction for the 'history_compact' job. Limits
+    default to the HISTORY_* settings (0 = keep everything).
+    """
+    config = current_app.config
+    return history.compact(
+        keep_versions=config['HISTORY_KEEP_VERSIONS'] if keep_versions is None else keep_versions,
+        keep_days=config['HISTORY_KEEP_DAYS'] if keep_days is None else keep_days,
+        tombstone_days=config['HISTORY_TOMBSTONE_DAYS'] if tombstone_days is None else tombstone_days
     )
-    db.session.add(history)
 
-@app.route('/sync_firefox', methods=['POST'])
+@bp.route('/sync_firefox', methods=['POST'])
 def sync_firefox():
     """
     Smart Sync: Reads Firefox SQLite and stages changes based on Diff Logic.
+    Pass {"incremental": true} to only read items changed since the last committed sync.
     Ref: docs/arch/sync_logic.md
     """
     data = request.json
@@ -71,109 +320,12 @@ def sync_firefox():
         return jsonify({"status": "error", "message": "Missing profile path"}), 400
         
     try:
-        from firefox_reader import get_firefox_bookmarks
-        # 1. Read Incoming Data (The Feed)
-        result = get_firefox_bookmarks(os.path.join(profile_path, "places.sqlite"))
-        incoming_bookmarks = result["bookmarks"]
-        metadata = result["metadata"]
-        
-        # 2. Fetch Existing State for this Source
-        # We only compare against bookmarks from 'firefox' to ensure safety
-        existing_query = Bookmark.query.filter(Bookmark.source_browser.ilike('firefox%'))
-        existing_map = {b.url: b for b in existing_query.all()}
-        
-        # 3. Create Batch
-        batch = SyncBatch(source="firefox_manual", status="pending_review")
-        db.session.add(batch)
-        db.session.commit()
-        
-        changes = []
-        incoming_urls = set()
-        
-        for bm in incoming_bookmarks:
-            url = bm['url']
-            
-            # De-duplication: Only process the first occurrence of a URL from the source
-            if url in incoming_urls:
-                continue
-            incoming_urls.add(url)
-            
-            # Case A: NEW (URL not found)
-            if url not in existing_map:
-                changes.append(PendingChange(
-                    batch_id=batch.id,
-                    change_type="new",
-                    diff_blob=json.dumps(bm)
-                ))
-            else:
-                # Case B: EXISTING (Check for Updates)
-                existing = existing_map[url]
-                # Check for metadata drift (Title or Folder)
-                if existing.title != bm['title'] or existing.folder_path != bm['folder']:
-                    print(f"DEBUG MISMATCH: ID={existing.id} | Title: '{existing.title}' vs '{bm['title']}' | Folder: '{existing.folder_path}' vs '{bm['folder']}'")
-                    changes.append(PendingChange(
-                        batch_id=batch.id,
-                        change_type="update",
-                        bookmark_id=existing.id,
-                        diff_blob=json.dumps({
-                            "old": {"title": existing.title, "folder": existing.folder_path},
-                            "new": bm
-                        })
-                    ))
-                # Else: Match -> Ignore
-                
-        # Case C: MISSING (Soft Delete)
-        # Verify source matches to avoid deleting Chrome items
-        for url, existing in existing_map.items():
-            if url not in incoming_urls:
-                # Only flag if it's currently marked as 'synced'
-                if existing.status != 'absent_on_source':
-                    changes.append(PendingChange(
-                        batch_id=batch.id,
-                        change_type="mark_deleted",
-                        bookmark_id=existing.id,
-                        diff_blob=json.dumps({"title": existing.title, "url": existing.url})
-                    ))
-
-        if changes:
-            db.session.bulk_save_objects(changes)
-            db.session.commit()
-        
-        # Count verification
-        new_count = sum(1 for c in changes if c.change_type == "new")
-        update_count = sum(1 for c in changes if c.change_type == "update")
-        delete_count = sum(1 for c in changes if c.change_type == "mark_deleted")
-        
-        # Build count report
-        counts = {
-            "source_total": metadata["source_total"],
-            "tags_filtered": metadata.get("tags_filtered", 0),
-            "invalid_urls": metadata.get("invalid_urls", 0),
-            "processed": metadata["processed"],
-            "new": new_count,
-            "updated": update_count,
-            "to_delete": delete_count,
-            "total_changes": len(changes)
-        }
-        
-        # Verify count integrity
-        warnings = []
-        expected_processed = metadata["source_total"] - metadata.get("tags_filtered", 0) - metadata.get("invalid_urls", 0)
-        if metadata["processed"] != expected_processed:
-            warnings.append(f"Count mismatch: Expected {expected_processed} processed, got {metadata['processed']}")
-        
-        # Log to server for debugging
-        print(f"[SYNC VERIFICATION] Firefox: {counts}")
-        if warnings:
-            print(f"[SYNC WARNING] {warnings}")
-        
-        return jsonify({"status": "success", "batch_id": batch.id, "counts": counts, "warnings": warnings})
-
+        return jsonify({"status": "success", **run_firefox_sync(profile_path, bool(data.get('incremental')))})
     except Exception as e:
         db.session.rollback()
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/sync_chrome', methods=['POST'])
+@bp.route('/sync_chrome', methods=['POST'])
 def sync_chrome():
     """
     Smart Sync for Chrome: Reads 'Bookmarks' JSON and stages changes.
@@ -185,148 +337,68 @@ def sync_chrome():
         return jsonify({"status": "error", "message": "Missing profile path"}), 400
         
     try:
-        from chrome_parser import parse_chrome_bookmarks
-        bookmarks_file = os.path.join(profile_path, "Bookmarks")
-        if not os.path.exists(bookmarks_file):
-             return jsonify({"status": "error", "message": "Bookmarks file not found"}), 404
-
-        # 1. Read Incoming Data
-        result = parse_chrome_bookmarks(bookmarks_file)
-        incoming_bookmarks = result["bookmarks"]
-        metadata = result["metadata"]
-        
-        # 2. Fetch Existing State for this Source
-        # Compare against 'chrome%' source_browser
-        existing_query = Bookmark.query.filter(Bookmark.source_browser.ilike('chrome%'))
-        existing_map = {b.url: b for b in existing_query.all()}
-        
-        # 3. Create Batch
-        batch = SyncBatch(source="chrome_manual", status="pending_review")
-        db.session.add(batch)
-        db.session.commit()
-        
-        changes = []
-        incoming_urls = set()
-        
-        for bm in incoming_bookmarks:
-            url = bm['url']
-            
-            # De-duplication
-            if url in incoming_urls:
-                continue
-            incoming_urls.add(url)
-            
-            # Case A: NEW
-            if url not in existing_map:
-                changes.append(PendingChange(
-                    batch_id=batch.id,
-                    change_type="new",
-                    diff_blob=json.dumps(bm)
-                ))
-            else:
-                # Case B: EXISTING (Update)
-                existing = existing_map[url]
-                if existing.title != bm['title'] or existing.folder_path != bm['folder']:
-                     changes.append(PendingChange(
-                        batch_id=batch.id,
-                        change_type="update",
-                        bookmark_id=existing.id,
-                        diff_blob=json.dumps({
-                            "old": {"title": existing.title, "folder": existing.folder_path},
-                            "new": bm
-                        })
-                    ))
-        
-        # Case C: MISSING (Soft Delete)
-        for url, existing in existing_map.items():
-            if url not in incoming_urls:
-                if existing.status != 'absent_on_source':
-                    changes.append(PendingChange(
-                        batch_id=batch.id,
-                        change_type="mark_deleted",
-                        bookmark_id=existing.id,
-                        diff_blob=json.dumps({"title": existing.title, "url": existing.url})
-                    ))
-
-        if changes:
-            db.session.bulk_save_objects(changes)
-            db.session.commit()
-        
-        # Count verification
-        new_count = sum(1 for c in changes if c.change_type == "new")
-        update_count = sum(1 for c in changes if c.change_type == "update")
-        delete_count = sum(1 for c in changes if c.change_type == "mark_deleted")
-        
-        # Build count report
-        counts = {
-            "source_total": metadata["source_total"],
-            "processed": metadata["processed"],
-            "new": new_count,
-            "updated": update_count,
-            "to_delete": delete_count,
-            "total_changes": len(changes)
-        }
-        
-        # Verify count integrity
-        warnings = []
-        if metadata["processed"] != metadata["source_total"]:
-            warnings.append(f"Count mismatch: Source has {metadata['source_total']} bookmarks, but only {metadata['processed']} were processed")
-        if "error" in metadata:
-            warnings.append(f"Parser error: {metadata['error']}")
-        
-        # Log to server for debugging
-        print(f"[SYNC VERIFICATION] Chrome: {counts}")
-        if warnings:
-            print(f"[SYNC WARNING] {warnings}")
-        
-        return jsonify({"status": "success", "batch_id": batch.id, "counts": counts, "warnings": warnings})
-
+        return jsonify({"status": "success", **run_chrome_sync(profile_path)})
+    except FileNotFoundError as e:
+        return jsonify({"status": "error", "message": str(e)}), 404
     except Exception as e:
         db.session.rollback()
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/api/history', methods=['GET'])
+@bp.route('/api/history', methods=['GET'])
+@response_cache.cached
 def get_all_history():
-    """Returns a global feed of recent bookmark changes."""
-    history = BookmarkHistory.query.order_by(BookmarkHistory.created_at.desc()).limit(100).all()
+    """Returns a global feed of recent bookmark changes (?limit=, default 100)."""
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
     return jsonify({
         "status": "success",
-        "history": [h.to_dict() for h in history]
+        "history": history.recent(limit)
     })
 
-@app.route('/sync/batches', methods=['GET'])
+@bp.route('/sync/batches', methods=['GET'])
+@response_cache.cached
 def get_pending_batches():
-    """Returns any batches waiting for review."""
-    batches = SyncBatch.query.filter_by(status='pending_review').all()
-    return jsonify({
-        "status": "success",
-        "batches": [{
-            "id": b.id,
-            "source": b.source,
-            "created_at": b.created_at,
-            "count": PendingChange.query.filter_by(batch_id=b.id).count()
-        } for b in batches]
-    })
+    """Returns any batches waiting for review, with total and per-type change counts."""
+    return jsonify({"status": "success", "batches": batch_review.pending_batches()})
 
-@app.route('/sync/batch/<int:batch_id>', methods=['GET'])
+@bp.route('/sync/batch/<int:batch_id>', methods=['GET'])
 def get_batch_details(batch_id):
-    """Returns full details and changes for a specific batch."""
+    """
+    Returns a batch with its per-type counts and one page of its changes (by id).
+    type=<new|update|mark_deleted|merge> filters the changes; pass next_cursor
+    as cursor for the following page. limit defaults to 200 (max 5000).
+    """
     batch = SyncBatch.query.get_or_404(batch_id)
+    change_type = request.args.get('type')
+    if change_type and change_type not in batch_review.CHANGE_TYPES:
+        return jsonify({"status": "error", "message": f"Unknown change type: {change_type}"}), 400
+    cursor = request.args.get('cursor')
+    if cursor:
+        if not cursor.isdigit():
+            return jsonify({"status": "error", "message": "Invalid cursor"}), 400
+        cursor = int(cursor)
+    limit = min(max(request.args.get('limit', batch_review.PAGE_SIZE, type=int), 1), batch_review.MAX_PAGE_SIZE)
+
+    counts = batch_review.change_counts([batch.id]).get(batch.id, {})
+    changes, next_cursor = batch_review.page_changes(batch.id, change_type, cursor, limit)
     return jsonify({
         "status": "success",
         "batch": {
             "id": batch.id,
             "source": batch.source,
+            "status": batch.status,
             "created_at": batch.created_at,
-            "changes": [{
-                "id": c.id,
-                "type": c.change_type,
-                "diff": c.get_diff()
-            } for c in batch.changes]
+            "completed_at": batch.completed_at,
+            "rows": batch.row_counts(),
+            "total": sum(counts.values()),
+            "counts": counts,
+            "limit": limit,
+            "cursor": cursor or None,
+            "next_cursor": next_cursor,
+            "changes": changes
         }
     })
 
-@app.route('/sync/commit/<int:batch_id>', methods=['POST'])
+@bp.route('/sync/commit/<int:batch_id>', methods=['POST'])
 def commit_batch(batch_id):
     """Applies selected or all changes in a batch to the main bookmarks table."""
     try:
@@ -339,102 +411,160 @@ def commit_batch(batch_id):
         ids_to_commit = data_json.get('change_ids')
         ids_set = set(ids_to_commit) if ids_to_commit is not None else None
         
-        count = 0
-        changes_to_process = [c for c in batch.changes if ids_set is None or c.id in ids_set]
-        total = len(changes_to_process)
-        
-        print(f"[SYNC COMMIT] Processing {total} changes...")
-
-        for i, change in enumerate(changes_to_process):
-            if i > 0 and i % 100 == 0:
-                print(f"  Processed {i}/{total} changes...")
-                
-            data = change.get_diff()
-            
-            if change.change_type == 'new':
-                bm = Bookmark(
-                    url=data.get('url'),
-                    title=data.get('title'),
-                    folder_path=data.get('folder'),
-                    source_browser=data.get('source'),
-                    status='synced'
-                )
-                db.session.add(bm)
-                count += 1
-                
-            elif change.change_type == 'update':
-                bm = Bookmark.query.get(change.bookmark_id)
-                if bm:
-                    # Save current state to history before updating
-                    save_history(bm)
-                    
-                    new_data = data.get('new', {})
-                    bm.title = new_data.get('title')
-                    bm.folder_path = new_data.get('folder')
-                    bm.version += 1 # Increment version
-                    bm.last_synced_at = datetime.utcnow()
-                    count += 1
-                    
-            elif change.change_type == 'mark_deleted':
-                bm = Bookmark.query.get(change.bookmark_id)
-                if bm:
-                    save_history(bm)
-                    db.session.delete(bm)
-                    count += 1
-            
-            # Stage change for deletion
-            db.session.delete(change)
-        
-        print(f"[SYNC COMMIT] Finalizing {count} changes...")
-        
-        # If all changes are gone, mark batch as committed
-        db.session.flush() # Ensure deletes are registered
-        
-        # Robust check for remaining changes
-        remaining_count = PendingChange.query.filter_by(batch_id=batch.id).count()
-        if remaining_count == 0:
-            batch.status = 'committed'
-            batch.completed_at = datetime.utcnow()
-            
-        db.session.commit()
-        return jsonify({"status": "success", "count": count, "remaining": remaining_count})
+        return jsonify({"status": "success", **run_commit(batch_id, ids_set)})
         
     except Exception as e:
         db.session.rollback()
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/sync/reject/<int:batch_id>', methods=['POST'])
+@bp.route('/sync/reject/<int:batch_id>', methods=['POST'])
 def reject_batch(batch_id):
     """Discards a batch."""
     try:
         batch = SyncBatch.query.get_or_404(batch_id)
         batch.status = 'rejected'
+        SyncState.discard(batch.id)
         db.session.commit()
         return jsonify({"status": "success", "message": "Batch rejected."})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/api/bookmarks', methods=['GET'])
-@app.route('/bookmarks', methods=['GET'])
+# Keyset pagination / streaming defaults for /api/bookmarks
+PAGE_SIZE = 500
+STREAM_CHUNK = 1000
+
+def filter_bookmarks(query, query_term, match, cursor=None, folder_id=None, tag_ids=None, match_all=True):
+    """Applies the search term, folder, tags and keyset cursor (id < cursor) to a query or select."""
+    if folder_id is not None:
+        query = query.filter(Bookmark.folder_id == folder_id)
+    query = tag_facets.apply_tags(query, tag_ids, match_all)
+    if match:
+        query = search_index.apply_match(query, Bookmark, match)
+    elif query_term:
+        search_term = f"%{query_term}%"
+        query = query.filter(
+            (Bookmark.title.ilike(search_term)) | 
+            (Bookmark.url.ilike(search_term))
+        )
+    if cursor:
+        query = query.filter(Bookmark.id < cursor)
+    return query
+
+def tags_by_bookmark(bookmark_ids):
+    """Loads tags for a chunk of bookmark ids in one query: {bookmark_id: [tag dicts]}."""
+    rows = db.session.execute(
+        db.select(bookmark_tags.c.bookmark_id, Tag.id, Tag.name)
+        .join(Tag, Tag.id == bookmark_tags.c.tag_id)
+        .where(bookmark_tags.c.bookmark_id.in_(bookmark_ids))
+        .order_by(Tag.name)
+    )
+    tags = {}
+    for bookmark_id, tag_id, name in rows:
+        tags.setdefault(bookmark_id, []).append({"id": tag_id, "name": name})
+    return tags
+
+def facet_counts(query_term, match, folder_id, tag_ids, match_all):
+    """Per-tag counts over the whole current result set (not just the page)."""
+    if not query_term and folder_id is None and not tag_ids:
+        return tag_facets.counts()
+    ids = filter_bookmarks(db.select(Bookmark.id), query_term, match, None, folder_id, tag_ids, match_all)
+    return tag_facets.counts(ids)
+
+def serialize_bookmarks(bookmarks):
+    """to_dict() for a page of bookmarks, with folder paths resolved in one query."""
+    paths = folders.paths(b.folder_id for b in bookmarks)
+    return [b.to_dict(paths) for b in bookmarks]
+
+def stream_bookmarks(query_term, match, cursor, folder_id=None, tag_ids=None, match_all=True):
+    """Streams matching bookmarks as NDJSON, reading from the DB in chunks."""
+    stmt = db.select(
+        Bookmark.id, Bookmark.url, Bookmark.title, Bookmark.folder_path, Bookmark.folder_id,
+        Bookmark.source_browser, Bookmark.version, Bookmark.status
+    ).order_by(Bookmark.id.desc())
+    stmt = filter_bookmarks(stmt, query_term, match, cursor, folder_id, tag_ids, match_all)
+
+    def generate():
+        result = db.session.execute(stmt.execution_options(yield_per=STREAM_CHUNK))
+        for rows in result.partitions():
+            tags = tags_by_bookmark([r.id for r in rows])
+            paths = folders.paths(r.folder_id for r in rows)
+            yield "".join(json.dumps(Bookmark.serialize(r, tags.get(r.id, []), paths)) + "\n" for r in rows)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@bp.route('/api/bookmarks', methods=['GET'])
+@bp.route('/bookmarks', methods=['GET'])
+@response_cache.cached
 def get_bookmarks():
-    """Returns a paginated list of bookmarks with eager-loaded tags."""
-    # ... (rest of function)
+    """
+    Returns a paginated list of bookmarks with eager-loaded tags.
+    Modes:
+      - limit/offset (default): classic pages, ranked by relevance when searching
+      - cursor=<id>: keyset pages by descending id; pass next_cursor to continue
+        (an empty cursor starts from the newest bookmark)
+      - format=ndjson: streams every match as newline-delimited JSON
+    folder_id=<id> limits any mode to the bookmarks directly in that folder;
+    tags=<id,id> to bookmarks carrying all of those tags (tag_mode=any: any of them).
+    facets=1 adds per-tag counts for the whole result set.
+    """
     from sqlalchemy.orm import joinedload
     query_term = request.args.get('q')
     limit = request.args.get('limit', type=int)
     offset = request.args.get('offset', type=int, default=0)
+    cursor = request.args.get('cursor')
+    folder_id = request.args.get('folder_id', type=int)
+    match_all = request.args.get('tag_mode', 'all') != 'any'
+    try:
+        tag_ids = tag_facets.parse_tag_ids(request.args.get('tags'))
+    except ValueError:
+        return jsonify({"status": "error", "message": "tags must be a comma-separated list of tag ids"}), 400
     
-    base_query = Bookmark.query.options(joinedload(Bookmark.tags)).order_by(Bookmark.id.desc())
+    if cursor:
+        if not cursor.isdigit():
+            return jsonify({"status": "error", "message": "Invalid cursor"}), 400
+        cursor = int(cursor)
 
-    if query_term:
-        search_term = f"%{query_term}%"
-        base_query = base_query.filter(
-            (Bookmark.title.ilike(search_term)) | 
-            (Bookmark.url.ilike(search_term))
-        )
-    
-    # Get total count before slicing for pagination metadata
-    total_count = base_query.count()
+    match = search_index.build_match_query(query_term) if query_term else None
+
+    if request.args.get('format') == 'ndjson':
+        return stream_bookmarks(query_term, match, cursor, folder_id, tag_ids, match_all)
+
+    base_query = Bookmark.query.options(joinedload(Bookmark.tags)).order_by(Bookmark.id.desc())
+    base_query = filter_bookmarks(base_query, None, None, None, folder_id, tag_ids, match_all)
+    facets = {}
+    if request.args.get('facets') == '1':
+        facets["facets"] = facet_counts(query_term, match, folder_id, tag_ids, match_all)
+
+    if cursor is not None:
+        # Keyset mode: O(page) at any depth, no total count
+        limit = limit or PAGE_SIZE
+        page = filter_bookmarks(base_query, query_term, match, cursor).limit(limit + 1).all()
+        has_more = len(page) > limit
+        page = page[:limit]
+        return jsonify({
+            "status": "success",
+            "limit": limit,
+            "cursor": cursor or None,
+            "next_cursor": page[-1].id if has_more else None,
+            "bookmarks": serialize_bookmarks(page),
+            **facets
+        })
+
+    if match:
+        # Full-text search: ranked FTS5 hits with prefix matching
+        base_query = search_index.apply_search(base_query, Bookmark, match)
+        if folder_id is None and not tag_ids:
+            total_count = search_index.count_matches(db.session, match)
+        else:
+            total_count = base_query.order_by(None).count()
+    elif query_term:
+        # Punctuation-only terms have no FTS tokens; fall back to a substring scan
+        base_query = filter_bookmarks(base_query, query_term, None)
+        total_count = base_query.count()
+    else:
+        # Get total count before slicing for pagination metadata
+        count_query = db.session.query(db.func.count(Bookmark.id))
+        total_count = filter_bookmarks(count_query, None, None, None, folder_id, tag_ids, match_all).scalar()
     
     if limit:
         base_query = base_query.limit(limit).offset(offset)
@@ -446,78 +576,163 @@ def get_bookmarks():
         "total": total_count,
         "limit": limit,
         "offset": offset,
-        "bookmarks": [b.to_dict() for b in bookmarks]
+        "bookmarks": serialize_bookmarks(bookmarks),
+        **facets
     })
 
-@app.route('/upload_bulk', methods=['POST'])
+@bp.route('/bookmarks/lookup', methods=['GET'])
+def lookup_bookmarks():
+    """Finds the bookmarks for a URL, matching any variant with the same normalized form."""
+    url = request.args.get('url')
+    if not url:
+        return jsonify({"status": "error", "message": "url is required"}), 400
+
+    normalized = normalize_url(url)
+    bookmarks = Bookmark.query.filter_by(normalized_url=normalized).order_by(Bookmark.id).all()
+    return jsonify({
+        "status": "success",
+        "normalized_url": normalized,
+        "bookmarks": serialize_bookmarks(bookmarks)
+    })
+
+@bp.route('/folders', methods=['GET'])
+@response_cache.cached
+def get_folders():
+    """Folder tree with direct ("count") and subtree ("total") bookmark counts."""
+    return jsonify({"status": "success", **folders.tree()})
+
+@bp.route('/folders/<int:folder_id>', methods=['PATCH'])
+def update_folder(folder_id):
+    """Renames ({"name"}) and/or moves ({"parent_id"}, null = top level) a folder."""
+    folder = db.session.get(Folder, folder_id)
+    if folder is None:
+        return jsonify({"status": "error", "message": "Folder not found"}), 404
+    data = request.json or {}
+    if 'name' in data:
+        name = (data['name'] or '').strip()
+        if not name:
+            return jsonify({"status": "error", "message": "Folder name is required"}), 400
+        folder.name = name
+    if 'parent_id' in data:
+        try:
+            folders.move(db.session.connection(), folder.id, data['parent_id'])
+        except LookupError as e:
+            db.session.rollback()
+            return jsonify({"status": "error", "message": str(e)}), 404
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({"status": "error", "message": str(e)}), 400
+    db.session.commit()
+    db.session.refresh(folder)
+    return jsonify({"status": "success", "folder": folder.to_dict()})
+
+@bp.route('/upload_bulk', methods=['POST'])
 def upload_bulk():
-    """Parses an uploaded file (HTML or JSON)."""
+    """Imports an uploaded file (HTML or JSON) in streamed, individually committed batches."""
     if 'file' not in request.files:
         return jsonify({"status": "error", "message": "No file uploaded"}), 400
     
     file = request.files['file']
-    filename = file.filename
-    content = file.read().decode('utf-8', errors='ignore')
-    
-    new_data = []
-    if filename.endswith('.html'):
-        new_data = parse_netscape_bookmarks(content)
-    elif filename.endswith('.json') or filename == 'Bookmarks':
-        try:
-            import json
-            data = json.loads(content)
-            if isinstance(data, list):
-                new_data = data
-            elif isinstance(data, dict):
-                if "bookmarks" in data and isinstance(data["bookmarks"], list):
-                    new_data = data["bookmarks"]
-                else:
-                    # Possibly Chrome format? Fallback to specialized parser
-                    temp_path = f"/tmp/temp_bookmarks_{os.getpid()}"
-                    with open(temp_path, 'w') as f:
-                        f.write(content)
-                    result = parse_chrome_bookmarks(temp_path)
-                    new_data = result.get('bookmarks', [])
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
-        except Exception:
-            # Fallback to chrome_parser if raw JSON load fails
-            temp_path = f"/tmp/temp_bookmarks_{os.getpid()}"
-            with open(temp_path, 'w') as f:
-                f.write(content)
-            result = parse_chrome_bookmarks(temp_path)
-            new_data = result.get('bookmarks', [])
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-    
-    # Ensure items are dicts
-    valid_bookmarks = []
-    if isinstance(new_data, list):
-        for bm in new_data:
-            if isinstance(bm, dict):
-                valid_bookmarks.append(bm)
-            elif isinstance(bm, str):
-                valid_bookmarks.append({"url": bm, "title": "Imported Bookmark"})
-    
-    for bm in valid_bookmarks:
-        new_bm = Bookmark(
-            url=bm.get('url'),
-            title=bm.get('title'),
-            folder_path=bm.get('folder', ''),
-            source_browser=f"Upload: {filename}",
-            status='synced'
-        )
-        db.session.add(new_bm)
-        
-    db.session.commit()
-    return jsonify({"status": "success", "count": len(new_data)})
+    report = {}
+    try:
+        bulk_upload.upload_bookmarks(file.stream, file.filename, report)
+    except ValueError as e:
+        # Malformed file: batches committed before the error are kept
+        db.session.rollback()
+        return jsonify({"status": "error", "message": f"Upload stopped: {e}", **report}), 400
+
+    return jsonify({"status": "success", "count": report["inserted"], **report})
 
-@app.route('/env', methods=['GET'])
+@bp.route('/duplicates', methods=['GET'])
+def get_duplicates():
+    """
+    Reports duplicate groups: ?near=0 for exact matches only, ?cross_source=1 to
+    group across browsers, ?limit=N caps the groups returned (summary covers all).
+    The scan runs as a 'duplicates_report' job: until one has finished for the
+    current library version this answers 202 with the job to poll, then 200.
+    """
+    near = request.args.get('near', '1') != '0'
+    cross_source = request.args.get('cross_source') == '1'
+    limit = request.args.get('limit', 100, type=int)
+    params = {"near": near, "cross_source": cross_source}
+    version = response_cache.version()
+
+    running = None
+    for job in reversed(jobs.manager.list()): # Newest first
+        state = job.to_dict()
+        if state["type"] != 'duplicates_report' or state["params"] != params:
+            continue
+        if state["status"] == 'succeeded' and state["result"]["version"] == version:
+            result = state["result"]
+            return jsonify({"status": "success", "summary": result["summary"], "groups": result["groups"][:limit]})
+        if running is None and not job.finished:
+            running = job
+
+    state = (running or jobs.manager.submit('duplicates_report', params)).to_dict()
+    return jsonify({"status": "pending", "job_id": state["id"], "job": state}), 202
+
+@bp.route('/duplicates/batch', methods=['POST'])
+def stage_duplicates():
+    """Stages every duplicate as a 'merge' change in a review batch (commit via /sync/commit)."""
+    data = request.json if request.is_json else {}
+    try:
+        return jsonify({"status": "success", **run_duplicates(
+            bool(data.get('near', True)), bool(data.get('cross_source')), stage=True
+        )})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Response cache hit/miss/304 counters, size and the current library version."""
+    return jsonify({"status": "success", "version": response_cache.version(), **response_cache.cache.stats()})
+
+def _cache_metrics():
+    stats = response_cache.cache.stats()
+    return (metrics.family("response_cache_requests_total", "Response cache lookups by result.", "counter",
+                           [({"result": r}, stats[r]) for r in ("hits", "misses", "not_modified")])
+            + metrics.family("response_cache_bytes", "Bytes held by the response cache.", "gauge",
+                             [({}, stats["bytes"])]))
+
+metrics.COLLECTORS.append(_cache_metrics)
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request, SQL, sync and cache metrics in Prometheus text format (this worker process)."""
+    return metrics.response()
+
+@bp.route('/admin/slow_queries', methods=['GET', 'DELETE'])
+def manage_slow_queries():
+    """
+    Slow statements aggregated by fingerprint, with their query plans and
+    flagged full scans of large tables. ?sort=total_ms|max_ms|avg_ms|count
+    (default total_ms), ?limit= (default 50), ?flagged=1 for flagged only.
+    DELETE clears the recorded statements.
+    """
+    recorder = slow_queries.recorder
+    if request.method == 'DELETE':
+        recorder.reset()
+        return jsonify({"status": "success"})
+    sort = request.args.get('sort', 'total_ms')
+    if sort not in ('total_ms', 'max_ms', 'avg_ms', 'count'):
+        return jsonify({"status": "error", "message": f"Unknown sort: {sort}"}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 1000)
+    return jsonify({
+        "status": "success",
+        "enabled": recorder.enabled,
+        "threshold_ms": recorder.threshold * 1000 if recorder.enabled else None,
+        "large_table_rows": recorder.large_table_rows,
+        "queries": recorder.report(sort, limit, flagged_only=request.args.get('flagged') in ('1', 'true'))
+    })
+
+@bp.route('/env', methods=['GET'])
 def get_env():
     """Advanced endpoint for environment fingerprinting (Sprint 02)."""
+    from env_scan_v2 import get_browser_profiles
     return jsonify({"status": "success", "env": get_browser_profiles()})
 
-@app.route('/open_folder', methods=['POST'])
+@bp.route('/open_folder', methods=['POST'])
 def trigger_open_folder():
     """PoC: Triggers local file manager via backend (Sprint 02)."""
     data = request.json
@@ -526,6 +741,7 @@ def trigger_open_folder():
         return jsonify({"status": "error", "message": "Missing path"}), 400
     
     # Security: Only allow opening detected profile paths
+    from env_scan_v2 import get_browser_profiles, open_folder
     profiles = get_browser_profiles()['profiles']
     allowed_paths = [p['path'] for p in profiles]
     
@@ -534,12 +750,14 @@ def trigger_open_folder():
         return jsonify({"status": "success" if success else "error"})
     return jsonify({"status": "error", "message": "Unauthorized path"}), 403
 
-@app.route('/tags', methods=['GET', 'POST'])
+@bp.route('/tags', methods=['GET', 'POST'])
+@response_cache.cached
 def manage_tags():
-    """List all tags or create a new one."""
+    """List all tags (with their bookmark counts) or create a new one."""
     if request.method == 'GET':
+        counts = {t["id"]: t["count"] for t in tag_facets.counts()}
         tags = Tag.query.order_by(Tag.name).all()
-        return jsonify({"status": "success", "data": [t.to_dict() for t in tags]})
+        return jsonify({"status": "success", "data": [{**t.to_dict(), "count": counts.get(t.id, 0)} for t in tags]})
     
     if request.method == 'POST':
         data = request.json
@@ -556,7 +774,7 @@ def manage_tags():
         db.session.commit()
         return jsonify({"status": "success", "data": tag.to_dict()})
 
-@app.route('/bookmarks/<int:bookmark_id>/tags', methods=['POST'])
+@bp.route('/bookmarks/<int:bookmark_id>/tags', methods=['POST'])
 def add_tag_to_bookmark(bookmark_id):
     """Attach a tag to a bookmark."""
     bookmark = Bookmark.query.get_or_404(bookmark_id)
@@ -576,9 +794,66 @@ def add_tag_to_bookmark(bookmark_id):
         bookmark.tags.append(tag)
         db.session.commit()
         
-    return jsonify({"status": "success", "data": bookmark.to_dict()})
+    return jsonify({"status": "success", "data": serialize_bookmarks([bookmark])[0]})
+
+def _tag_names(value):
+    """Clean, de-duplicated tag names from a JSON list (or a single name)."""
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        raise ValueError("add/remove must be lists of tag names")
+    return sorted({str(name).strip() for name in value if str(name).strip()})
+
+@bp.route('/bookmarks/tags', methods=['POST'])
+def bulk_tag_bookmarks():
+    """
+    Adds and/or removes tags on many bookmarks in one transaction:
+    {"add": [names], "remove": [names], plus a selection:
+     "ids": [bookmark ids] or any of "q", "folder_id" (+ "recursive": true for
+     subfolders), "tags" (+ "tag_mode": "any") - the same filters as /api/bookmarks}.
+    """
+    data = request.json or {}
+    try:
+        add, remove = _tag_names(data.get('add', [])), _tag_names(data.get('remove', []))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if not add and not remove:
+        return jsonify({"status": "error", "message": "Nothing to add or remove"}), 400
+
+    if data.get('ids') is not None:
+        if not isinstance(data['ids'], list) or not all(isinstance(i, int) for i in data['ids']):
+            return jsonify({"status": "error", "message": "ids must be a list of bookmark ids"}), 400
+        targets = data['ids']
+    else:
+        query_term, folder_id, tag_ids = data.get('q'), data.get('folder_id'), data.get('tags') or []
+        if not query_term and folder_id is None and not tag_ids:
+            return jsonify({"status": "error", "message": "Select bookmarks with ids, q, folder_id or tags"}), 400
+        if query_term is not None and not isinstance(query_term, str):
+            return jsonify({"status": "error", "message": "q must be a string"}), 400
+        if folder_id is not None and not isinstance(folder_id, int):
+            return jsonify({"status": "error", "message": "folder_id must be a folder id"}), 400
+        if not isinstance(tag_ids, list) or not all(isinstance(i, int) for i in tag_ids):
+            return jsonify({"status": "error", "message": "tags must be a list of tag ids"}), 400
+        if data.get('tag_mode', 'all') not in ('all', 'any'):
+            return jsonify({"status": "error", "message": "tag_mode must be 'all' or 'any'"}), 400
 
-@app.route('/bookmarks/<int:bookmark_id>/tags/<int:tag_id>', methods=['DELETE'])
+    try:
+        if data.get('ids') is None:
+            match = search_index.build_match_query(query_term) if query_term else None
+            targets = db.select(Bookmark.id)
+            if folder_id is not None and data.get('recursive'):
+                targets = targets.where(Bookmark.folder_id.in_(folders.subtree(folder_id)))
+                folder_id = None
+            targets = filter_bookmarks(targets, query_term, match, None, folder_id, tag_ids, data.get('tag_mode') != 'any')
+        result = bulk_tags.tag_bookmarks(targets, add, remove)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"status": "error", "message": str(e)}), 500
+    log.info("[TAGS] %s bookmarks: +%s / -%s tag links", result['matched'], result['added'], result['removed'])
+    return jsonify({"status": "success", **result})
+
+@bp.route('/bookmarks/<int:bookmark_id>/tags/<int:tag_id>', methods=['DELETE'])
 def remove_tag_from_bookmark(bookmark_id, tag_id):
     """Remove a tag from a bookmark."""
     bookmark = Bookmark.query.get_or_404(bookmark_id)
@@ -588,48 +863,111 @@ def remove_tag_from_bookmark(bookmark_id, tag_id):
         bookmark.tags.remove(tag)
         db.session.commit()
         
-    return jsonify({"status": "success", "data": bookmark.to_dict()})
+    return jsonify({"status": "success", "data": serialize_bookmarks([bookmark])[0]})
 
 
-@app.route('/bookmarks/<int:bookmark_id>/history', methods=['GET'])
+@bp.route('/bookmarks/<int:bookmark_id>/history', methods=['GET'])
 def get_bookmark_history(bookmark_id):
     """Returns the version history of a bookmark."""
     bookmark = Bookmark.query.get_or_404(bookmark_id)
-    history = BookmarkHistory.query.filter_by(bookmark_id=bookmark_id).order_by(BookmarkHistory.version.desc()).all()
-    
+
     # Return both current version and history
     return jsonify({
         "status": "success",
-        "current": bookmark.to_dict(),
-        "history": [h.to_dict() for h in history]
+        "current": serialize_bookmarks([bookmark])[0],
+        "history": history.bookmark_versions(bookmark_id)
     })
 
-@app.route('/bookmarks/<int:bookmark_id>/revert/<int:history_id>', methods=['POST'])
+@bp.route('/bookmarks/<int:bookmark_id>/revert/<int:history_id>', methods=['POST'])
 def revert_bookmark(bookmark_id, history_id):
     """Reverts a bookmark to a previous version."""
     bookmark = Bookmark.query.get_or_404(bookmark_id)
-    history = BookmarkHistory.query.get_or_404(history_id)
-    
-    if history.bookmark_id != bookmark_id:
+    found = history.rebuild(history_id)
+    if found is None:
+        return jsonify({"status": "error", "message": "History record not found"}), 404
+    entry, state = found
+
+    if entry.bookmark_id != bookmark_id:
         return jsonify({"status": "error", "message": "History record mismatch"}), 400
-        
-    # Save current state before revert
-    save_history(bookmark)
-    
-    # Apply historical state
-    bookmark.title = history.title
-    bookmark.url = history.url
-    bookmark.folder_path = history.folder_path
+
+    # Record the current state (as a delta against the reverted one) before applying it
+    history.record(db.session.connection(), bookmark.id, bookmark.version, history.fields(bookmark), state,
+                   kind=history.REVERT)
+    bookmark.title = state["title"]
+    bookmark.url = state["url"]
+    bookmark.folder_path = state["folder_path"]
     bookmark.version += 1
     bookmark.last_synced_at = datetime.utcnow()
-    
+
     db.session.commit()
-    return jsonify({"status": "success", "message": f"Reverted to version {history.version}"})
+    return jsonify({"status": "success", "message": f"Reverted to version {entry.version}"})
 
-@app.context_processor
+# --- Background Jobs ---
+
+jobs.manager.register('sync_firefox', run_firefox_sync)
+jobs.manager.register('sync_chrome', run_chrome_sync)
+jobs.manager.register('commit', run_commit)
+jobs.manager.register('duplicates', run_duplicates)
+jobs.manager.register('duplicates_report', run_duplicates_report)
+jobs.manager.register('history_compact', run_history_compaction)
+
+@bp.route('/jobs', methods=['GET', 'POST'])
+def manage_jobs():
+    """List jobs or enqueue one: {"type": "sync_firefox"|"sync_chrome"|"commit"|"duplicates"|"history_compact", ...params}."""
+    if request.method == 'GET':
+        return jsonify({"status": "success", "jobs": [j.to_dict() for j in jobs.manager.list()]})
+
+    data = request.json or {}
+    kind = data.get('type')
+    if kind in ('sync_firefox', 'sync_chrome'):
+        if not data.get('path'):
+            return jsonify({"status": "error", "message": "Missing profile path"}), 400
+        params = {"profile_path": data['path']}
+        if kind == 'sync_firefox':
+            params["incremental"] = bool(data.get('incremental'))
+    elif kind == 'commit':
+        batch = SyncBatch.query.get_or_404(data.get('batch_id', 0))
+        if batch.status != 'pending_review':
+            return jsonify({"status": "error", "message": "Batch already processed"}), 400
+        params = {"batch_id": batch.id, "change_ids": data.get('change_ids')}
+    elif kind == 'duplicates':
+        params = {"near": bool(data.get('near', True)), "cross_source": bool(data.get('cross_source')), "stage": True}
+    elif kind == 'history_compact':
+        params = {}
+        for name in ('keep_versions', 'keep_days', 'tombstone_days'):
+            if data.get(name) is not None:
+                if not isinstance(data[name], int) or data[name] < 0:
+                    return jsonify({"status": "error", "message": f"{name} must be a non-negative integer"}), 400
+                params[name] = data[name]
+    else:
+        return jsonify({"status": "error", "message": f"Unknown job type: {kind}"}), 400
+
+    job = jobs.manager.submit(kind, params)
+    return jsonify({"status": "success", "job_id": job.id, "job": job.to_dict()}), 202
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Returns status, stage, progress and result of a job."""
+    job = jobs.manager.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    return jsonify({"status": "success", "job": job.to_dict()})
+
+@bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Requests cancellation; running jobs stop at their next checkpoint."""
+    job = jobs.manager.cancel(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    return jsonify({"status": "success", "job": job.to_dict()})
+
+@bp.app_context_processor
 def inject_config():
     """Injects config values into all templates."""
-    return dict(API_BASE_URL=app.config.get('API_BASE_URL', ''))
+    return dict(API_BASE_URL=current_app.config.get('API_BASE_URL', ''))
 
 if __name__ == '__main__':
+    # Development server; production runs serve.py (see run.sh)
+    app = create_app()
+    init_schema(app)
     app.run(host=app.config['HOST'], port=app.config['PORT'], debug=app.config['DEBUG'])
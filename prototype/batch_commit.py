@@ -0,0 +1,168 @@
+# Bulk commit path for staged sync batches.
+# Changes are applied in chunks, grouped by change_type: executemany inserts/updates,
+# INSERT ... SELECT history deltas/tombstones per chunk and one DELETE for applied changes.
+# Folder counts are adjusted once per chunk from the net change per folder.
+from datetime import datetime
+from sqlalchemy import bindparam
+from database import db, Bookmark, PendingChange, bookmark_tags
+import folders
+import history
+
+COMMIT_CHUNK = 5000
+
+bookmarks = Bookmark.__table__
+pending = PendingChange.__table__
+
+# Only the drifted fields are staged; the others keep the bookmark's own value
+APPLY_UPDATE = bookmarks.update().where(bookmarks.c.id == bindparam("b_id")).values(
+    title=db.case((bindparam("b_title_changed"), bindparam("b_title")), else_=bookmarks.c.title),
+    folder_path=db.case((bindparam("b_folder_changed"), bindparam("b_folder")), else_=bookmarks.c.folder_path),
+    folder_id=bindparam("b_folder_id"),
+    version=bookmarks.c.version + 1,
+    last_synced_at=bindparam("b_now")
+)
+
+MOVE_TAGS = db.text(
+    "INSERT OR IGNORE INTO bookmark_tags (bookmark_id, tag_id) "
+    "SELECT :survivor, tag_id FROM bookmark_tags WHERE bookmark_id = :duplicate"
+)
+
+
+def _current_folders(ids):
+    """{id: folder_id} for the subset of `ids` that still exist in bookmarks."""
+    if not ids:
+        return {}
+    return dict(db.session.execute(
+        db.select(bookmarks.c.id, bookmarks.c.folder_id).where(bookmarks.c.id.in_(ids))
+    ).all())
+
+
+def _apply_chunk(batch_id, change_ids):
+    """Applies one chunk of pending changes. Returns the number of bookmarks touched."""
+    rows = db.session.execute(
+        db.select(pending.c.id, pending.c.bookmark_id, pending.c.change_type, pending.c.title,
+                  pending.c.url, pending.c.folder, pending.c.source, pending.c.changed, pending.c.target_id)
+        .where(pending.c.batch_id == batch_id, pending.c.id.in_(change_ids))
+    ).all()
+
+    grouped = {"new": [], "update": [], "mark_deleted": [], "merge": []}
+    for row in rows:
+        if row.change_type in grouped:
+            grouped[row.change_type].append(row)
+
+    now = datetime.utcnow()
+    count = 0
+    connection = db.session.connection()
+    deltas = {}
+
+    def refile(old_folder, new_folder):
+        deltas[old_folder] = deltas.get(old_folder, 0) - 1
+        deltas[new_folder] = deltas.get(new_folder, 0) + 1
+
+    # NEW: one executemany insert
+    if grouped["new"]:
+        folder_ids = folders.ensure_paths(connection, {row.folder or "" for row in grouped["new"]})
+        new_rows = []
+        for row in grouped["new"]:
+            folder_id = folder_ids[row.folder or ""]
+            new_rows.append({
+                "url": row.url,
+                "title": row.title,
+                "folder_path": row.folder,
+                "folder_id": folder_id,
+                "source_browser": row.source,
+                "status": 'synced'
+            })
+            deltas[folder_id] = deltas.get(folder_id, 0) + 1
+        db.session.execute(bookmarks.insert(), new_rows)
+        count += len(new_rows)
+
+    # UPDATE: history deltas for all targets (one INSERT per change mask), then executemany update
+    if grouped["update"]:
+        diffs = {row.bookmark_id: row for row in grouped["update"]}
+        current = _current_folders(list(diffs))
+        if current:
+            moved = {i for i in current if (diffs[i].changed or 0) & PendingChange.CHANGED_FOLDER}
+            folder_ids = folders.ensure_paths(connection, {diffs[i].folder or "" for i in moved})
+            title_changed = {i for i in current if (diffs[i].changed or 0) & PendingChange.CHANGED_TITLE}
+            history.snapshot_updates(connection, {
+                i: (history.TITLE if i in title_changed else 0) | (history.FOLDER if i in moved else 0)
+                for i in current
+            }, now)
+            params = []
+            for bookmark_id, old_folder in current.items():
+                diff = diffs[bookmark_id]
+                new_folder = folder_ids[diff.folder or ""] if bookmark_id in moved else old_folder
+                refile(old_folder, new_folder)
+                params.append({
+                    "b_id": bookmark_id,
+                    "b_title_changed": bookmark_id in title_changed,
+                    "b_title": diff.title,
+                    "b_folder_changed": bookmark_id in moved,
+                    "b_folder": diff.folder,
+                    "b_folder_id": new_folder,
+                    "b_now": now
+                })
+            db.session.execute(APPLY_UPDATE, params)
+            count += len(current)
+
+    # MARK_DELETED: remove bookmarks with their tag links, leaving a history tombstone
+    if grouped["mark_deleted"]:
+        current = _current_folders([row.bookmark_id for row in grouped["mark_deleted"]])
+        if current:
+            ids = list(current)
+            db.session.execute(bookmark_tags.delete().where(bookmark_tags.c.bookmark_id.in_(ids)))
+            history.tombstone(connection, ids, now)
+            db.session.execute(bookmarks.delete().where(bookmarks.c.id.in_(ids)))
+            for folder_id in current.values():
+                refile(folder_id, None)
+            count += len(ids)
+
+    # MERGE: the duplicate's tags move to the survivor, then it is removed like MARK_DELETED
+    if grouped["merge"]:
+        into = {row.bookmark_id: row.target_id for row in grouped["merge"]}
+        current = _current_folders(list(into) + list(set(into.values())))
+        ids = [bookmark_id for bookmark_id, survivor in into.items() if bookmark_id in current and survivor in current]
+        if ids:
+            db.session.execute(MOVE_TAGS, [{"survivor": into[i], "duplicate": i} for i in ids])
+            db.session.execute(bookmark_tags.delete().where(bookmark_tags.c.bookmark_id.in_(ids)))
+            history.tombstone(connection, ids, now)
+            db.session.execute(bookmarks.delete().where(bookmarks.c.id.in_(ids)))
+            for bookmark_id in ids:
+                refile(current[bookmark_id], None)
+            count += len(ids)
+
+    folders.adjust_counts(connection, deltas)
+
+    # Applied (or stale) changes leave the staging area in one statement
+    db.session.execute(pending.delete().where(pending.c.id.in_([row.id for row in rows])))
+    return count
+
+
+def commit_changes(batch, change_ids=None, chunk_size=COMMIT_CHUNK, progress=None):
+    """
+    Applies the selected changes (or all of them) of `batch` in chunks.
+    Each chunk is committed on its own, so the write lock is released between
+    chunks and an interrupted commit can simply be retried for the remainder.
+    `progress(done, total)` is called after every chunk.
+    Returns (applied_count, remaining_count).
+    """
+    query = db.select(pending.c.id).where(pending.c.batch_id == batch.id).order_by(pending.c.id)
+    ids = db.session.execute(query).scalars().all()
+    if change_ids is not None:
+        selected = set(change_ids)
+        ids = [i for i in ids if i in selected]
+
+    total = len(ids)
+    count = 0
+    for start in range(0, total, chunk_size):
+        chunk = ids[start:start + chunk_size]
+        count += _apply_chunk(batch.id, chunk)
+        db.session.commit()
+        if progress:
+            progress(min(start + chunk_size, total), total)
+
+    remaining = db.session.execute(
+        db.select(db.func.count()).select_from(pending).where(pending.c.batch_id == batch.id)
+    ).scalar()
+    return count, remaining
@@ -0,0 +1,98 @@
+# Read side of the sync review flow (/sync/batches, /sync/batch/<id>).
+# Change counts come from one GROUP BY over the (batch_id, change_type) index,
+# and batch details are keyset pages by change id, so opening a 100k-change
+# batch only reads and decodes one page of diffs. Changes only store what
+# differs from the bookmark, whose current details are joined in per page.
+from database import db, Bookmark, SyncBatch, PendingChange
+
+CHANGE_TYPES = ("new", "update", "mark_deleted", "merge")
+
+PAGE_SIZE = 200
+MAX_PAGE_SIZE = 5000
+
+pending = PendingChange.__table__
+current = Bookmark.__table__.alias("current")
+survivors = Bookmark.__table__.alias("survivor")
+
+
+def change_counts(batch_ids):
+    """{batch_id: {change_type: count}} for the given batches, in one query."""
+    if not batch_ids:
+        return {}
+    rows = db.session.execute(
+        db.select(pending.c.batch_id, pending.c.change_type, db.func.count())
+        .where(pending.c.batch_id.in_(batch_ids))
+        .group_by(pending.c.batch_id, pending.c.change_type)
+    )
+    counts = {}
+    for batch_id, change_type, count in rows:
+        counts.setdefault(batch_id, {})[change_type] = count
+    return counts
+
+
+def pending_batches():
+    """Pending batches with their total and per-type change counts."""
+    batches = SyncBatch.query.filter_by(status='pending_review').order_by(SyncBatch.id).all()
+    counts = change_counts([b.id for b in batches])
+    return [{
+        "id": b.id,
+        "source": b.source,
+        "created_at": b.created_at,
+        "count": sum(counts.get(b.id, {}).values()),
+        "counts": counts.get(b.id, {})
+    } for b in batches]
+
+
+def page_changes(batch_id, change_type=None, cursor=None, limit=PAGE_SIZE):
+    """
+    One page of a batch's changes in id order, optionally of a single type:
+    (changes, next_cursor). Continue with cursor=next_cursor until it is None.
+    """
+    # Each type is an id-ordered range of the covering index: the page's ids are
+    # picked from those ranges (no sort over the whole batch when no type is given),
+    # then only the page's rows are read, with their bookmarks joined in
+    ids = []
+    for kind in [change_type] if change_type else CHANGE_TYPES:
+        stmt = (db.select(pending.c.id)
+                .where(pending.c.batch_id == batch_id, pending.c.change_type == kind)
+                .order_by(pending.c.id)
+                .limit(limit + 1))
+        if cursor:
+            stmt = stmt.where(pending.c.id > cursor)
+        ids.extend(db.session.execute(stmt).scalars())
+    ids.sort()
+    has_more = len(ids) > limit
+    ids = ids[:limit]
+
+    rows = db.session.execute(
+        db.select(pending, *_details(current, "b"), *_details(survivors, "s"))
+        .outerjoin(current, current.c.id == pending.c.bookmark_id)
+        .outerjoin(survivors, survivors.c.id == pending.c.target_id)
+        .where(pending.c.id.in_(ids))
+        .order_by(pending.c.id)
+    ).all() if ids else []
+    changes = [{
+        "id": row.id,
+        "type": row.change_type,
+        "bookmark_id": row.bookmark_id,
+        "diff": PendingChange.decode_diff(row, _bookmark(row, _CURRENT), _bookmark(row, _SURVIVOR))
+    } for row in rows]
+    return changes, ids[-1] if has_more else None
+
+
+DETAIL_FIELDS = ("id", "title", "url", "folder", "source")
+_CURRENT = slice(len(pending.c), len(pending.c) + len(DETAIL_FIELDS))
+_SURVIVOR = slice(_CURRENT.stop, _CURRENT.stop + len(DETAIL_FIELDS))
+
+
+def _details(table, prefix):
+    return [table.c.id.label(f"{prefix}_id"), table.c.title.label(f"{prefix}_title"), table.c.url.label(f"{prefix}_url"),
+            table.c.folder_path.label(f"{prefix}_folder"), table.c.source_browser.label(f"{prefix}_source")]
+
+
+def _bookmark(row, columns):
+    # {title, url, folder, source} of a joined bookmark, None when there is none
+    values = row[columns]
+    if values[0] is None:
+        return None
+    return dict(zip(DETAIL_FIELDS[1:], values[1:]))
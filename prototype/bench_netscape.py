@@ -0,0 +1,85 @@
+import re
+import sys
+import time
+import random
+from parser import parse_netscape_bookmarks
+
+# Throughput benchmark: single-pass tokenizer vs the previous line/regex parser.
+# Usage: python bench_netscape.py [entries]   (default 100000)
+
+def legacy_parse_netscape_bookmarks(html_content):
+    """The line-by-line regex parser this module replaced, kept as the baseline."""
+    bookmarks = []
+    folder_stack = []
+    pending_folder = None
+    lines = html_content.splitlines()
+
+    folder_pattern = re.compile(r'<H3[^>]*>([^<]+)</H3>', re.IGNORECASE)
+    link_pattern = re.compile(r'<A\s+HREF="([^"]+)"[^>]*>([^<]+)</A>', re.IGNORECASE)
+    dl_pattern = re.compile(r'<DL>', re.IGNORECASE)
+    dl_end_pattern = re.compile(r'</DL>', re.IGNORECASE)
+
+    for line in lines:
+        line = line.strip()
+        folder_match = folder_pattern.search(line)
+        if folder_match:
+            pending_folder = folder_match.group(1).strip()
+        if dl_pattern.search(line) and pending_folder is not None:
+            folder_stack.append(pending_folder)
+            pending_folder = None
+        if dl_end_pattern.search(line) and folder_stack:
+            folder_stack.pop()
+        link_match = link_pattern.search(line)
+        if link_match:
+            bookmarks.append({
+                "title": link_match.group(2).strip(),
+                "url": link_match.group(1).strip(),
+                "folder": " > ".join(folder_stack) or "Root"
+            })
+    return bookmarks
+
+def generate_export(entries, per_folder=50, depth=4, icon_ratio=0.3, seed=42):
+    """Synthetic Netscape export in the layout Firefox/Chrome write."""
+    rng = random.Random(seed)
+    out = ['<!DOCTYPE NETSCAPE-Bookmark-file-1>',
+           '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">',
+           '<TITLE>Bookmarks</TITLE>', '<H1>Bookmarks</H1>', '<DL><p>']
+    written = 0
+    folder = 0
+    while written < entries:
+        levels = rng.randint(1, depth)
+        for level in range(levels):
+            folder += 1
+            indent = "    " * (level + 1)
+            out.append(f'{indent}<DT><H3 ADD_DATE="1700000000" LAST_MODIFIED="1700000000">Folder {folder}</H3>')
+            out.append(f'{indent}<DL><p>')
+        indent = "    " * (levels + 1)
+        for _ in range(min(per_folder, entries - written)):
+            written += 1
+            # Browsers inline favicons as base64 data URIs on a share of entries
+            icon = f' ICON="data:image/png;base64,{"A" * 600}"' if rng.random() < icon_ratio else ""
+            out.append(f'{indent}<DT><A HREF="https://example{written}.com/path?id={written}" '
+                       f'ADD_DATE="{1600000000 + written}"{icon} TAGS="tag{written % 97},misc">Bookmark {written}</A>')
+        for level in reversed(range(levels)):
+            out.append("    " * (level + 1) + '</DL><p>')
+    out.append('</DL><p>')
+    return "\n".join(out)
+
+def bench(label, func, content, rounds=3):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        count = len(func(content))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<8} {count:>8} bookmarks  {best:7.3f}s  {count / best:>10,.0f} entries/s")
+    return best
+
+if __name__ == "__main__":
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    content = generate_export(entries)
+    print(f"Netscape export: {entries} entries, {len(content) / 1e6:.1f} MB")
+    legacy = bench("legacy", legacy_parse_netscape_bookmarks, content)
+    current = bench("current", parse_netscape_bookmarks, content)
+    no_icons = bench("no icons", lambda html: parse_netscape_bookmarks(html, icons=False), content)
+    print(f"speedup: {legacy / current:.2f}x ({legacy / no_icons:.2f}x with icons=False)")
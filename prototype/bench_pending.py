@@ -0,0 +1,157 @@
+import os
+import sys
+import time
+import json
+import random
+
+# Always the in-memory database: the bench stages and commits a generated sync
+os.environ['FLASK_ENV'] = 'testing'
+
+from api import app, db, PendingChange
+import diff_engine
+import batch_review
+
+# Staging size/speed benchmark: typed pending_changes columns vs the previous
+# JSON diff_blob per change. Both stage the same sync (a third of the feed new,
+# a third retitled or moved, the rest unchanged, plus missing bookmarks) and
+# then read staged changes the way the commit path and the review endpoint do.
+# Usage: python bench_pending.py [bookmarks]   (default 100000)
+
+# The json_object() staging this module's typed columns replaced, kept as the baseline
+LEGACY_TABLE = "legacy_pending_changes"
+
+LEGACY_STAGE = f"""
+INSERT INTO {LEGACY_TABLE} (batch_id, bookmark_id, change_type, diff_blob)
+SELECT :batch_id, NULL, 'new',
+       json_object('title', f.title, 'url', f.url, 'folder', f.folder, 'source', f.source)
+FROM {diff_engine.FEED_TABLE} f
+LEFT JOIN existing e ON e.norm = f.norm
+WHERE e.id IS NULL
+
+UNION ALL
+
+SELECT :batch_id, e.id, 'update',
+       json_object(
+           'old', json_object('title', e.title, 'folder', e.folder_path),
+           'new', json_object('title', f.title, 'url', f.url, 'folder', f.folder, 'source', f.source)
+       )
+FROM {diff_engine.FEED_TABLE} f
+JOIN existing e ON e.norm = f.norm
+WHERE e.title IS NOT f.title OR e.folder_path IS NOT f.folder
+
+UNION ALL
+
+SELECT :batch_id, e.id, 'mark_deleted',
+       json_object('title', e.title, 'url', e.url)
+FROM existing e
+WHERE e.status IS NOT 'absent_on_source'
+  AND NOT EXISTS (SELECT 1 FROM {diff_engine.FEED_TABLE} p WHERE p.norm = e.norm)
+"""
+
+
+def generate(count, seed=42):
+    """(existing rows, incoming feed) for a source with `count` bookmarks."""
+    rng = random.Random(seed)
+    folders = [" > ".join(f"Folder {rng.randint(1, 40)}" for _ in range(rng.randint(1, 4))) for _ in range(500)]
+    existing = []
+    feed = []
+    for i in range(count):
+        url = f"https://site{i % 997}.example.com/articles/{i}/some-readable-slug?ref=bookmark"
+        title = f"Bookmark {i}: a typical page title of moderate length"
+        folder = rng.choice(folders)
+        existing.append((url, title, folder))
+        roll = rng.random()
+        if roll < 0.1:
+            continue # missing from the source: mark_deleted
+        if roll < 0.3:
+            title += " (updated)"
+        elif roll < 0.4:
+            folder = rng.choice(folders)
+        feed.append({"url": url, "title": title, "folder": folder, "source": "Firefox"})
+    for i in range(count // 2):
+        feed.append({"url": f"https://new{i}.example.org/posts/{i}/another-slug", "title": f"New bookmark {i}",
+                     "folder": rng.choice(folders), "source": "Firefox"})
+    return existing, feed
+
+
+def table_bytes(connection, table):
+    return connection.exec_driver_sql("SELECT sum(pgsize) FROM dbstat WHERE name = ?", (table,)).scalar()
+
+
+def stage_legacy(connection, batch_id, feed):
+    connection.exec_driver_sql(diff_engine.CREATE_FEED)
+    connection.exec_driver_sql(f"DELETE FROM {diff_engine.FEED_TABLE}")
+    diff_engine._load_feed(connection, feed)
+    connection.execute(db.text(diff_engine.EXISTING_CTE + LEGACY_STAGE),
+                       {"batch_id": batch_id, "source_pattern": "firefox%"})
+    connection.exec_driver_sql(f"DROP TABLE {diff_engine.FEED_TABLE}")
+
+
+def best_of(func, rounds=3):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    existing, feed = generate(count)
+
+    with app.app_context():
+        db.create_all()
+        connection = db.session.connection()
+        connection.exec_driver_sql(
+            "INSERT INTO bookmarks (url, normalized_url, title, folder_path, source_browser, version, status) "
+            "VALUES (?, ?, ?, ?, 'Firefox', 1, 'synced')",
+            [(url, diff_engine.normalize_url(url), title, folder) for url, title, folder in existing]
+        )
+        connection.exec_driver_sql(f"CREATE TABLE {LEGACY_TABLE} (id INTEGER PRIMARY KEY, batch_id INTEGER, "
+                                   "bookmark_id INTEGER, change_type VARCHAR, diff_blob VARCHAR)")
+
+        start = time.perf_counter()
+        stage_legacy(connection, 1, feed)
+        legacy_stage = time.perf_counter() - start
+        start = time.perf_counter()
+        batch, counts = diff_engine.stage_sync("firefox_manual", "firefox%", feed)
+        typed_stage = time.perf_counter() - start
+
+        legacy_size = table_bytes(connection, LEGACY_TABLE)
+        typed_size = table_bytes(connection, "pending_changes")
+        print(f"{count} bookmarks, {len(feed)} incoming: {counts['new']} new, {counts['updated']} updated, "
+              f"{counts['to_delete']} to delete")
+        print(f"staging  legacy {legacy_stage:6.2f}s  typed {typed_stage:6.2f}s")
+        print(f"size     legacy {legacy_size / 1e6:6.1f} MB  typed {typed_size / 1e6:6.1f} MB  "
+              f"({legacy_size / typed_size:.1f}x smaller)")
+
+        # Commit path: everything _apply_chunk needs per change
+        legacy_read, _ = best_of(lambda: [
+            (row.id, row.bookmark_id, row.change_type, json.loads(row.diff_blob))
+            for row in connection.exec_driver_sql(
+                f"SELECT id, bookmark_id, change_type, diff_blob FROM {LEGACY_TABLE}"
+            )
+        ])
+        typed_read, _ = best_of(lambda: db.session.execute(
+            db.select(*[PendingChange.__table__.c[name] for name in (
+                "id", "bookmark_id", "change_type", "title", "url", "folder", "source", "changed", "target_id"
+            )])
+        ).all())
+        print(f"commit   legacy {legacy_read:6.3f}s  typed {typed_read:6.3f}s  "
+              f"({legacy_read / typed_read:.1f}x faster to read every staged change)")
+
+        # Review path: every change decoded to its API diff (typed: with the bookmark joined in)
+        def review_all():
+            changes, cursor = batch_review.page_changes(batch.id, limit=batch_review.MAX_PAGE_SIZE)
+            while cursor:
+                page, cursor = batch_review.page_changes(batch.id, cursor=cursor, limit=batch_review.MAX_PAGE_SIZE)
+                changes += page
+            return changes
+        legacy_review, _ = best_of(lambda: [json.loads(row.diff_blob) for row in connection.exec_driver_sql(
+            f"SELECT id, change_type, diff_blob FROM {LEGACY_TABLE} ORDER BY id"
+        )])
+        typed_review, _ = best_of(review_all)
+        print(f"review   legacy {legacy_review:6.3f}s  typed {typed_review:6.3f}s  (every change decoded)")
+        db.session.rollback()
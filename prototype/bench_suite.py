@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+# Run as a script: always a throwaway file database with the production storage
+# profile, never an exported DATABASE_NAME (the library is dropped per size).
+# Importers (e.g. the test suite) configure the app themselves.
+_WORKDIR = os.path.join(tempfile.gettempdir(), "bookmarks-bench")
+if __name__ == "__main__":
+    os.environ['FLASK_ENV'] = 'production'
+    os.environ['DATABASE_NAME'] = os.path.join(_WORKDIR, "library.db")
+os.makedirs(_WORKDIR, exist_ok=True)
+
+from api import app, db
+from firefox_reader import get_firefox_bookmarks
+from chrome_parser import parse_chrome_bookmarks
+from parser import parse_netscape_bookmarks
+import profile_generator
+import response_cache
+
+# End-to-end benchmark suite on generated profiles (see profile_generator.py).
+# Per library size it times the three readers, then the HTTP paths on a fresh
+# library: Firefox full sync + commit, a re-sync of a drifted profile + commit,
+# a Chrome sync, and /api/bookmarks pages (response cache off). Results are
+# saved as JSON; --compare flags benchmarks slower than a saved run.
+# Usage: python bench_suite.py [--sizes 10000,100000] [--out results.json] [--compare old.json]
+
+DEFAULT_SIZES = [10000, 100000]
+REGRESSION_THRESHOLD = 0.2 # 20% slower than the baseline
+
+
+def best_of(func, rounds):
+    """(best seconds, last result) over `rounds` calls."""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _post(client, path, payload=None):
+    res = client.post(path, json=payload or {})
+    body = res.get_json()
+    if res.status_code != 200:
+        raise RuntimeError(f"{path} failed ({res.status_code}): {body}")
+    return body
+
+
+def reset_library():
+    with app.app_context():
+        database = db.engine.url.database
+        if database not in (None, "", ":memory:") and \
+                not os.path.abspath(database).startswith(os.path.join(_WORKDIR, "")):
+            raise RuntimeError(f"Refusing to drop {database}: the bench only resets databases in {_WORKDIR}")
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+
+def run_size(client, size, workdir, depth=4, rounds=3, seed=42):
+    """Results for one library size: [{benchmark, size, seconds, items, per_second}]."""
+    results = []
+
+    def record(name, seconds, items):
+        results.append({"benchmark": name, "size": size, "seconds": round(seconds, 6), "items": items,
+                        "per_second": round(items / seconds) if seconds else None})
+        print(f"{name:<18} {size:>9}  {seconds:8.3f}s  {items:>9} items")
+
+    tree = profile_generator.generate(size, depth=depth, seed=seed)
+    paths = profile_generator.write_profiles(tree, os.path.join(workdir, f"profiles-{size}"), seed)
+    places = os.path.join(paths["firefox"], "places.sqlite")
+
+    # Readers (pure parsing, best of `rounds`)
+    seconds, result = best_of(lambda: get_firefox_bookmarks(places), rounds)
+    record("read_firefox", seconds, len(result["bookmarks"]))
+    seconds, result = best_of(lambda: parse_chrome_bookmarks(os.path.join(paths["chrome"], "Bookmarks")), rounds)
+    record("parse_chrome", seconds, len(result["bookmarks"]))
+    with open(paths["netscape"], encoding="utf-8") as f:
+        content = f.read()
+    seconds, result = best_of(lambda: parse_netscape_bookmarks(content), rounds)
+    record("parse_netscape", seconds, len(result))
+
+    # Sync and commit over HTTP (stateful: one run each, on a fresh library)
+    reset_library()
+    seconds, body = best_of(lambda: _post(client, '/sync_firefox', {"path": paths["firefox"]}), 1)
+    record("sync_firefox", seconds, body["counts"]["total_changes"])
+    seconds, committed = best_of(lambda: _post(client, f'/sync/commit/{body["batch_id"]}'), 1)
+    record("commit_firefox", seconds, committed["count"])
+
+    profile_generator.write_places(profile_generator.drift(tree), places, seed)
+    seconds, body = best_of(lambda: _post(client, '/sync_firefox', {"path": paths["firefox"]}), 1)
+    record("resync_firefox", seconds, body["counts"]["total_changes"])
+    seconds, committed = best_of(lambda: _post(client, f'/sync/commit/{body["batch_id"]}'), 1)
+    record("commit_resync", seconds, committed["count"])
+
+    seconds, body = best_of(lambda: _post(client, '/sync_chrome', {"path": paths["chrome"]}), 1)
+    record("sync_chrome", seconds, body["counts"]["total_changes"])
+
+    # Listing: first page, a deep offset page and a search page
+    for name, query in (("list_first_page", "limit=100"), ("list_deep_page", f"limit=100&offset={size // 2}"),
+                        ("list_search", "limit=100&q=python")):
+        seconds, res = best_of(lambda: client.get(f'/api/bookmarks?{query}'), rounds)
+        if res.status_code != 200:
+            raise RuntimeError(f"/api/bookmarks?{query} failed ({res.status_code})")
+        record(name, seconds, len(res.get_json()["bookmarks"]))
+    return results
+
+
+def run_suite(sizes, workdir, depth=4, rounds=3, seed=42):
+    """The full suite as a JSON-ready dict: {"meta": {...}, "results": [...]}."""
+    os.makedirs(workdir, exist_ok=True)
+    cache_bytes = response_cache.cache.max_bytes
+    response_cache.cache.max_bytes = 0 # Time the queries, not cache hits
+    try:
+        with app.test_client() as client:
+            results = [r for size in sizes for r in run_size(client, size, workdir, depth, rounds, seed)]
+    finally:
+        response_cache.cache.max_bytes = cache_bytes
+    return {"meta": _meta(sizes, depth, rounds, seed), "results": results}
+
+
+def _meta(sizes, depth, rounds, seed):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "storage_profile": app.config.get('STORAGE_PROFILE'),
+        "sizes": sizes, "depth": depth, "rounds": rounds, "seed": seed
+    }
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    [(benchmark, size, old seconds, new seconds, ratio)] for every benchmark in
+    both runs, and the subset that got more than `threshold` slower.
+    """
+    old = {(r["benchmark"], r["size"]): r["seconds"] for r in baseline["results"]}
+    rows = []
+    for r in current["results"]:
+        key = (r["benchmark"], r["size"])
+        if key in old and old[key]:
+            rows.append((*key, old[key], r["seconds"], r["seconds"] / old[key]))
+    return rows, [row for row in rows if row[4] > 1 + threshold]
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Benchmarks readers, sync, commit and listing on generated profiles.")
+    args.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated library sizes")
+    args.add_argument("--depth", type=int, default=4)
+    args.add_argument("--rounds", type=int, default=3)
+    args.add_argument("--seed", type=int, default=42)
+    args.add_argument("--out", help="results file (default bench-<commit>.json)")
+    args.add_argument("--compare", help="baseline results to compare against")
+    args.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    opts = args.parse_args()
+
+    sizes = [int(s) for s in opts.sizes.split(",") if s]
+    suite = run_suite(sizes, _WORKDIR, opts.depth, opts.rounds, opts.seed)
+    out = opts.out or f"bench-{suite['meta']['commit'] or 'local'}.json"
+    with open(out, "w") as f:
+        json.dump(suite, f, indent=2)
+    print(f"Saved {len(suite['results'])} results to {out}")
+    with app.app_context():
+        db.engine.dispose()
+    shutil.rmtree(_WORKDIR, ignore_errors=True)
+
+    if opts.compare:
+        with open(opts.compare) as f:
+            rows, regressions = compare(json.load(f), suite, opts.threshold)
+        for name, size, old, new, ratio in rows:
+            flag = "  REGRESSION" if (name, size, old, new, ratio) in regressions else ""
+            print(f"{name:<18} {size:>9}  {old:8.3f}s -> {new:8.3f}s  {ratio:5.2f}x{flag}")
+        if regressions:
+            sys.exit(1)
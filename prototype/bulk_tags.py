@@ -0,0 +1,68 @@
+# Set-based tagging for many bookmarks at once (POST /bookmarks/tags).
+# The selection is materialized into a temp table once, then each tag change is
+# a single INSERT OR IGNORE ... SELECT / DELETE against bookmark_tags. Nothing is
+# committed here: the caller commits the whole operation as one transaction.
+from database import db, Tag
+
+TARGET_CHUNK = 5000
+
+CREATE_TARGETS = "CREATE TEMP TABLE IF NOT EXISTS tag_targets (id INTEGER PRIMARY KEY)"
+
+tag_targets = db.table("tag_targets", db.column("id"), schema="temp")
+
+# Explicit id lists: unknown ids are dropped
+INSERT_EXISTING = db.text(
+    "INSERT OR IGNORE INTO temp.tag_targets (id) SELECT id FROM bookmarks WHERE id IN :ids"
+).bindparams(db.bindparam("ids", expanding=True))
+
+ADD_TAGS = db.text("""
+INSERT OR IGNORE INTO bookmark_tags (bookmark_id, tag_id)
+SELECT t.id, tags.id FROM temp.tag_targets t CROSS JOIN tags
+WHERE tags.id IN :tag_ids
+""").bindparams(db.bindparam("tag_ids", expanding=True))
+
+REMOVE_TAGS = db.text("""
+DELETE FROM bookmark_tags
+WHERE tag_id IN :tag_ids AND bookmark_id IN (SELECT id FROM temp.tag_targets)
+""").bindparams(db.bindparam("tag_ids", expanding=True))
+
+
+def _load_targets(connection, targets):
+    """Fills temp.tag_targets from a select of bookmark ids or a list of ids. Returns the count."""
+    connection.exec_driver_sql(CREATE_TARGETS)
+    connection.exec_driver_sql("DELETE FROM temp.tag_targets")
+    if isinstance(targets, (list, tuple, set)):
+        ids = list(targets)
+        for start in range(0, len(ids), TARGET_CHUNK):
+            connection.execute(INSERT_EXISTING, {"ids": ids[start:start + TARGET_CHUNK]})
+    else:
+        connection.execute(tag_targets.insert().prefix_with("OR IGNORE").from_select(["id"], targets))
+    return connection.exec_driver_sql("SELECT count(*) FROM temp.tag_targets").scalar()
+
+
+def _tag_ids(connection, names, create):
+    if not names:
+        return []
+    if create:
+        connection.execute(Tag.__table__.insert().prefix_with("OR IGNORE"), [{"name": n} for n in names])
+    return connection.execute(db.select(Tag.id).where(Tag.name.in_(names))).scalars().all()
+
+
+def tag_bookmarks(targets, add=(), remove=()):
+    """
+    Adds the tags named in `add` (creating missing ones) to every target bookmark
+    and removes those named in `remove`. `targets` is a select of bookmark ids or
+    a list of ids. Returns {"matched", "added", "removed"} link counts.
+    """
+    connection = db.session.connection()
+    matched = _load_targets(connection, targets)
+    added = removed = 0
+    if matched:
+        add_ids = _tag_ids(connection, add, create=True)
+        remove_ids = _tag_ids(connection, remove, create=False)
+        if remove_ids:
+            removed = connection.execute(REMOVE_TAGS, {"tag_ids": remove_ids}).rowcount
+        if add_ids:
+            added = connection.execute(ADD_TAGS, {"tag_ids": add_ids}).rowcount
+    connection.exec_driver_sql("DELETE FROM temp.tag_targets")
+    return {"matched": matched, "added": added, "removed": removed}
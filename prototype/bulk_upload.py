@@ -0,0 +1,185 @@
+# Streaming pipeline for /upload_bulk.
+# The upload is parsed straight from its stream and written in fixed-size batches:
+# each batch is loaded into a temp table with executemany and lands in `bookmarks`
+# with one INSERT ... SELECT that skips URLs already stored (search indexing is
+# deferred to one bulk statement per batch, folder counts to one adjustment per
+# batch). Every batch is committed on its own, so a failure part-way keeps what was already imported.
+import io
+import threading
+from queue import Queue, Full
+from datetime import datetime
+from database import db
+from url_normalizer import normalize_url
+import jobs
+import search_index
+import folders
+import logs
+
+log = logs.get_logger("upload")
+
+UPLOAD_BATCH = 5000
+# Parsed batches buffered ahead of the writer (bounds memory)
+PARSE_AHEAD = 2
+
+# Duplicates inside one batch: first occurrence of a normalized URL wins
+CREATE_BATCH = """
+CREATE TEMP TABLE IF NOT EXISTS upload_batch (
+    pos INTEGER PRIMARY KEY,
+    norm TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL,
+    title TEXT,
+    folder TEXT,
+    folder_id INTEGER
+)
+"""
+
+INSERT_BATCH = "INSERT OR IGNORE INTO temp.upload_batch (norm, url, title, folder, folder_id) VALUES (?, ?, ?, ?, ?)"
+
+# Duplicates against the library (including earlier batches): NOT EXISTS on the normalized_url index
+APPLY_BATCH = db.text("""
+INSERT INTO bookmarks (url, normalized_url, title, folder_path, folder_id, source_browser, version, status, last_synced_at)
+SELECT u.url, u.norm, u.title, u.folder, u.folder_id, :source, 1, 'synced', :now
+FROM temp.upload_batch u
+WHERE NOT EXISTS (SELECT 1 FROM bookmarks b WHERE b.normalized_url = u.norm)
+ORDER BY u.pos
+""").bindparams(db.bindparam("now", type_=db.DateTime))
+
+
+def _iter_json(stream):
+    """
+    Bookmarks from a JSON upload: a plain list, {"bookmarks": [...]} or a
+    native Chrome Bookmarks file. List elements are decoded one at a time.
+    """
+    from json_events import EventReader, skip_value
+    text = io.TextIOWrapper(stream, encoding='utf-8', errors='ignore')
+    try:
+        reader = EventReader(text)
+        events = reader.events()
+        event, _ = next(events)
+        if event == "start_array":
+            yield from reader.items()
+            return
+        if event != "start_map":
+            return
+        for event, key in events:
+            if event == "end_map":
+                return
+            event, _ = next(events)
+            if key == "bookmarks" and event == "start_array":
+                yield from reader.items()
+                return
+            if key == "roots":
+                # Chrome format: its streaming parser rewinds and reads the upload itself
+                from chrome_parser import stream_chrome_bookmarks
+                yield from stream_chrome_bookmarks(stream)
+                return
+            skip_value(events, event)
+    finally:
+        text.detach() # Leave the upload stream open for the caller
+
+
+def iter_upload(stream, filename):
+    """Parses an uploaded file (HTML or JSON) into bookmark dicts, lazily."""
+    if filename.endswith('.html'):
+        from parser import iter_netscape_bookmarks
+        text = io.TextIOWrapper(stream, encoding='utf-8', errors='ignore')
+        try:
+            yield from iter_netscape_bookmarks(text)
+        finally:
+            text.detach()
+    elif filename.endswith('.json') or filename == 'Bookmarks':
+        for bm in _iter_json(stream):
+            # Ensure items are dicts
+            if isinstance(bm, dict):
+                yield bm
+            elif isinstance(bm, str):
+                yield {"url": bm, "title": "Imported Bookmark"}
+
+
+def _write_batch(rows, source):
+    """Loads one batch through the temp table and commits it. Returns rows inserted."""
+    connection = db.session.connection()
+    connection.exec_driver_sql(CREATE_BATCH)
+    connection.exec_driver_sql("DELETE FROM temp.upload_batch")
+    folder_ids = folders.ensure_paths(connection, {row[3] or "" for row in rows})
+    connection.exec_driver_sql(INSERT_BATCH, [(*row, folder_ids[row[3] or ""]) for row in rows])
+    start = connection.exec_driver_sql("SELECT coalesce(max(id), 0) FROM bookmarks").scalar()
+    with search_index.deferred(connection):
+        inserted = connection.execute(APPLY_BATCH, {"source": source, "now": datetime.utcnow()}).rowcount
+    folders.adjust_counts(connection, dict(connection.exec_driver_sql(
+        "SELECT folder_id, count(*) FROM bookmarks WHERE id > ? AND folder_id IS NOT NULL GROUP BY folder_id", (start,)
+    ).all()))
+    connection.exec_driver_sql("DELETE FROM temp.upload_batch")
+    db.session.commit()
+    return inserted
+
+
+def _put(queue, item, stop):
+    """Blocking put that gives up once the consumer has stopped."""
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def _parse_batches(stream, filename, batch_size, queue, stop):
+    """Producer thread: parses the upload into row batches, then None (or the error)."""
+    try:
+        rows = []
+        for bm in iter_upload(stream, filename):
+            url = bm.get('url')
+            if not url:
+                continue
+            rows.append((normalize_url(url), url, bm.get('title'), bm.get('folder', '')))
+            if len(rows) >= batch_size:
+                if not _put(queue, rows, stop):
+                    return
+                rows = []
+        if rows and not _put(queue, rows, stop):
+            return
+        _put(queue, None, stop)
+    except Exception as e:
+        _put(queue, e, stop)
+
+
+def upload_bookmarks(stream, filename, report, batch_size=None):
+    """
+    Imports an uploaded file batch by batch. Parsing runs on a helper thread
+    while the previous batch is written (SQLite releases the GIL), with at most
+    PARSE_AHEAD batches buffered. `report` is filled as batches land
+    (received/inserted/duplicates totals plus one entry per batch), so it is
+    accurate even when parsing fails part-way and the error propagates.
+    """
+    batch_size = batch_size or UPLOAD_BATCH
+    source = f"Upload: {filename}"
+    report.update({"received": 0, "inserted": 0, "duplicates": 0, "batches": []})
+
+    queue = Queue(maxsize=PARSE_AHEAD)
+    stop = threading.Event()
+    parser_thread = threading.Thread(
+        target=_parse_batches, args=(stream, filename, batch_size, queue, stop),
+        name="upload-parser", daemon=True
+    )
+    parser_thread.start()
+    try:
+        while True:
+            rows = queue.get()
+            if rows is None:
+                break
+            if isinstance(rows, Exception):
+                raise rows
+            inserted = _write_batch(rows, source)
+            report["received"] += len(rows)
+            report["inserted"] += inserted
+            report["duplicates"] += len(rows) - inserted
+            report["batches"].append({"batch": len(report["batches"]) + 1, "received": len(rows), "inserted": inserted})
+            log.info("[UPLOAD] %s: batch %s, %s/%s new (%s total)", filename, len(report['batches']), inserted,
+                     len(rows), report['received'])
+            jobs.report("upload", report["received"])
+    finally:
+        stop.set()
+        parser_thread.join()
+    return report
@@ -1,5 +1,63 @@
+import io
 import json
 import os
+from contextlib import contextmanager
+from folder_paths import join_path
+from json_events import iter_events
+import logs
+
+log = logs.get_logger("chrome")
+
+# Mapping technical keys to human labels used in source screenshot
+ROOT_MAPPING = {
+    "bookmark_bar": "Bookmarks Toolbar",
+    "other": "Other Bookmarks",
+    "synced": "Mobile Bookmarks"
+}
+
+# Files at least this large are streamed instead of loaded with json.load
+STREAM_THRESHOLD = 16 * 1024 * 1024
+
+_MISSING = object()
+
+def _root_label(root_key, name=_MISSING):
+    """Label for a root folder: known mapping, else its own name, else the key."""
+    return ROOT_MAPPING.get(root_key, root_key if name is _MISSING else name)
+
+def _bookmark(node, folder):
+    return {
+        "title": node.get('name'),
+        "url": node.get('url'),
+        "folder": folder,
+        "source": "Chrome JSON"
+    }
+
+def iter_tree(roots):
+    """
+    Walks loaded Chrome roots depth-first with an explicit stack (no recursion)
+    and yields bookmarks in document order.
+    """
+    stack = []
+    # Chrome roots: bookmark_bar, other, synced
+    for root_key, root_node in reversed(list(roots.items())):
+        label = _root_label(root_key, root_node.get('name', _MISSING))
+        stack.append((root_node, label, True))
+
+    while stack:
+        node, current_path, is_root = stack.pop()
+        if not isinstance(node, dict):
+            continue
+
+        if node.get('type') == 'url':
+            yield _bookmark(node, current_path)
+
+        # Check children (folders)
+        if 'children' in node:
+            # If this is root, we don't append node_name (it's already the current_path label)
+            # Each folder's path is built once and shared by all its children
+            new_path = current_path if is_root else join_path(current_path, node.get('name'))
+            for child in reversed(node['children']):
+                stack.append((child, new_path, False))
 
 def parse_chrome_bookmarks(file_path):
     """
@@ -12,60 +70,148 @@ def parse_chrome_bookmarks(file_path):
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
-        
-        bookmarks = []
-        source_total = 0
-        
-        def walk_tree(node, current_path="", is_root=False):
-            nonlocal source_total
-            if isinstance(node, dict):
-                node_name = node.get('name')
-                
-                if node.get('type') == 'url':
-                    source_total += 1
-                    bookmarks.append({
-                        "title": node_name,
-                        "url": node.get('url'),
-                        "folder": current_path,
-                        "source": "Chrome JSON"
-                    })
-                
-                # Check children (folders)
-                if 'children' in node:
-                    # If this is root, we don't append node_name (it's already the current_path label)
-                    if is_root:
-                        new_path = current_path
-                    else:
-                        new_path = f"{current_path} > {node_name}" if current_path else node_name
-                        
-                    for child in node['children']:
-                        walk_tree(child, new_path)
-
-        # Chrome roots: bookmark_bar, other, synced
-        roots = data.get('roots', {})
-        
-        # Mapping technical keys to human labels used in source screenshot
-        root_mapping = {
-            "bookmark_bar": "Bookmarks Toolbar",
-            "other": "Other Bookmarks",
-            "synced": "Mobile Bookmarks"
-        }
 
-        for root_key, root_node in roots.items():
-            label = root_mapping.get(root_key, root_node.get('name', root_key))
-            walk_tree(root_node, label, is_root=True)
-        
+        bookmarks = list(iter_tree(data.get('roots', {})))
+
         return {
             "bookmarks": bookmarks,
             "metadata": {
-                "source_total": source_total,
+                "source_total": len(bookmarks),
                 "processed": len(bookmarks)
             }
         }
     except Exception as e:
-        print(f"Error parsing Chrome JSON: {e}")
+        log.error("Error parsing Chrome JSON: %s", e)
         return {"bookmarks": [], "metadata": {"source_total": 0, "processed": 0, "error": str(e)}}
 
+def _walk_events(events, folder_names, record):
+    """
+    Walks the JSON event stream of a Chrome Bookmarks file.
+    Folders are numbered in the order their 'children' array opens, which is
+    identical across passes. Chrome writes keys alphabetically, so a folder's
+    'name' only arrives after its children: with `record`, names are collected
+    into `folder_names`; otherwise bookmarks are yielded using them.
+    """
+    frames = [] # Open containers: dicts with 'kind' plus node state
+    key = None
+    folder_count = 0
+
+    for event, value in events:
+        parent = frames[-1] if frames else None
+
+        if event == "key":
+            key = value
+            continue
+
+        if event == "start_map":
+            if parent is None:
+                kind = "doc"
+            elif parent["kind"] == "doc" and key == "roots":
+                kind = "roots"
+            elif parent["kind"] == "roots":
+                kind = "node"
+            elif parent["kind"] == "children":
+                kind = "node"
+            else:
+                kind = "other"
+            frame = {"kind": kind}
+            if kind == "node":
+                frame["fields"] = {}
+                if parent["kind"] == "roots":
+                    frame["root_key"] = key
+                    frame["path"] = None # Resolved once the root's label is known
+                else:
+                    frame["path"] = parent["path"]
+            frames.append(frame)
+        elif event == "start_array":
+            if parent is not None and parent["kind"] == "node" and key == "children":
+                parent["ordinal"] = folder_count
+                path = None
+                if not record:
+                    name = folder_names.get(folder_count, _MISSING)
+                    if "root_key" in parent:
+                        # If this is root, we don't append node_name (the label is the path)
+                        path = _root_label(parent["root_key"], name)
+                    else:
+                        path = join_path(parent["path"], None if name is _MISSING else name)
+                folder_count += 1
+                frames.append({"kind": "children", "path": path})
+            else:
+                frames.append({"kind": "other"})
+        elif event in ("end_map", "end_array"):
+            frame = frames.pop()
+            if frame["kind"] == "node":
+                fields = frame["fields"]
+                if record:
+                    if "ordinal" in frame:
+                        folder_names[frame["ordinal"]] = fields.get("name", _MISSING)
+                elif fields.get("type") == "url":
+                    path = frame["path"]
+                    if path is None: # A url node placed directly under roots
+                        path = _root_label(frame["root_key"], fields.get("name", _MISSING))
+                    yield _bookmark(fields, path)
+        elif parent is not None and parent["kind"] == "node" and key in ("name", "type", "url"):
+            parent["fields"][key] = value
+
+@contextmanager
+def _open_text(source):
+    """Text view of a path or of a seekable binary file object (rewound, left open)."""
+    if isinstance(source, str):
+        with open(source, 'r', encoding='utf-8') as f:
+            yield f
+        return
+    source.seek(0)
+    text = io.TextIOWrapper(source, encoding='utf-8', errors='ignore')
+    try:
+        yield text
+    finally:
+        text.detach()
+
+def stream_chrome_bookmarks(source, metadata=None):
+    """
+    Streaming parse mode for very large Chrome Bookmarks files.
+    Generator yielding bookmarks without loading the JSON document or the full
+    bookmark list: pass 1 collects folder names, pass 2 yields bookmarks.
+    `source` is a path or a seekable binary file object (e.g. an upload).
+    If given, `metadata` is filled with the same counts as parse_chrome_bookmarks
+    (final once the generator is exhausted). Parse errors are raised.
+    """
+    if metadata is None:
+        metadata = {}
+    metadata.update({"source_total": 0, "processed": 0})
+    if isinstance(source, str) and not os.path.exists(source):
+        return
+
+    folder_names = {}
+    with _open_text(source) as f:
+        for _ in _walk_events(iter_events(f), folder_names, record=True):
+            pass
+
+    with _open_text(source) as f:
+        for bookmark in _walk_events(iter_events(f), folder_names, record=False):
+            metadata["source_total"] += 1
+            metadata["processed"] += 1
+            yield bookmark
+
+def spool_chrome_bookmarks(source, spool_path):
+    """
+    Streams a large Bookmarks file into `spool_path`, one JSON bookmark per
+    line, and returns the metadata. Lets syncs do the slow parse before they
+    take the database writer; read it back with read_spool.
+    """
+    metadata = {}
+    with open(spool_path, "w", encoding="utf-8") as out:
+        for bookmark in stream_chrome_bookmarks(source, metadata):
+            out.write(json.dumps(bookmark))
+            out.write("\n")
+    return metadata
+
+def read_spool(spool_path):
+    """Yields the bookmarks written by spool_chrome_bookmarks."""
+    with open(spool_path, encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
 if __name__ == "__main__":
     # Test path for Linux
     test_path = os.path.expanduser("~/.config/google-chrome/Default/Bookmarks")
@@ -21,6 +21,53 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
     
+    # Storage profile (see storage.py): 'wal' = WAL with tuned pragmas, a pool of
+    # read-only connections for GET requests and one queued writer connection
+    # (one at a time across serve.py's workers too); 'default' = a plain
+    # connection pool. Not applicable to the in-memory test DB.
+    STORAGE_PROFILE = 'default' if FLASK_ENV == 'testing' else os.environ.get('STORAGE_PROFILE', 'wal')
+    SQLITE_READERS = int(os.environ.get('SQLITE_READERS', 8))
+    SQLITE_CACHE_MB = float(os.environ.get('SQLITE_CACHE_MB', 64))
+    SQLITE_MMAP_MB = float(os.environ.get('SQLITE_MMAP_MB', 256))
+    # Seconds a write waits for its turn on the writer connection (as long as
+    # SQLite's own busy timeout: sessions only hold it while they write)
+    WRITE_QUEUE_TIMEOUT = float(os.environ.get('WRITE_QUEUE_TIMEOUT', 30))
+    if STORAGE_PROFILE == 'wal':
+        SQLALCHEMY_ENGINE_OPTIONS = dict(SQLALCHEMY_ENGINE_OPTIONS, pool_size=1, max_overflow=0,
+                                         pool_timeout=WRITE_QUEUE_TIMEOUT)
+    
+    # Background Jobs
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+    # Processes for offloaded parsing (0 = parse on the job thread)
+    JOB_PARSE_PROCESSES = int(os.environ.get('JOB_PARSE_PROCESSES', 0 if FLASK_ENV == 'testing' else min(4, os.cpu_count() or 1)))
+    # Job state file shared by worker processes (unset = in-process only;
+    # serve.py defaults it next to the database when running several workers)
+    JOB_STATE_DB = os.environ.get('JOB_STATE_DB')
+
+    # Production server (serve.py): preforked worker processes x threads each
+    WEB_WORKERS = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', 8))
+    
+    # Response cache for read endpoints (0 disables it)
+    RESPONSE_CACHE_MB = float(os.environ.get('RESPONSE_CACHE_MB', 32))
+    
+    # Bookmark history retention, applied by the 'history_compact' job (0 = no limit)
+    HISTORY_KEEP_VERSIONS = int(os.environ.get('HISTORY_KEEP_VERSIONS', 100))
+    HISTORY_KEEP_DAYS = int(os.environ.get('HISTORY_KEEP_DAYS', 0))
+    HISTORY_TOMBSTONE_DAYS = int(os.environ.get('HISTORY_TOMBSTONE_DAYS', 90))
+    
+    # Logging: level for bookmarks.* loggers; INFO and DEBUG records are limited
+    # to LOG_RATE_BURST per message every LOG_RATE_INTERVAL seconds
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'WARNING' if FLASK_ENV == 'testing' else 'INFO').upper()
+    LOG_RATE_INTERVAL = float(os.environ.get('LOG_RATE_INTERVAL', 1))
+    LOG_RATE_BURST = int(os.environ.get('LOG_RATE_BURST', 5))
+
+    # Slow-query recorder (see slow_queries.py): statements slower than
+    # SLOW_QUERY_MS get fingerprinted and EXPLAINed (0 = off)
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 0))
+    SLOW_QUERY_LARGE_TABLE_ROWS = int(os.environ.get('SLOW_QUERY_LARGE_TABLE_ROWS', 10000))
+    SLOW_QUERY_MAX_FINGERPRINTS = int(os.environ.get('SLOW_QUERY_MAX_FINGERPRINTS', 500))
+
     # API Settings
     API_BASE_URL = os.environ.get('API_BASE_URL', '') 
 
@@ -1,8 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
 from datetime import datetime
-import json
+from url_normalizer import normalize_url
+from storage import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 class Bookmark(db.Model):
     """The main bookmarks table."""
@@ -10,8 +12,15 @@ class Bookmark(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     url = db.Column(db.String, nullable=False, index=True)
+    # Canonical URL (url_normalizer) used for sync matching, dedupe and lookups.
+    # The default covers Core inserts; ORM assignments go through the validator.
+    normalized_url = db.Column(db.String, index=True,
+                               default=lambda ctx: normalize_url(ctx.get_current_parameters().get('url')))
     title = db.Column(db.String)
+    # Folder path as the source reported it (what sync diffs against and search indexes)
     folder_path = db.Column(db.String, default="")
+    # Place in the folder tree (NULL = top level); kept in step with folder_path by folders.py
+    folder_id = db.Column(db.Integer, db.ForeignKey('folders.id'), index=True, nullable=True)
     source_browser = db.Column(db.String) # e.g. 'firefox', 'chrome'
     source_profile = db.Column(db.String) # Profile path
     
@@ -20,15 +29,54 @@ class Bookmark(db.Model):
     status = db.Column(db.String, default='synced') # synced, conflict
     last_synced_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @validates('url')
+    def _sync_normalized_url(self, key, url):
+        self.normalized_url = normalize_url(url)
+        return url
+
+    def to_dict(self, folder_paths=None):
+        return Bookmark.serialize(self, [t.to_dict() for t in self.tags], folder_paths)
+
+    @staticmethod
+    def serialize(row, tags, folder_paths=None):
+        """
+        JSON shape shared by ORM instances and raw result rows (streaming).
+        `folder_paths` ({folder_id: path}, see folders.paths) gives the current tree
+        path, which differs from folder_path once a folder was renamed or moved.
+        """
+        return {
+            "id": row.id,
+            "url": row.url,
+            "title": row.title,
+            "folder": (folder_paths or {}).get(row.folder_id, row.folder_path),
+            "folder_id": row.folder_id,
+            "source": f"{row.source_browser} ({row.version})",
+            "status": row.status,
+            "tags": tags
+        }
+
+class Folder(db.Model):
+    """Folder tree (adjacency list) with cached bookmark counts."""
+    __tablename__ = 'folders'
+
+    id = db.Column(db.Integer, primary_key=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey('folders.id'), index=True, nullable=True)
+    name = db.Column(db.String, nullable=False)
+    # ' > ' path this folder was created for; later syncs of that path land here
+    # even after a rename or move (NULL for folders created by hand)
+    source_path = db.Column(db.String, unique=True, nullable=True)
+
+    # Bookmarks directly in this folder / in its whole subtree
+    bookmark_count = db.Column(db.Integer, nullable=False, default=0)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+
     def to_dict(self):
         return {
             "id": self.id,
-            "url": self.url,
-            "title": self.title,
-            "folder": self.folder_path,
-            "source": f"{self.source_browser} ({self.version})",
-            "status": self.status,
-            "tags": [t.to_dict() for t in self.tags]
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "count": self.bookmark_count,
+            "total": self.total_count
         }
 
 # Association Table for Many-to-Many
@@ -51,7 +99,9 @@ class Tag(db.Model):
 # For simplicity, we define the backref on Tag, but since Bookmark is already defined above,
 # we need to be careful. Ideally, relationship is defined on Bookmark or Tag.
 # Let's add it to Tag, referring to 'Bookmark' by string to avoid order issues.
-Tag.bookmarks = db.relationship('Bookmark', secondary=bookmark_tags, lazy='subquery',
+# Lazy on both sides: loading a tag must not pull in its bookmarks (list endpoints
+# load bookmark tags explicitly with joinedload or tags_by_bookmark).
+Tag.bookmarks = db.relationship('Bookmark', secondary=bookmark_tags, lazy=True,
         backref=db.backref('tags', lazy=True))
 
 class SyncBatch(db.Model):
@@ -62,13 +112,57 @@ class SyncBatch(db.Model):
     source = db.Column(db.String) # e.g. 'firefox_auto'
     status = db.Column(db.String, default='pending_review') # pending_review, approved, rejected
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+    # Row counts: read from the source, staged per type, applied by commits
+    rows_read = db.Column(db.Integer)
+    rows_new = db.Column(db.Integer)
+    rows_updated = db.Column(db.Integer)
+    rows_deleted = db.Column(db.Integer)
+    rows_committed = db.Column(db.Integer, default=0)
     
     # Relationship to changes
     changes = db.relationship('PendingChange', backref='batch', lazy=True)
 
+    def row_counts(self):
+        return {"read": self.rows_read, "new": self.rows_new, "updated": self.rows_updated,
+                "deleted": self.rows_deleted, "committed": self.rows_committed or 0}
+
+class SyncState(db.Model):
+    """Per-profile high-water marks for incremental sync."""
+    __tablename__ = 'sync_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String) # e.g. 'firefox'
+    profile_path = db.Column(db.String, unique=True, nullable=False)
+
+    # Source change mark (Firefox: max moz_bookmarks.lastModified) covered by committed syncs
+    high_water_mark = db.Column(db.BigInteger)
+    # Mark observed by a staged batch; promoted once that batch is fully committed
+    pending_mark = db.Column(db.BigInteger)
+    pending_batch_id = db.Column(db.Integer, db.ForeignKey('sync_batches.id'), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @staticmethod
+    def promote(batch_id):
+        """Advances the mark of any profile whose pending batch was committed."""
+        for state in SyncState.query.filter_by(pending_batch_id=batch_id):
+            state.high_water_mark = state.pending_mark
+            state.pending_mark = None
+            state.pending_batch_id = None
+
+    @staticmethod
+    def discard(batch_id):
+        """Drops the pending mark of a rejected batch (its changes will be re-read)."""
+        for state in SyncState.query.filter_by(pending_batch_id=batch_id):
+            state.pending_mark = None
+            state.pending_batch_id = None
+
 class PendingChange(db.Model):
     """Staging area for changes before they are committed."""
     __tablename__ = 'pending_changes'
+    # Review counts group by (batch_id, change_type); pages scan one batch by id
+    __table_args__ = (db.Index('ix_pending_changes_batch_id', 'batch_id', 'change_type'),)
 
     id = db.Column(db.Integer, primary_key=True)
     batch_id = db.Column(db.Integer, db.ForeignKey('sync_batches.id'))
@@ -76,37 +170,108 @@ class PendingChange(db.Model):
     # If updating an existing bookmark
     bookmark_id = db.Column(db.Integer, db.ForeignKey('bookmarks.id'), nullable=True)
     
-    change_type = db.Column(db.String) # new, update, delete
+    change_type = db.Column(db.String) # new, update, mark_deleted, merge
     
-    # Store the diff as JSON (e.g. {"title": {"old": "A", "new": "B"}})
-    diff_blob = db.Column(db.String) 
+    # The change as typed columns holding only what the bookmark row doesn't:
+    # new: the incoming title, url, folder and source;
+    # update: a bitmask of the fields that drifted, and only those fields' new values;
+    # mark_deleted: nothing beyond bookmark_id;
+    # merge: the surviving bookmark, and the similarity of a near duplicate (NULL = exact).
+    # Old values are the bookmark's own until the change is committed.
+    title = db.Column(db.String)
+    url = db.Column(db.String)
+    folder = db.Column(db.String)
+    source = db.Column(db.String)
+    changed = db.Column(db.Integer)
+    target_id = db.Column(db.Integer)
+    similarity = db.Column(db.Float)
+
+    CHANGED_TITLE = 1
+    CHANGED_FOLDER = 2
 
     def get_diff(self):
-        return json.loads(self.diff_blob) if self.diff_blob else {}
+        def details(bookmark_id):
+            bookmark = db.session.get(Bookmark, bookmark_id) if bookmark_id is not None else None
+            if bookmark is None:
+                return None
+            return {"title": bookmark.title, "url": bookmark.url, "folder": bookmark.folder_path,
+                    "source": bookmark.source_browser}
+        return PendingChange.decode_diff(self, details(self.bookmark_id), details(self.target_id))
+
+    @staticmethod
+    def decode_diff(row, current=None, survivor=None):
+        """
+        The change as a diff dict (the API's format). Works on ORM objects and raw
+        rows alike; `current` and `survivor` are the {title, url, folder, source}
+        of the changed bookmark and of a merge's survivor, if known.
+        """
+        kind = row.change_type
+        if kind == 'new':
+            return {"title": row.title, "url": row.url, "folder": row.folder, "source": row.source}
+        current = current or {}
+        if kind == 'update':
+            changed = row.changed or 0
+            return {
+                "old": {"title": current.get("title"), "folder": current.get("folder")},
+                "new": {
+                    "title": row.title if changed & PendingChange.CHANGED_TITLE else current.get("title"),
+                    "url": current.get("url"),
+                    "folder": row.folder if changed & PendingChange.CHANGED_FOLDER else current.get("folder"),
+                    "source": current.get("source")
+                }
+            }
+        if kind == 'merge':
+            diff = {
+                "kind": "near" if row.similarity is not None else "exact",
+                "similarity": row.similarity if row.similarity is not None else 1.0,
+                "into": row.target_id,
+                "url": current.get("url"), "title": current.get("title"), "folder": current.get("folder")
+            }
+            if survivor is not None:
+                diff["survivor"] = {"url": survivor["url"], "title": survivor["title"], "folder": survivor["folder"]}
+            return diff
+        return {"title": current.get("title"), "url": current.get("url")}
+
 class BookmarkHistory(db.Model):
-    """Stores historical versions of bookmarks."""
+    """Historical versions of bookmarks, as backward deltas with periodic keyframes (see history.py)."""
     __tablename__ = 'bookmark_history'
+    __table_args__ = (
+        db.Index('ix_bookmark_history_bookmark_version', 'bookmark_id', 'version'),
+        db.Index('ix_bookmark_history_created_at', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    bookmark_id = db.Column(db.Integer, db.ForeignKey('bookmarks.id'), nullable=False)
+    # No foreign key: a deleted bookmark's history stays behind its tombstone
+    bookmark_id = db.Column(db.Integer, nullable=False)
     version = db.Column(db.Integer, nullable=False)
-    
-    url = db.Column(db.String, nullable=False)
+
+    # Bitmask of the fields stored below (history.TITLE/FOLDER/URL); the others are
+    # the same as in the next newer version. All three set = a keyframe.
+    changed = db.Column(db.Integer, nullable=False, default=7)
+    url = db.Column(db.String)
     title = db.Column(db.String)
     folder_path = db.Column(db.String)
-    
+
+    # 'update', 'revert' or 'deleted' (tombstone: the bookmark's final state)
+    event = db.Column(db.String, nullable=False, default='update')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    def to_dict(self):
+    @staticmethod
+    def serialize(row, state):
+        """JSON shape of a history row, with its full `state` rebuilt by history.py."""
         return {
-            "id": self.id,
-            "bookmark_id": self.bookmark_id,
-            "version": self.version,
-            "url": self.url,
-            "title": self.title,
-            "folder": self.folder_path,
-            "created_at": self.created_at.isoformat()
+            "id": row.id,
+            "bookmark_id": row.bookmark_id,
+            "version": row.version,
+            "event": row.event,
+            "url": state["url"],
+            "title": state["title"],
+            "folder": state["folder_path"],
+            "created_at": row.created_at.isoformat()
         }
 
-# Add relationship to Bookmark
-Bookmark.history = db.relationship('BookmarkHistory', backref='bookmark', lazy=True, cascade="all, delete-orphan")
+# Add relationship to Bookmark (read-only: history is written by history.py)
+Bookmark.history = db.relationship(
+    'BookmarkHistory', primaryjoin='Bookmark.id == foreign(BookmarkHistory.bookmark_id)',
+    lazy=True, viewonly=True
+)
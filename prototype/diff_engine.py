@@ -0,0 +1,162 @@
+# Set-based diff engine for Smart Sync (Ref: docs/arch/sync_logic.md).
+# The incoming feed is loaded into a temp table and compared against `bookmarks`
+# with SQL joins; all PendingChange rows are written with one INSERT ... SELECT.
+from database import db, SyncBatch
+from url_normalizer import normalize_url
+import metrics
+
+FEED_CHUNK = 5000
+
+FEED_TABLE = "temp.sync_feed"
+
+# Rows are matched on the normalized URL (url_normalizer); the first
+# occurrence of a normalized URL wins (INSERT OR IGNORE on the UNIQUE norm column)
+CREATE_FEED = """
+CREATE TEMP TABLE IF NOT EXISTS sync_feed (
+    pos INTEGER PRIMARY KEY,
+    norm TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL,
+    title TEXT,
+    folder TEXT,
+    source TEXT
+)
+"""
+
+INSERT_FEED = f"INSERT OR IGNORE INTO {FEED_TABLE} (norm, url, title, folder, source) VALUES (?, ?, ?, ?, ?)"
+
+# One existing row per normalized URL for this source (latest id wins, like the
+# old dict build). SQLite fills bare columns from the row that produced max(id).
+EXISTING_CTE = """
+WITH existing AS MATERIALIZED (
+    SELECT max(id) AS id, url, normalized_url AS norm, title, folder_path, status
+    FROM bookmarks
+    WHERE source_browser LIKE :source_pattern
+    GROUP BY normalized_url
+)
+"""
+
+# Case A: NEW (URL not found) and Case B: EXISTING with metadata drift (Title or Folder).
+# Updates store a bitmask of the drifted fields and only those fields' new values;
+# everything else (old values included) stays readable on the bookmark itself.
+STAGE_FEED = f"""
+SELECT :batch_id, NULL, 'new', f.title, f.url, f.folder, f.source, NULL
+FROM {FEED_TABLE} f
+LEFT JOIN existing e ON e.norm = f.norm
+WHERE e.id IS NULL
+
+UNION ALL
+
+SELECT :batch_id, e.id, 'update',
+       CASE WHEN e.title IS NOT f.title THEN f.title END, NULL,
+       CASE WHEN e.folder_path IS NOT f.folder THEN f.folder END, NULL,
+       (e.title IS NOT f.title) | ((e.folder_path IS NOT f.folder) << 1)
+FROM {FEED_TABLE} f
+JOIN existing e ON e.norm = f.norm
+WHERE e.title IS NOT f.title OR e.folder_path IS NOT f.folder
+"""
+
+# Case C: MISSING from the presence table (Soft Delete), unless already flagged
+STAGE_MISSING = """
+SELECT :batch_id, e.id, 'mark_deleted', NULL, NULL, NULL, NULL, NULL
+FROM existing e
+WHERE e.status IS NOT 'absent_on_source'
+  AND NOT EXISTS (SELECT 1 FROM {presence} p WHERE p.norm = e.norm)
+"""
+
+# Compound branches run in order: new, update, mark_deleted
+INSERT_CHANGES = """
+INSERT INTO pending_changes (batch_id, bookmark_id, change_type, title, url, folder, source, changed)
+"""
+
+# Incremental feeds only carry changed rows; presence is checked against the
+# source's full live URL set instead (or skipped when nothing can be missing).
+LIVE_TABLE = "temp.sync_live"
+
+CREATE_LIVE = "CREATE TEMP TABLE IF NOT EXISTS sync_live (norm TEXT PRIMARY KEY) WITHOUT ROWID"
+
+INSERT_LIVE = f"INSERT OR IGNORE INTO {LIVE_TABLE} (norm) VALUES (?)"
+
+COUNT_CHANGES = """
+SELECT change_type, count(*) FROM pending_changes
+WHERE batch_id = :batch_id
+GROUP BY change_type
+"""
+
+
+def _load_chunked(connection, statement, rows):
+    """Streams parameter tuples into a temp table with chunked executemany."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= FEED_CHUNK:
+            connection.exec_driver_sql(statement, chunk)
+            chunk = []
+    if chunk:
+        connection.exec_driver_sql(statement, chunk)
+
+
+def _load_feed(connection, bookmarks):
+    """Streams the incoming bookmarks into the feed temp table in chunks."""
+    _load_chunked(connection, INSERT_FEED, (
+        (normalize_url(bm['url']), bm['url'], bm.get('title'), bm.get('folder'), bm.get('source'))
+        for bm in bookmarks if bm.get('url')
+    ))
+
+
+def stage_changes(connection, batch_id, source_pattern, bookmarks, incremental=False, live_urls=None,
+                  source="unknown"):
+    """
+    Diffs `bookmarks` (any iterable of {url, title, folder, source} dicts)
+    against existing bookmarks whose source_browser matches `source_pattern`
+    (SQL LIKE, case-insensitive) and stages PendingChange rows for `batch_id`.
+    With `incremental`, the feed holds only changed rows: deletions are taken
+    from `live_urls` (every URL still in the source), or skipped if it is None.
+    Loading the feed is timed as the `source` sync's 'diff' stage, the
+    INSERT ... SELECT as its 'stage' stage. Returns counts per change type.
+    """
+    statement = EXISTING_CTE + INSERT_CHANGES + STAGE_FEED
+    if not incremental:
+        statement += "UNION ALL" + STAGE_MISSING.format(presence=FEED_TABLE)
+    elif live_urls is not None:
+        statement += "UNION ALL" + STAGE_MISSING.format(presence=LIVE_TABLE)
+
+    connection.exec_driver_sql(CREATE_FEED)
+    try:
+        with metrics.sync_stage(source, "diff"):
+            connection.exec_driver_sql(f"DELETE FROM {FEED_TABLE}")
+            _load_feed(connection, bookmarks)
+            if incremental and live_urls is not None:
+                connection.exec_driver_sql(CREATE_LIVE)
+                connection.exec_driver_sql(f"DELETE FROM {LIVE_TABLE}")
+                _load_chunked(connection, INSERT_LIVE, ((normalize_url(url),) for url in live_urls))
+
+        with metrics.sync_stage(source, "stage"):
+            params = {"batch_id": batch_id, "source_pattern": source_pattern}
+            connection.execute(db.text(statement), params)
+            counts = dict(connection.execute(db.text(COUNT_CHANGES), {"batch_id": batch_id}).all())
+    finally:
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FEED_TABLE}")
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {LIVE_TABLE}")
+
+    return {
+        "new": counts.get("new", 0),
+        "updated": counts.get("update", 0),
+        "to_delete": counts.get("mark_deleted", 0),
+        "total_changes": sum(counts.values())
+    }
+
+
+def stage_sync(batch_source, source_pattern, bookmarks, incremental=False, live_urls=None):
+    """
+    Creates a pending_review SyncBatch and stages the diff for it in one transaction.
+    Returns (batch, counts). The caller commits.
+    """
+    batch = SyncBatch(source=batch_source, status="pending_review")
+    db.session.add(batch)
+    db.session.flush()
+
+    counts = stage_changes(db.session.connection(), batch.id, source_pattern, bookmarks,
+                           incremental=incremental, live_urls=live_urls,
+                           source=metrics.source_label(batch_source))
+    batch.rows_new, batch.rows_updated, batch.rows_deleted = counts["new"], counts["updated"], counts["to_delete"]
+    return batch, counts
@@ -0,0 +1,270 @@
+# Duplicate detection over the whole library.
+# Exact duplicates share a normalized_url. Near-duplicates (same page under a
+# different title or an URL variant normalization keeps apart) are only looked
+# for within one site: small sites are compared pairwise, large ones are blocked
+# with MinHash/LSH (a short signature over title and URL words; only bookmarks
+# sharing a band are compared), so the cost stays linear in library size instead
+# of O(n²). Similarity is not transitive, so a near group only holds URLs
+# similar to its survivor's (A~B and B~C does not put C with A), each with all
+# of its exact copies. Groups are proposed as a 'merge' review batch through
+# the regular SyncBatch/PendingChange flow.
+import re
+import random
+import hashlib
+from database import db, Bookmark, SyncBatch, PendingChange
+
+# Jaccard similarity of feature sets at or above which two bookmarks are near-duplicates
+NEAR_THRESHOLD = 0.75
+
+# MinHash: SIGNATURE_SIZE hashes split into LSH bands of BAND_ROWS
+SIGNATURE_SIZE = 12
+BAND_ROWS = 3
+
+# Sites with at most this many bookmarks are compared pairwise (cheaper than hashing)
+DIRECT_COMPARE = 24
+
+# Bands shared by more bookmarks than this carry no signal (e.g. a site's
+# boilerplate titles) and are skipped rather than compared pairwise
+MAX_BUCKET = 100
+
+# Groups kept in the GET /duplicates report (its summary still counts all of them)
+REPORT_GROUPS = 1000
+
+WORD_RE = re.compile(r"[^\W_]{2,}")
+SITE_PREFIXES = ("www.", "m.", "mobile.")
+
+_rng = random.Random(1)
+_masks = [_rng.getrandbits(64) for _ in range(SIGNATURE_SIZE)]
+
+bookmarks = Bookmark.__table__
+pending = PendingChange.__table__
+
+
+def source_family(source_browser):
+    """'Upload: a.html' and 'Upload: b.json' are one family; browsers are their own."""
+    return (source_browser or "").split(":", 1)[0]
+
+
+def _site_and_rest(normalized_url):
+    scheme, sep, rest = normalized_url.partition("://")
+    if not sep:
+        return "", normalized_url
+    host, _, rest = rest.partition("/")
+    for prefix in SITE_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    return host, rest
+
+
+def _tokens(title, rest):
+    return frozenset(WORD_RE.findall(f"{title or ''} {rest}".lower()))
+
+
+def features(title, normalized_url):
+    """
+    (site, feature set) for similarity: title words plus URL path/query words.
+    Only bookmarks of the same site are compared, so the site is not a feature.
+    """
+    site, rest = _site_and_rest(normalized_url or "")
+    return site, _tokens(title, rest)
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class _TokenHashes(dict):
+    """token -> its hash under every MinHash mask, computed once per run."""
+
+    def __missing__(self, token):
+        # Stable across processes (str hash() is salted), so groupings are reproducible
+        value = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big")
+        row = self[token] = tuple([mask ^ value for mask in _masks])
+        return row
+
+
+def _signature(tokens, hashes):
+    return tuple(map(min, zip(*map(hashes.__getitem__, tokens))))
+
+
+class _Groups:
+    """Union-find over bookmark ids; the smallest id of a group is its root."""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent
+        root = item
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while item != root:
+            parent[item], item = root, parent.get(item, item)
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # Keep the oldest bookmark as the survivor
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    def groups(self):
+        members = {}
+        for item in list(self.parent):
+            root = self.find(item)
+            members.setdefault(root, [root]).append(item)
+        return members
+
+
+def _compare(similar, feature_sets, ids, threshold):
+    """Records every pair of `ids` similar enough in `similar` (id -> set of ids)."""
+    sets = [(bookmark_id, feature_sets[bookmark_id]) for bookmark_id in ids]
+    for i, (a, tokens_a) in enumerate(sets):
+        size_a = len(tokens_a)
+        similar_a = similar.setdefault(a, set())
+        for b, tokens_b in sets[i + 1:]:
+            if b in similar_a: # Already found through another LSH band
+                continue
+            # jaccard(a, b) >= threshold without the division
+            shared = len(tokens_a & tokens_b)
+            if shared >= threshold * (size_a + len(tokens_b) - shared):
+                similar_a.add(b)
+                similar.setdefault(b, set()).add(a)
+
+
+def _join_near(groups, similar):
+    """
+    Groups each representative with the not yet grouped ones similar to it,
+    oldest first: every member is similar to the group's survivor, never only
+    to another member.
+    """
+    taken = set()
+    for head in sorted(similar):
+        if head in taken or not similar[head]:
+            continue
+        taken.add(head)
+        for other in sorted(similar[head] - taken):
+            taken.add(other)
+            groups.union(head, other)
+
+
+def find_duplicates(rows, near=True, threshold=NEAR_THRESHOLD, cross_source=False):
+    """
+    Groups duplicate bookmarks. `rows` are (id, normalized_url, title, source_browser)
+    in id order, so the first bookmark of a URL is its oldest.
+    Bookmarks are only grouped within one source family unless `cross_source`
+    (a browser sync would otherwise re-add the row merged away from it).
+    Returns [{"survivor": id, "duplicates": [(id, kind, similarity)]}], where
+    kind is 'exact' (same normalized_url as the survivor) or 'near'. Exact
+    groups stay whole: a URL near the survivor brings all its copies along,
+    each reported with the similarity of the URL's first (compared) bookmark.
+    """
+    groups = _Groups()
+    info = {}
+
+    # Exact: identical normalized URL
+    first_by_key = {}
+    for bookmark_id, normalized_url, title, source_browser in rows:
+        scope = "" if cross_source else source_family(source_browser)
+        key = (scope, normalized_url)
+        if key in first_by_key:
+            groups.union(first_by_key[key], bookmark_id)
+        else:
+            first_by_key[key] = bookmark_id
+        info[bookmark_id] = (normalized_url, title, first_by_key[key])
+
+    feature_sets = {}
+    similar = {}
+    if near:
+        # Near: one representative per distinct URL, only ever compared within its site
+        sites = {}
+        for (scope, normalized_url), bookmark_id in first_by_key.items():
+            title = info[bookmark_id][1]
+            site, rest = _site_and_rest(normalized_url or "")
+            sites.setdefault((scope, site), []).append((bookmark_id, title, rest))
+
+        hashes = _TokenHashes()
+        for (scope, site), members in sites.items():
+            if len(members) < 2:
+                continue
+            ids = []
+            for bookmark_id, title, rest in members:
+                tokens = _tokens(title, rest)
+                if tokens:
+                    feature_sets[bookmark_id] = tokens
+                    ids.append(bookmark_id)
+            if len(ids) <= DIRECT_COMPARE:
+                _compare(similar, feature_sets, ids, threshold)
+                continue
+            buckets = {}
+            for bookmark_id in ids:
+                signature = _signature(feature_sets[bookmark_id], hashes)
+                for band in range(0, SIGNATURE_SIZE, BAND_ROWS):
+                    buckets.setdefault((band, *signature[band:band + BAND_ROWS]), []).append(bookmark_id)
+            for candidates in buckets.values():
+                if 1 < len(candidates) <= MAX_BUCKET:
+                    _compare(similar, feature_sets, candidates, threshold)
+        _join_near(groups, similar)
+
+    result = []
+    for survivor, members in sorted(groups.groups().items()):
+        if len(members) < 2:
+            continue
+        survivor_url = info[survivor][0]
+        survivor_features = feature_sets.get(survivor) or features(info[survivor][1], survivor_url)[1]
+        duplicates = []
+        for bookmark_id in sorted(members):
+            if bookmark_id == survivor:
+                continue
+            normalized_url, _, first = info[bookmark_id]
+            if normalized_url == survivor_url:
+                duplicates.append((bookmark_id, "exact", 1.0))
+            else:
+                similarity = jaccard(survivor_features, feature_sets[first])
+                duplicates.append((bookmark_id, "near", round(similarity, 3)))
+        result.append({"survivor": survivor, "duplicates": duplicates})
+    return result
+
+
+def load_rows():
+    """(id, normalized_url, title, source_browser) for every bookmark in id order, in one pass."""
+    return db.session.execute(db.select(
+        bookmarks.c.id, bookmarks.c.normalized_url, bookmarks.c.title, bookmarks.c.source_browser
+    ).order_by(bookmarks.c.id)).all()
+
+
+def summarize(groups):
+    kinds = [kind for group in groups for _, kind, _ in group["duplicates"]]
+    return {
+        "groups": len(groups),
+        "duplicates": len(kinds),
+        "exact": kinds.count("exact"),
+        "near": kinds.count("near")
+    }
+
+
+def propose_merges(groups):
+    """
+    Stages one 'merge' PendingChange per duplicate (bookmark_id = the duplicate,
+    target_id = the survivor) in a new pending_review batch. The caller commits.
+    Returns (batch, counts).
+    """
+    batch = SyncBatch(source="duplicates", status="pending_review")
+    db.session.add(batch)
+    db.session.flush()
+
+    # Only ids are staged: both bookmarks' current details are joined in on review
+    changes = [{
+        "batch_id": batch.id,
+        "bookmark_id": bookmark_id,
+        "change_type": "merge",
+        "target_id": group["survivor"],
+        "similarity": similarity if kind == "near" else None
+    } for group in groups for bookmark_id, kind, similarity in group["duplicates"]]
+    if changes:
+        db.session.execute(pending.insert(), changes)
+    return batch, summarize(groups)
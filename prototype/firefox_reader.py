@@ -1,105 +1,133 @@
 import sqlite3
 import os
+from contextlib import contextmanager
+from folder_paths import FolderPathResolver
 
-def get_firefox_bookmarks(sqlite_path):
+# Normalize root pillar names
+# ID 2 = Menu, ID 3 = Toolbar, ID 5 = Other
+ROOT_TITLES = {2: "Bookmarks Menu", 3: "Bookmarks Toolbar", 5: "Other Bookmarks"}
+
+# How long to wait on a busy places.sqlite before falling back (seconds)
+LOCK_TIMEOUT = 1.0
+
+def _connect(uri, **kwargs):
+    """Connects and forces SQLite to take its read lock now, so a locked file fails fast."""
+    conn = sqlite3.connect(uri, uri=True, **kwargs)
+    try:
+        conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+    except sqlite3.OperationalError:
+        conn.close()
+        raise
+    return conn
+
+def _has_pending_wal(sqlite_path):
+    wal_path = f"{sqlite_path}-wal"
+    return os.path.exists(wal_path) and os.path.getsize(wal_path) > 0
+
+@contextmanager
+def open_places(sqlite_path):
     """
-    Reads bookmarks from a Firefox places.sqlite database.
-    Returns a dict with bookmarks and count metadata for verification.
+    Opens places.sqlite read-only, without copying it when possible.
+    Yields (connection, read_mode), trying in order:
+      1. live:      read-only on the live file (sees WAL data, Firefox keeps writing)
+      2. immutable: Firefox holds an exclusive lock but nothing is pending in the
+                    WAL, so the main file is complete and can be read lock-free
+      3. copy:      locked with pending WAL frames; copy db + WAL to a private
+                    temp dir (unique per call, so concurrent syncs can't clash)
     """
     if not os.path.exists(sqlite_path):
         raise FileNotFoundError(f"Database not found: {sqlite_path}")
 
-    # Copy to /tmp to avoid "database is locked" errors if Firefox is running
     import shutil
-    import tempfile
-    
-    # Create temp file that auto-deletes? No, sqlite needs path.
-    # Manual temp path
-    tmp_path = f"/tmp/places_copy_{os.getpid()}.sqlite"
-    shutil.copy2(sqlite_path, tmp_path)
-
-    # Connect to the COPY
-    conn = sqlite3.connect(f"file:{tmp_path}?mode=ro", uri=True)
-    cursor = conn.cursor()
-    
+    from urllib.parse import quote
+    uri = f"file:{quote(os.path.abspath(sqlite_path))}"
+    tmp_dir = None
+
     try:
+        conn = _connect(f"{uri}?mode=ro", timeout=LOCK_TIMEOUT)
+        read_mode = "live"
+    except sqlite3.OperationalError:
+        if not _has_pending_wal(sqlite_path):
+            conn = _connect(f"{uri}?mode=ro&immutable=1")
+            read_mode = "immutable"
+        else:
+            # Copy to a private temp dir to avoid "database is locked" errors if Firefox is running
+            import tempfile
+            tmp_dir = tempfile.mkdtemp(prefix="places_")
+            tmp_path = os.path.join(tmp_dir, "places.sqlite")
+            shutil.copy2(sqlite_path, tmp_path)
+            shutil.copy2(f"{sqlite_path}-wal", f"{tmp_path}-wal")
+            # Writable so SQLite can replay the WAL into a fresh index
+            conn = _connect(f"file:{quote(tmp_path)}")
+            read_mode = "copy"
+
+    try:
+        yield conn, read_mode
+    finally:
+        conn.close()
+        # Clean up temp copy
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def load_folders(cursor):
+    """Memoized path resolver over all folders (type 2; bookmarks are never parents)."""
+    cursor.execute("SELECT id, parent, title FROM moz_bookmarks WHERE type = 2")
+    parents = {}
+    titles = {}
+    for folder_id, parent, title in cursor.fetchall():
+        parents[folder_id] = parent
+        titles[folder_id] = ROOT_TITLES.get(folder_id, title)
+    # ID 1 is 'Places Root' (virtual), skip it and stop
+    return FolderPathResolver(parents, titles, is_root=lambda folder_id: folder_id <= 1)
+
+def get_high_water_mark(cursor):
+    """Latest moz_bookmarks.lastModified (PRTime, microseconds) in the profile."""
+    cursor.execute("SELECT coalesce(max(lastModified), 0) FROM moz_bookmarks")
+    return cursor.fetchone()[0]
+
+def get_firefox_bookmarks(sqlite_path):
+    """
+    Reads bookmarks from a Firefox places.sqlite database.
+    Returns a dict with bookmarks and count metadata for verification.
+    """
+    with open_places(sqlite_path) as (conn, read_mode):
+        cursor = conn.cursor()
+
         # Count total bookmarks in source DB for verification
         cursor.execute("SELECT COUNT(*) FROM moz_bookmarks WHERE type=1")
         source_total = cursor.fetchone()[0]
-        
-        # 1. Fetch all bookmark items (folders and bookmarks)
-        # type: 1=bookmark, 2=folder
-        query = """
-        SELECT id, type, parent, title, fk
-        FROM moz_bookmarks
-        WHERE type IN (1, 2)
-        """
-        cursor.execute(query)
-        all_items = cursor.fetchall()
-        
-        # 2. Build a map for O(1) parent lookup
-        # item_map = {id: {parent, title, type}}
-        item_map = {
-            row[0]: {
-                "type": row[1],
-                "parent": row[2],
-                "title": row[3],
-                "fk": row[4]
-            } for row in all_items
-        }
-        
-        # 3. Fetch URLs
-        cursor.execute("SELECT id, url FROM moz_places")
-        url_map = dict(cursor.fetchall())
-        
-        # 4. Helper to build folder path
-        def get_full_path(item_id, parent_id):
-            path = []
-            curr_id = parent_id
-            
-            # Traverse up to root (parent=0 or missing)
-            while curr_id in item_map:
-                if curr_id <= 1: # ID 1 is 'Places Root' (virtual), skip it and stop
-                    break
-                    
-                parent_data = item_map[curr_id]
-                title = parent_data["title"]
-                
-                # Normalize root pillar names
-                # ID 2 = Menu, ID 3 = Toolbar, ID 5 = Other
-                if curr_id == 2: title = "Bookmarks Menu"
-                elif curr_id == 3: title = "Bookmarks Toolbar"
-                elif curr_id == 5: title = "Other Bookmarks"
-                
-                if title:
-                    path.insert(0, title)
-                
-                curr_id = parent_data["parent"]
-            
-            return " > ".join(path)
+        high_water_mark = get_high_water_mark(cursor)
+
+        # 1. Folder paths, resolved once per folder and shared by its children
+        folders = load_folders(cursor)
+
+        # 2. Fetch bookmarks (type 1), joining moz_places only for their fks
+        # NOTE: Removed Tags folder (ID 3) filtering per user feedback
+        # Firefox may not always have a Tags folder, and filtering by ID 3
+        # was incorrectly excluding legitimate bookmarks
+        cursor.execute("""
+            SELECT b.parent, b.title, p.url
+            FROM moz_bookmarks b
+            LEFT JOIN moz_places p ON p.id = b.fk
+            WHERE b.type = 1
+            ORDER BY b.id
+        """)
 
         bookmarks = []
         tags_filtered = 0
         invalid_urls = 0
-        
-        for item_id, data in item_map.items():
-            if data["type"] == 1: # Bookmark
-                # NOTE: Removed Tags folder (ID 3) filtering per user feedback
-                # Firefox may not always have a Tags folder, and filtering by ID 3
-                # was incorrectly excluding legitimate bookmarks
-                
-                url = url_map.get(data["fk"])
-                if url:
-                    full_path = get_full_path(item_id, data["parent"])
-                    bookmarks.append({
-                        "title": data["title"] or "No Title",
-                        "url": url,
-                        "folder": full_path,
-                        "source": "Firefox"
-                    })
-                else:
-                    invalid_urls += 1
-        
+
+        for parent, title, url in cursor.fetchall():
+            if url:
+                bookmarks.append({
+                    "title": title or "No Title",
+                    "url": url,
+                    "folder": folders.resolve(parent),
+                    "source": "Firefox"
+                })
+            else:
+                invalid_urls += 1
+
         # Return both bookmarks and metadata for count verification
         return {
             "bookmarks": bookmarks,
@@ -107,12 +135,79 @@ def get_firefox_bookmarks(sqlite_path):
                 "source_total": source_total,
                 "tags_filtered": tags_filtered,
                 "invalid_urls": invalid_urls,
-                "processed": len(bookmarks)
+                "processed": len(bookmarks),
+                "high_water_mark": high_water_mark,
+                "read_mode": read_mode
             }
         }
 
-    finally:
-        conn.close()
-        # Clean up temp file
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+def get_firefox_changes(sqlite_path, since):
+    """
+    Incremental read: only bookmarks changed after `since` (a lastModified mark).
+    A changed folder (rename, move, child added/removed) re-emits its whole subtree.
+    Deletions cannot be mapped from tombstones (we don't track guids), and an
+    edited URL only changes the item itself, not its folder, so the live URL set
+    is always returned for a presence check (one scan of the bookmark rows).
+    """
+    with open_places(sqlite_path) as (conn, read_mode):
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT COUNT(*) FROM moz_bookmarks WHERE type=1")
+        source_total = cursor.fetchone()[0]
+        high_water_mark = get_high_water_mark(cursor)
+        folders = load_folders(cursor)
+
+        cursor.execute("""
+            WITH RECURSIVE subtree(id) AS (
+                SELECT id FROM moz_bookmarks WHERE type = 2 AND lastModified > :since
+                UNION
+                SELECT b.id FROM moz_bookmarks b JOIN subtree s ON b.parent = s.id WHERE b.type = 2
+            )
+            SELECT b.parent, b.title, p.url
+            FROM moz_bookmarks b
+            LEFT JOIN moz_places p ON p.id = b.fk
+            WHERE b.type = 1
+              AND (b.lastModified > :since OR b.parent IN (SELECT id FROM subtree))
+            ORDER BY b.id
+        """, {"since": since})
+
+        bookmarks = []
+        invalid_urls = 0
+        for parent, title, url in cursor.fetchall():
+            if url:
+                bookmarks.append({
+                    "title": title or "No Title",
+                    "url": url,
+                    "folder": folders.resolve(parent),
+                    "source": "Firefox"
+                })
+            else:
+                invalid_urls += 1
+
+        try:
+            cursor.execute("SELECT COUNT(*) FROM moz_bookmarks_deleted WHERE dateRemoved > ?", (since,))
+            tombstones = cursor.fetchone()[0]
+        except sqlite3.OperationalError:
+            tombstones = None # Older profiles: no tombstone table
+
+        cursor.execute("""
+            SELECT DISTINCT p.url
+            FROM moz_bookmarks b JOIN moz_places p ON p.id = b.fk
+            WHERE b.type = 1
+        """)
+        live_urls = [row[0] for row in cursor.fetchall()]
+
+        return {
+            "bookmarks": bookmarks,
+            "live_urls": live_urls,
+            "metadata": {
+                "mode": "incremental",
+                "since": since,
+                "source_total": source_total,
+                "invalid_urls": invalid_urls,
+                "tombstones": tombstones or 0,
+                "processed": len(bookmarks),
+                "high_water_mark": high_water_mark,
+                "read_mode": read_mode
+            }
+        }
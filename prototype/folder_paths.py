@@ -0,0 +1,44 @@
+SEPARATOR = " > "
+
+def join_path(parent_path, title):
+    """Appends a folder title to a ' > ' path (empty titles are skipped)."""
+    if not title:
+        return parent_path
+    return f"{parent_path}{SEPARATOR}{title}" if parent_path else title
+
+class FolderPathResolver:
+    """
+    Resolves full ' > ' folder paths from a parent adjacency map.
+    Each folder's path is computed once and reused by all of its children and
+    descendants, so resolving N bookmarks costs O(N + folders) instead of O(N * depth²).
+    """
+
+    def __init__(self, parents, titles, is_root=lambda folder_id: False):
+        self.parents = parents # {folder_id: parent_id}
+        self.titles = titles # {folder_id: display title}
+        self.is_root = is_root # roots stop the walk and contribute no title
+        self.cache = {}
+
+    def resolve(self, folder_id):
+        """Full path of `folder_id` ('' for roots and unknown ids)."""
+        cache = self.cache
+        if folder_id in cache:
+            return cache[folder_id]
+
+        # Walk up only until an already-resolved ancestor (or a root)
+        chain = []
+        seen = set()
+        curr_id = folder_id
+        while curr_id in self.parents and curr_id not in cache and not self.is_root(curr_id):
+            if curr_id in seen: # Corrupt parent cycle: stop rather than loop forever
+                break
+            seen.add(curr_id)
+            chain.append(curr_id)
+            curr_id = self.parents[curr_id]
+
+        # Fill the cache top-down
+        path = cache.get(curr_id, "")
+        for chain_id in reversed(chain):
+            path = join_path(path, self.titles.get(chain_id))
+            cache[chain_id] = path
+        return cache.get(folder_id, path)
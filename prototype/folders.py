@@ -0,0 +1,204 @@
+# Folder tree.
+# Folders form an adjacency list (parent_id) with cached counts: bookmark_count
+# for the folder itself and total_count for its whole subtree. Count changes walk
+# up the ancestor chain (O(depth)), so renaming a folder is a single-row update
+# and moving one only touches the old and new ancestors, never its bookmarks.
+# Bookmarks keep folder_path as the source reported it; folder_id is resolved from
+# that path through folders.source_path, so a renamed or moved folder keeps
+# receiving its source's bookmarks.
+from sqlalchemy import event, inspect
+from database import db, Bookmark, Folder
+from folder_paths import SEPARATOR, FolderPathResolver
+
+folders = Folder.__table__
+bookmarks = Bookmark.__table__
+
+LOOKUP_CHUNK = 500
+
+FIND_SOURCE = "SELECT id FROM folders WHERE source_path = ?"
+FIND_SOURCES = db.text(
+    "SELECT source_path, id FROM folders WHERE source_path IN :paths"
+).bindparams(db.bindparam("paths", expanding=True))
+INSERT_FOLDER = "INSERT INTO folders (parent_id, name, source_path, bookmark_count, total_count) VALUES (?, ?, ?, 0, 0)"
+
+BUMP_COUNT = db.text("UPDATE folders SET bookmark_count = bookmark_count + :delta WHERE id = :id")
+
+# Adds :delta to the subtree total of :id and all of its ancestors
+BUMP_TOTALS = db.text("""
+WITH RECURSIVE up(id) AS (
+    SELECT :id
+    UNION ALL
+    SELECT f.parent_id FROM folders f JOIN up ON f.id = up.id WHERE f.parent_id IS NOT NULL
+)
+UPDATE folders SET total_count = total_count + :delta WHERE id IN (SELECT id FROM up)
+""")
+
+# The given folders plus all their ancestors
+ANCESTRY = db.text("""
+WITH RECURSIVE chain(id) AS (
+    SELECT id FROM folders WHERE id IN :ids
+    UNION
+    SELECT f.parent_id FROM folders f JOIN chain c ON f.id = c.id WHERE f.parent_id IS NOT NULL
+)
+SELECT f.id, f.parent_id, f.name FROM folders f JOIN chain c ON f.id = c.id
+""").bindparams(db.bindparam("ids", expanding=True))
+
+
+def ensure_paths(connection, paths):
+    """{path: folder_id} for ' > ' paths, creating missing folders ('' is the top level: None)."""
+    ids = {"": None}
+    paths = [path for path in set(paths) if path]
+    # Known paths in one query per chunk; only new ones walk up their ancestors
+    for start in range(0, len(paths), LOOKUP_CHUNK):
+        ids.update(connection.execute(FIND_SOURCES, {"paths": paths[start:start + LOOKUP_CHUNK]}).all())
+    for path in paths:
+        if path not in ids:
+            _ensure(connection, path, ids)
+    return ids
+
+
+def _ensure(connection, path, ids):
+    # Walk up until a known folder, then create the missing ones top-down
+    missing = []
+    current = path
+    while current and current not in ids:
+        row = connection.exec_driver_sql(FIND_SOURCE, (current,)).first()
+        if row is not None:
+            ids[current] = row[0]
+            break
+        missing.append(current)
+        parent, sep, _ = current.rpartition(SEPARATOR)
+        current = parent if sep else ""
+
+    parent_id = ids.get(current)
+    for missing_path in reversed(missing):
+        parent_id = ids[missing_path] = connection.exec_driver_sql(
+            INSERT_FOLDER, (parent_id, missing_path.rpartition(SEPARATOR)[2], missing_path)
+        ).lastrowid
+    return ids[path]
+
+
+def adjust_counts(connection, deltas):
+    """Applies {folder_id: bookmark delta} to the folders and their ancestors' totals."""
+    changes = [{"id": folder_id, "delta": delta} for folder_id, delta in deltas.items() if folder_id is not None and delta]
+    if changes:
+        connection.execute(BUMP_COUNT, changes)
+        connection.execute(BUMP_TOTALS, changes)
+
+
+def paths(folder_ids):
+    """{folder_id: current ' > ' path} for the given folders (one query)."""
+    ids = {folder_id for folder_id in folder_ids if folder_id is not None}
+    if not ids:
+        return {}
+    rows = db.session.execute(ANCESTRY, {"ids": list(ids)}).all()
+    resolver = FolderPathResolver({r.id: r.parent_id for r in rows}, {r.id: r.name for r in rows})
+    return {folder_id: resolver.resolve(folder_id) for folder_id in ids}
+
+
+def subtree(folder_id):
+    """Select of `folder_id` and all of its descendant folder ids."""
+    tree = db.select(folders.c.id).where(folders.c.id == folder_id).cte("subtree", recursive=True)
+    tree = tree.union_all(db.select(folders.c.id).where(folders.c.parent_id == tree.c.id))
+    return db.select(tree.c.id)
+
+
+def tree():
+    """Nested folder tree with counts, plus the number of top-level bookmarks."""
+    nodes = {}
+    roots = []
+    for folder in Folder.query.order_by(Folder.name, Folder.id):
+        nodes[folder.id] = {**folder.to_dict(), "children": []}
+    for node in nodes.values():
+        parent = nodes.get(node["parent_id"])
+        (parent["children"] if parent else roots).append(node)
+    unfiled = db.session.execute(
+        db.select(db.func.count()).select_from(bookmarks).where(bookmarks.c.folder_id.is_(None))
+    ).scalar()
+    return {"folders": roots, "unfiled": unfiled}
+
+
+def move(connection, folder_id, parent_id):
+    """Re-parents a folder (None = top level). Only ancestor totals change."""
+    row = connection.execute(
+        db.select(folders.c.parent_id, folders.c.total_count).where(folders.c.id == folder_id)
+    ).first()
+    if row is None:
+        raise LookupError(f"Folder {folder_id} not found")
+    if parent_id is not None:
+        ancestry = {r.id for r in connection.execute(ANCESTRY, {"ids": [parent_id]})}
+        if parent_id not in ancestry:
+            raise LookupError(f"Folder {parent_id} not found")
+        if folder_id in ancestry:
+            raise ValueError("A folder cannot be moved into itself or its subfolders")
+    if row.parent_id == parent_id:
+        return
+
+    if row.total_count:
+        if row.parent_id is not None:
+            connection.execute(BUMP_TOTALS, {"id": row.parent_id, "delta": -row.total_count})
+        if parent_id is not None:
+            connection.execute(BUMP_TOTALS, {"id": parent_id, "delta": row.total_count})
+    connection.execute(folders.update().where(folders.c.id == folder_id).values(parent_id=parent_id))
+
+
+def rebuild(connection):
+    """
+    Files every bookmark without a folder_id under its folder_path and recomputes
+    all counts from scratch (backfill for older databases, and a repair tool).
+    """
+    missing = [row[0] for row in connection.exec_driver_sql(
+        "SELECT DISTINCT folder_path FROM bookmarks WHERE folder_id IS NULL AND folder_path <> ''"
+    )]
+    if missing:
+        ids = ensure_paths(connection, missing)
+        connection.exec_driver_sql("CREATE TEMP TABLE folder_map (path TEXT PRIMARY KEY, id INTEGER)")
+        connection.exec_driver_sql("INSERT INTO temp.folder_map VALUES (?, ?)", [(p, ids[p]) for p in missing])
+        connection.exec_driver_sql("""
+            UPDATE bookmarks SET folder_id = (SELECT m.id FROM temp.folder_map m WHERE m.path = bookmarks.folder_path)
+            WHERE folder_id IS NULL AND folder_path IN (SELECT path FROM temp.folder_map)
+        """)
+        connection.exec_driver_sql("DROP TABLE temp.folder_map")
+
+    connection.exec_driver_sql(
+        "UPDATE folders SET bookmark_count = (SELECT count(*) FROM bookmarks b WHERE b.folder_id = folders.id)"
+    )
+    rows = connection.exec_driver_sql("SELECT id, parent_id, bookmark_count FROM folders").all()
+    parents = {folder_id: parent_id for folder_id, parent_id, _ in rows}
+    totals = dict.fromkeys(parents, 0)
+    for folder_id, _, count in rows:
+        seen = set()
+        while folder_id is not None and folder_id not in seen:
+            seen.add(folder_id)
+            totals[folder_id] += count
+            folder_id = parents.get(folder_id)
+    connection.exec_driver_sql(
+        "UPDATE folders SET total_count = ? WHERE id = ?", [(total, folder_id) for folder_id, total in totals.items()]
+    )
+
+
+# ORM writes keep folder_id and the counts in step with folder_path (bulk paths do it themselves)
+
+@event.listens_for(Bookmark, "before_insert")
+def _before_insert(mapper, connection, target):
+    if target.folder_id is None and target.folder_path:
+        target.folder_id = ensure_paths(connection, [target.folder_path])[target.folder_path]
+    adjust_counts(connection, {target.folder_id: 1})
+
+
+@event.listens_for(Bookmark, "before_update")
+def _before_update(mapper, connection, target):
+    attrs = inspect(target).attrs
+    moved, refiled = attrs.folder_id.history, attrs.folder_path.history
+    if not moved.has_changes() and not refiled.has_changes():
+        return
+    old = moved.deleted[0] if moved.deleted else target.folder_id
+    if refiled.has_changes() and not moved.has_changes():
+        target.folder_id = ensure_paths(connection, [target.folder_path or ""])[target.folder_path or ""]
+    if old != target.folder_id:
+        adjust_counts(connection, {old: -1, target.folder_id: 1})
+
+
+@event.listens_for(Bookmark, "after_delete")
+def _after_delete(mapper, connection, target):
+    adjust_counts(connection, {target.folder_id: -1})
@@ -0,0 +1,265 @@
+# Bookmark version history, stored as backward deltas.
+# A history row holds the state of a bookmark at `version`, but only the fields
+# that differ from the next newer state (the `changed` bitmask says which).
+# The live bookmark is always the newest state, so recording an edit needs
+# nothing beyond the old and new values at hand, and any version is rebuilt by
+# replaying rows backwards from the bookmark. Every KEYFRAME_INTERVAL-th version
+# is stored in full, which bounds that replay. Deleting a bookmark writes a
+# tombstone (its final state, in full) so the history outlives it. Retention
+# only drops the oldest rows of a bookmark, which no newer state depends on.
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, event
+from database import db, Bookmark, BookmarkHistory
+import jobs
+import logs
+import storage
+
+log = logs.get_logger("history")
+
+# Same bits as PendingChange.CHANGED_*, so staged updates map straight onto deltas
+TITLE, FOLDER, URL = 1, 2, 4
+FULL = TITLE | FOLDER | URL
+FIELDS = (("title", TITLE), ("folder_path", FOLDER), ("url", URL))
+
+KEYFRAME_INTERVAL = 10
+COMPACT_CHUNK = 500
+
+UPDATE, REVERT, DELETED = "update", "revert", "deleted"
+
+history = BookmarkHistory.__table__
+bookmarks = Bookmark.__table__
+
+_KEYFRAME = f"version % {KEYFRAME_INTERVAL} = 0"
+
+# Pre-update snapshots for bulk updates sharing one `changed` mask
+SNAPSHOT_UPDATES = db.text(f"""
+    INSERT INTO bookmark_history (bookmark_id, version, changed, url, title, folder_path, event, created_at)
+    SELECT id, version,
+           CASE WHEN {_KEYFRAME} THEN {FULL} ELSE :changed END,
+           CASE WHEN {_KEYFRAME} OR :changed & {URL} THEN url END,
+           CASE WHEN {_KEYFRAME} OR :changed & {TITLE} THEN title END,
+           CASE WHEN {_KEYFRAME} OR :changed & {FOLDER} THEN folder_path END,
+           '{UPDATE}', :now
+    FROM bookmarks WHERE id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+TOMBSTONES = db.text(f"""
+    INSERT INTO bookmark_history (bookmark_id, version, changed, url, title, folder_path, event, created_at)
+    SELECT id, version, {FULL}, url, title, folder_path, '{DELETED}', :now
+    FROM bookmarks WHERE id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+
+def fields(bookmark):
+    """The versioned fields of a bookmark (ORM object or row)."""
+    return {name: getattr(bookmark, name) for name, _ in FIELDS}
+
+
+def record(connection, bookmark_id, version, old, new, kind=UPDATE, now=None):
+    """Records version `version` (state `old`) of a bookmark that is about to become `new`."""
+    if version % KEYFRAME_INTERVAL == 0:
+        changed = FULL
+    else:
+        changed = sum(bit for name, bit in FIELDS if old[name] != new[name])
+    connection.execute(history.insert(), {
+        "bookmark_id": bookmark_id,
+        "version": version,
+        "changed": changed,
+        **{name: old[name] if changed & bit else None for name, bit in FIELDS},
+        "event": kind,
+        "created_at": now or datetime.utcnow()
+    })
+
+
+def snapshot_updates(connection, changed, now):
+    """Snapshots bookmarks before a bulk update; `changed` is {bookmark_id: mask}."""
+    groups = {}
+    for bookmark_id, mask in changed.items():
+        groups.setdefault(mask, []).append(bookmark_id)
+    for mask, ids in groups.items():
+        connection.execute(SNAPSHOT_UPDATES, {"ids": ids, "changed": mask, "now": now})
+
+
+def tombstone(connection, ids, now):
+    """Tombstones bookmarks that are about to be deleted."""
+    if ids:
+        connection.execute(TOMBSTONES, {"ids": list(ids), "now": now})
+
+
+@event.listens_for(Bookmark, "after_delete")
+def _after_delete(mapper, connection, target):
+    connection.execute(history.insert(), {
+        "bookmark_id": target.id, "version": target.version or 1, "changed": FULL,
+        **fields(target), "event": DELETED, "created_at": datetime.utcnow()
+    })
+
+
+# --- Rebuilding versions ---
+
+def _replay(rows, current):
+    """{history_id: state} for `rows` (one bookmark, newest first), replayed from `current`."""
+    states = {}
+    newer = current or {}
+    for row in rows:
+        state = {name: getattr(row, name) if row.changed & bit else newer.get(name) for name, bit in FIELDS}
+        states[row.id] = newer = state
+    return states
+
+
+def _current(bookmark_ids):
+    rows = db.session.execute(
+        db.select(bookmarks.c.id, *[bookmarks.c[name] for name, _ in FIELDS]).where(bookmarks.c.id.in_(bookmark_ids))
+    )
+    return {row.id: fields(row) for row in rows}
+
+
+def _states(rows):
+    """{history_id: state} for rows that include everything newer for their bookmarks."""
+    chains = {}
+    for row in sorted(rows, key=lambda r: r.id, reverse=True):
+        chains.setdefault(row.bookmark_id, []).append(row)
+    current = _current(list(chains))
+    states = {}
+    for bookmark_id, chain in chains.items():
+        states.update(_replay(chain, current.get(bookmark_id)))
+    return states
+
+
+def rebuild(history_id):
+    """(row, state) of one history row, or None. Reads at most KEYFRAME_INTERVAL rows."""
+    row = db.session.execute(db.select(history).where(history.c.id == history_id)).first()
+    if row is None:
+        return None
+    keyframe = db.session.execute(
+        db.select(db.func.min(history.c.id))
+        .where(history.c.bookmark_id == row.bookmark_id, history.c.id >= row.id, history.c.changed == FULL)
+    ).scalar()
+    stmt = db.select(history).where(history.c.bookmark_id == row.bookmark_id, history.c.id >= row.id)
+    if keyframe is not None:
+        stmt = stmt.where(history.c.id <= keyframe)
+    chain = db.session.execute(stmt.order_by(history.c.id.desc())).all()
+    current = None if keyframe is not None else _current([row.bookmark_id]).get(row.bookmark_id)
+    return row, _replay(chain, current)[row.id]
+
+
+def bookmark_versions(bookmark_id):
+    """Every recorded version of a live bookmark, newest first."""
+    # A tombstone under this id belongs to an earlier bookmark that had the same id
+    since = db.session.execute(
+        db.select(db.func.max(history.c.id)).where(history.c.bookmark_id == bookmark_id, history.c.event == DELETED)
+    ).scalar() or 0
+    rows = db.session.execute(
+        db.select(history).where(history.c.bookmark_id == bookmark_id, history.c.id > since)
+        .order_by(history.c.id.desc())
+    ).all()
+    current = _current([bookmark_id]).get(bookmark_id)
+    states = _replay(rows, current)
+    return [BookmarkHistory.serialize(row, states[row.id]) for row in rows]
+
+
+def recent(limit=100):
+    """The latest history entries across the library, newest first."""
+    feed = db.session.execute(
+        db.select(history).order_by(history.c.created_at.desc(), history.c.id.desc()).limit(limit)
+    ).all()
+    if not feed:
+        return []
+    # Everything newer than the oldest entry shown is enough to replay each one
+    rows = db.session.execute(
+        db.select(history).where(
+            history.c.bookmark_id.in_({row.bookmark_id for row in feed}),
+            history.c.id >= min(row.id for row in feed)
+        )
+    ).all()
+    states = _states(rows)
+    return [BookmarkHistory.serialize(row, states[row.id]) for row in feed]
+
+
+# --- Retention and compaction ---
+
+def prune(connection, keep_versions=0, keep_days=0, tombstone_days=0, now=None):
+    """Drops history beyond the retention limits (0 = no limit). Returns rows removed."""
+    now = now or datetime.utcnow()
+    removed = 0
+    if tombstone_days:
+        # A deleted bookmark's whole history goes with its expired tombstone
+        removed += connection.execute(db.text(f"""
+            DELETE FROM bookmark_history WHERE id IN (
+                SELECT h.id FROM bookmark_history t
+                JOIN bookmark_history h ON h.bookmark_id = t.bookmark_id AND h.id <= t.id
+                WHERE t.event = '{DELETED}' AND t.created_at < :cutoff)
+        """), {"cutoff": now - timedelta(days=tombstone_days)}).rowcount
+    if keep_days:
+        removed += connection.execute(db.text(
+            f"DELETE FROM bookmark_history WHERE created_at < :cutoff AND event IS NOT '{DELETED}'"
+        ), {"cutoff": now - timedelta(days=keep_days)}).rowcount
+    if keep_versions:
+        removed += connection.execute(db.text("""
+            DELETE FROM bookmark_history WHERE id IN (
+                SELECT id FROM (SELECT id, row_number() OVER (PARTITION BY bookmark_id ORDER BY id DESC) AS n
+                                FROM bookmark_history)
+                WHERE n > :keep)
+        """), {"keep": keep_versions}).rowcount
+    return removed
+
+
+def _reencode(chain, current):
+    """[(id, changed, title, folder_path, url)] turning off-schedule full rows of a chain into deltas."""
+    states = _replay(chain, current)
+    updates = []
+    newer = current
+    for row in chain:
+        state = states[row.id]
+        if (row.changed == FULL and row.event != DELETED and row.version % KEYFRAME_INTERVAL
+                and newer is not None):
+            changed = sum(bit for name, bit in FIELDS if state[name] != newer[name])
+            updates.append({"h_id": row.id, "h_changed": changed,
+                            **{f"h_{name}": state[name] if changed & bit else None for name, bit in FIELDS}})
+        newer = state
+    return updates
+
+
+REENCODE = history.update().where(history.c.id == bindparam("h_id")).values(
+    changed=bindparam("h_changed"), title=bindparam("h_title"),
+    folder_path=bindparam("h_folder_path"), url=bindparam("h_url")
+)
+
+
+def compact(keep_versions=0, keep_days=0, tombstone_days=0, chunk_size=COMPACT_CHUNK):
+    """
+    Applies retention, then re-encodes full snapshots that are not due keyframes
+    (rows written before deltas existed) as deltas, committing per chunk of bookmarks.
+    """
+    jobs.report("prune")
+    removed = prune(db.session.connection(), keep_versions, keep_days, tombstone_days)
+    db.session.commit()
+
+    # Finding them scans the whole history table: done on a reader, the writer is
+    # only taken per chunk below
+    with storage.read_only():
+        candidates = db.session.execute(
+            db.select(history.c.bookmark_id).distinct()
+            .where(history.c.changed == FULL, history.c.event != DELETED, history.c.version % KEYFRAME_INTERVAL != 0)
+            .order_by(history.c.bookmark_id)
+        ).scalars().all()
+    reencoded = 0
+    for start in range(0, len(candidates), chunk_size):
+        jobs.report("reencode", start, len(candidates))
+        ids = candidates[start:start + chunk_size]
+        rows = db.session.execute(
+            db.select(history).where(history.c.bookmark_id.in_(ids)).order_by(history.c.id.desc())
+        ).all()
+        current = _current(ids)
+        chains = {}
+        for row in rows:
+            chains.setdefault(row.bookmark_id, []).append(row)
+        updates = []
+        for bookmark_id, chain in chains.items():
+            updates += _reencode(chain, current.get(bookmark_id))
+        if updates:
+            db.session.execute(REENCODE, updates)
+        db.session.commit()
+        reencoded += len(updates)
+
+    log.info("[HISTORY] Compacted: %s rows pruned, %s snapshots re-encoded as deltas", removed, reencoded)
+    return {"pruned": removed, "reencoded": reencoded}
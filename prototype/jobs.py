@@ -0,0 +1,308 @@
+# Background job subsystem for long-running sync/commit work.
+# Jobs run on a thread pool inside an app context; CPU-heavy reader/parser calls
+# can be offloaded to a process pool so several profiles parse across cores.
+# With JOB_STATE_DB set (serve.py sets it for multi-worker servers), job state
+# is also published to a small SQLite file shared by the worker processes, so
+# any worker can report on or cancel a job that another one runs.
+import json
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logs
+
+log = logs.get_logger("jobs")
+
+# Finished jobs kept around for polling before the oldest are evicted
+MAX_FINISHED_JOBS = 200
+# Seconds between checks of the shared store for cancels requested elsewhere
+CANCEL_POLL_INTERVAL = 0.5
+FINISHED = ('succeeded', 'failed', 'cancelled')
+
+_local = threading.local()
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when a cancel was requested."""
+
+
+class Job:
+    """State of a single background job (in-memory)."""
+
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = 'queued' # queued, running, succeeded, failed, cancelled
+        self.stage = None
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = threading.Event()
+        self.cancel_checked_at = 0 # Last poll of the shared store (monotonic)
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "type": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": {"done": self.done, "total": self.total},
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class RemoteJob:
+    """A job run by another worker process, as last published to the JobStore."""
+
+    def __init__(self, state):
+        self.state = state
+
+    @property
+    def finished(self):
+        return self.state["status"] in FINISHED
+
+    def to_dict(self):
+        return self.state
+
+
+class JobStore:
+    """
+    Job state shared across worker processes. It is a separate SQLite file, so
+    publishing progress never waits on the library database's write lock.
+    """
+
+    SCHEMA = """CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        finished INTEGER NOT NULL,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL
+    )"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local() # One connection per thread, opened on first use
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF") # Job state does not outlive the server
+            connection.execute(self.SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def save(self, job):
+        self._connection().execute(
+            "INSERT INTO jobs (id, state, finished, created_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET state = excluded.state, finished = excluded.finished",
+            (job.id, json.dumps(job.to_dict(), default=str), int(job.finished), job.created_at.isoformat())
+        )
+
+    def load(self, job_id):
+        row = self._connection().execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list(self):
+        return [json.loads(state) for state, in
+                self._connection().execute("SELECT state FROM jobs ORDER BY created_at, rowid")]
+
+    def request_cancel(self, job_id):
+        self._connection().execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+
+    def cancel_requested(self, job_id):
+        row = self._connection().execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def prune(self, keep):
+        self._connection().execute(
+            "DELETE FROM jobs WHERE finished AND id NOT IN "
+            "(SELECT id FROM jobs WHERE finished ORDER BY created_at DESC, rowid DESC LIMIT ?)", (keep,)
+        )
+
+
+class JobManager:
+    """Registry plus worker pools. Call init_app() once the Flask app exists."""
+
+    def __init__(self):
+        self.app = None
+        self.handlers = {}
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = None
+        self.processes = 0
+        self.process_pool = None
+        self.store = None
+
+    def init_app(self, app):
+        self.app = app
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config.get('JOB_WORKERS', 4), thread_name_prefix='job'
+        )
+        self.processes = app.config.get('JOB_PARSE_PROCESSES', 0)
+        if app.config.get('JOB_STATE_DB'):
+            self.store = JobStore(app.config['JOB_STATE_DB'])
+
+    def parse_pool(self):
+        """The process pool for offloaded parsing, started on first use (None if disabled)."""
+        if self.processes and self.process_pool is None:
+            with self.lock:
+                if self.process_pool is None:
+                    import multiprocessing
+                    from concurrent.futures import ProcessPoolExecutor
+                    # spawn: forking a threaded server process is unsafe
+                    self.process_pool = ProcessPoolExecutor(
+                        max_workers=self.processes, mp_context=multiprocessing.get_context('spawn')
+                    )
+        return self.process_pool
+
+    def shutdown(self):
+        """Stops the pools; queued jobs are dropped, running ones finish."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=True)
+
+    def publish(self, job):
+        """Writes `job`'s current state to the shared store, if there is one."""
+        if self.store is not None:
+            self.store.save(job)
+
+    def register(self, kind, handler):
+        """Registers `handler(**params)` as the implementation of job type `kind`."""
+        self.handlers[kind] = handler
+
+    def submit(self, kind, params):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job type: {kind}")
+        job = Job(kind, params)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._evict()
+        self.publish(job)
+        job.future = self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """A job of this process, else a RemoteJob from the shared store, else None."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None and self.store is not None:
+            state = self.store.load(job_id)
+            job = RemoteJob(state) if state else None
+        return job
+
+    def list(self):
+        with self.lock:
+            local = dict(self.jobs)
+        if self.store is None:
+            return list(local.values())
+        return [local.get(state["id"]) or RemoteJob(state) for state in self.store.list()]
+
+    def cancel(self, job_id):
+        """Requests cancellation. Queued jobs stop immediately, running ones at the next checkpoint."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if isinstance(job, RemoteJob):
+            # The owning process picks this up at the job's next checkpoint
+            if not job.finished:
+                self.store.request_cancel(job_id)
+            return job
+        if not job.finished:
+            job.cancel_requested.set()
+            if job.future is not None and job.future.cancel():
+                job.status = 'cancelled'
+                job.finished_at = datetime.utcnow()
+                self.publish(job)
+        return job
+
+    def _evict(self):
+        finished = [j.id for j in self.jobs.values() if j.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _run(self, job):
+        _local.job = job
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        self.publish(job)
+        try:
+            with self.app.app_context():
+                check_cancelled()
+                job.result = self.handlers[job.kind](**job.params)
+            job.status = 'succeeded'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            log.error("[JOB] %s %s failed:\n%s", job.kind, job.id, traceback.format_exc())
+        finally:
+            job.finished_at = datetime.utcnow()
+            _local.job = None
+            self.publish(job)
+            if self.store is not None:
+                self.store.prune(MAX_FINISHED_JOBS)
+
+
+manager = JobManager()
+
+
+def current_job():
+    """The job running on this thread, or None for plain request handling."""
+    return getattr(_local, 'job', None)
+
+
+def check_cancelled():
+    """Checkpoint for cooperative cancellation; no-op outside a job."""
+    job = current_job()
+    if job is None:
+        return
+    store = manager.store
+    if store is not None and not job.cancel_requested.is_set() \
+            and time.monotonic() - job.cancel_checked_at >= CANCEL_POLL_INTERVAL:
+        job.cancel_checked_at = time.monotonic()
+        if store.cancel_requested(job.id):
+            job.cancel_requested.set()
+    if job.cancel_requested.is_set():
+        raise JobCancelled()
+
+
+def report(stage, done=0, total=None):
+    """Publishes progress for the current job and honours pending cancels."""
+    job = current_job()
+    if job is not None:
+        job.stage = stage
+        job.done = done
+        job.total = total
+        manager.publish(job)
+    check_cancelled()
+
+
+def offload(func, *args):
+    """Runs a picklable, CPU-heavy call in the process pool when inside a job."""
+    pool = manager.parse_pool() if current_job() is not None else None
+    if pool is not None:
+        return pool.submit(func, *args).result()
+    return func(*args)
@@ -0,0 +1,169 @@
+import re
+from json.decoder import scanstring, JSONDecoder, JSONDecodeError
+
+# Incremental JSON pull-parser (stdlib only).
+# Reads a text stream in chunks and yields (event, value) pairs:
+#   start_map, end_map, start_array, end_array, key, string, number, boolean, null
+# Memory is bounded by the chunk size plus the longest single token; nesting
+# depth is tracked with an explicit stack, so deep documents can't hit RecursionError.
+
+CHUNK_SIZE = 64 * 1024
+
+NUMBER_RE = re.compile(r'-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?')
+LITERALS = {"t": ("true", "boolean", True), "f": ("false", "boolean", False), "n": ("null", "null", None)}
+SKIP_RE = re.compile(r'[ \t\n\r:]*')
+WS_RE = re.compile(r'[ \t\n\r,]*')
+NUMBER_CHARS = "+-.0123456789eE"
+
+_decoder = JSONDecoder()
+
+class EventReader:
+    """
+    Pull parser over a text stream. `events()` yields the event stream; right
+    after a start_array event, `items()` can take over and decode that array's
+    elements whole (C decoder, one element in memory at a time) before the
+    event stream resumes after the closing ']'.
+    """
+
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.stack = [] # 'map' / 'array'
+
+    def _more(self):
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def events(self):
+        stack = self.stack
+        key_next = False
+
+        while True:
+            buf, pos = self.buf, self.pos
+            # Skip whitespace and separators (',' re-arms key parsing inside maps)
+            while True:
+                pos = SKIP_RE.match(buf, pos).end()
+                if pos >= len(buf):
+                    if self.eof:
+                        if stack:
+                            raise JSONDecodeError("Unexpected end of data", buf, pos)
+                        return
+                    self.pos = pos
+                    self._more()
+                    buf, pos = self.buf, self.pos
+                    continue
+                ch = buf[pos]
+                if ch == ",":
+                    pos += 1
+                    key_next = bool(stack) and stack[-1] == "map"
+                else:
+                    break
+
+            if ch == "{":
+                self.pos = pos + 1
+                stack.append("map")
+                key_next = True
+                yield "start_map", None
+            elif ch == "}":
+                self.pos = pos + 1
+                if not stack or stack.pop() != "map":
+                    raise JSONDecodeError("Unexpected '}'", buf, pos)
+                key_next = False
+                yield "end_map", None
+            elif ch == "[":
+                self.pos = pos + 1
+                stack.append("array")
+                key_next = False
+                yield "start_array", None
+            elif ch == "]":
+                self.pos = pos + 1
+                if not stack or stack.pop() != "array":
+                    raise JSONDecodeError("Unexpected ']'", buf, pos)
+                key_next = False
+                yield "end_array", None
+            elif ch == '"':
+                try:
+                    value, end = scanstring(buf, pos + 1)
+                except JSONDecodeError:
+                    if self.eof:
+                        raise
+                    self.pos = pos
+                    self._more() # String continues in the next chunk
+                    continue
+                self.pos = end
+                if key_next:
+                    key_next = False
+                    yield "key", value
+                else:
+                    yield "string", value
+            elif ch in LITERALS:
+                literal, event, value = LITERALS[ch]
+                self.pos = pos
+                if len(buf) - pos < len(literal) and not self.eof:
+                    self._more()
+                    continue
+                if not buf.startswith(literal, pos):
+                    raise JSONDecodeError("Invalid literal", buf, pos)
+                self.pos = pos + len(literal)
+                yield event, value
+            else:
+                self.pos = pos
+                end = pos
+                while end < len(buf) and buf[end] in NUMBER_CHARS:
+                    end += 1
+                if end == len(buf) and not self.eof:
+                    self._more() # Number may continue in the next chunk
+                    continue
+                match = NUMBER_RE.match(buf, pos)
+                if match is None:
+                    raise JSONDecodeError("Unexpected character", buf, pos)
+                self.pos = match.end()
+                text = match.group()
+                is_float = match.group(1) or match.group(2)
+                yield "number", float(text) if is_float else int(text)
+
+    def items(self):
+        """Yields the decoded elements of the array whose start_array was just read."""
+        while True:
+            self.pos = WS_RE.match(self.buf, self.pos).end()
+            if self.pos >= len(self.buf):
+                if self.eof:
+                    raise JSONDecodeError("Unexpected end of data", self.buf, self.pos)
+                self._more()
+                continue
+            if self.buf[self.pos] == "]":
+                self.pos += 1
+                self.stack.pop()
+                return
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except JSONDecodeError:
+                if self.eof:
+                    raise
+                self._more() # Element continues in the next chunk
+                continue
+            if end == len(self.buf) and not self.eof:
+                self._more() # A number/literal may be cut off at the chunk edge
+                continue
+            self.pos = end
+            yield value
+
+def iter_events(fp, chunk_size=CHUNK_SIZE):
+    """Event stream of a JSON text stream (see EventReader)."""
+    return EventReader(fp, chunk_size).events()
+
+def skip_value(events, event):
+    """Consumes the rest of the value that started with `event`."""
+    depth = 1 if event in ("start_map", "start_array") else 0
+    while depth:
+        event, _ = next(events)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
@@ -0,0 +1,60 @@
+# Leveled, rate-limited logging for the sync, commit and upload paths.
+# Modules log through get_logger(name) with %-style arguments; the message
+# template (not the formatted text) is the rate-limit key, so per-chunk and
+# per-batch progress lines collapse to a few lines per interval plus a count of
+# what was suppressed, while distinct messages are unaffected.
+import logging
+import sys
+import threading
+import time
+
+ROOT = "bookmarks"
+FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+class RateLimit(logging.Filter):
+    """Passes at most `burst` records per message template every `interval` seconds."""
+
+    def __init__(self, interval=1.0, burst=5):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.windows = {} # (logger, template) -> [window start, passed, suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self.windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (+{suppressed} similar suppressed)"
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+def init_app(app):
+    """Sends bookmarks.* records at LOG_LEVEL and above to stdout, rate-limited."""
+    logger = logging.getLogger(ROOT)
+    logger.setLevel(app.config['LOG_LEVEL'])
+    if not any(getattr(h, "bookmarks", False) for h in logger.handlers):
+        handler = logging.StreamHandler(sys.stdout)
+        handler.bookmarks = True
+        handler.setFormatter(logging.Formatter(FORMAT))
+        logger.addHandler(handler)
+        logger.propagate = False
+    for handler in logger.handlers:
+        handler.filters = [RateLimit(app.config['LOG_RATE_INTERVAL'], app.config['LOG_RATE_BURST'])]
@@ -0,0 +1,215 @@
+# Request, SQL and sync instrumentation, exposed in Prometheus text format on /metrics.
+# Metrics live in process memory (one registry per worker process). Every
+# request is timed per route; SQLAlchemy cursor events count statements and
+# their time both globally (per engine) and for the request that ran them; sync
+# runs time their stages (read, parse, diff, stage, commit) and count rows.
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from database import db
+import storage
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500, 1000, 5000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.series = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            series = sorted(self.series.items())
+            for key, value in series:
+                lines.extend(self._samples(key, value))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_labels(self.labels, key)} {_number(value)}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts = self.series.get(key)
+            if counts is None:
+                # Per bucket (non-cumulative) counts, then +Inf, sum
+                counts = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def _samples(self, key, counts):
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            total += count
+            le = bound if bound == "+Inf" else _number(float(bound))
+            lines.append(f"{self.name}_bucket{_labels(self.labels, key, [('le', le)])} {total}")
+        lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(counts[-1])}")
+        lines.append(f"{self.name}_count{_labels(self.labels, key)} {total}")
+        return lines
+
+
+REGISTRY = []
+# Callables returning extra exposition lines (gauges read at scrape time)
+COLLECTORS = []
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by route.",
+                            ("method", "route", "status"))
+REQUEST_SQL_STATEMENTS = Histogram("http_request_sql_statements", "SQL statements per request.",
+                                   ("route",), COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram("http_request_sql_seconds", "SQL time per request.", ("route",))
+SQL_STATEMENTS = Counter("sql_statements_total", "SQL statements executed.", ("engine",))
+SQL_SECONDS = Counter("sql_seconds_total", "Time spent executing SQL.", ("engine",))
+SYNC_STAGE_SECONDS = Histogram("sync_stage_seconds", "Duration of sync stages.", ("source", "stage"),
+                               STAGE_BUCKETS)
+SYNC_ROWS = Counter("sync_rows_total", "Rows read, staged and committed by syncs.", ("source", "kind"))
+
+
+@contextmanager
+def sync_stage(source, stage):
+    """
+    Times one stage of a sync run. Sources emit the stages they have:
+    - read: Firefox's profile query (rows come out as bookmarks, nothing to parse)
+    - parse: Chrome's file read and JSON decode, one step (spooled for large files)
+    - diff: loading the feed (and live URLs) into the diff engine's temp tables
+    - stage: the INSERT ... SELECT comparing it and writing pending changes
+    - commit: applying a reviewed batch (/sync/commit)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SYNC_STAGE_SECONDS.observe(time.perf_counter() - start, source=source, stage=stage)
+
+
+def source_label(batch_source):
+    """Bounded label for a batch source: 'firefox_incremental' -> 'firefox'."""
+    return (batch_source or "unknown").split("_")[0]
+
+
+def count_rows(source, **kinds):
+    for kind, amount in kinds.items():
+        if amount:
+            SYNC_ROWS.inc(amount, source=source, kind=kind)
+
+
+def family(name, help, kind, samples):
+    """Exposition lines for values read at scrape time: samples is [(labels dict, value)]."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+    return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for collect in COLLECTORS:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+
+def instrument_engine(engine, name):
+    """Counts statements and SQL time on `engine`, globally and per request."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_start"].pop()
+        SQL_STATEMENTS.inc(engine=name)
+        SQL_SECONDS.inc(elapsed, engine=name)
+        if has_request_context() and "sql_statements" in g:
+            g.sql_statements += 1
+            g.sql_seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # A failed statement never reaches after_cursor_execute
+        connection = context.connection
+        if connection is not None and connection.info.get("metrics_start"):
+            connection.info["metrics_start"].pop()
+
+
+def init_app(app):
+    """Times every request of `app` and instruments its engines (call after storage.init_app)."""
+    with app.app_context():
+        instrument_engine(db.engine, "writer")
+    if storage.reader(app) is not None:
+        instrument_engine(storage.reader(app), "reader")
+
+    @app.before_request
+    def _start():
+        g.request_start = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+
+    @app.after_request
+    def _finish(response):
+        if "request_start" not in g:
+            return response
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                method=request.method, route=route, status=response.status_code)
+        REQUEST_SQL_STATEMENTS.observe(g.sql_statements, route=route)
+        REQUEST_SQL_SECONDS.observe(g.sql_seconds, route=route)
+        return response
+
+
+def response():
+    return Response(render(), mimetype=None, content_type=CONTENT_TYPE)
@@ -0,0 +1,135 @@
+# Additive schema upgrades for existing databases.
+# db.create_all() creates missing tables but never alters existing ones, so each
+# entry here adds a column to an older database (plus its indexes and backfill).
+import sqlite3
+from sqlalchemy import event
+from database import db, BookmarkHistory
+from url_normalizer import normalize_url
+import folders
+import logs
+
+log = logs.get_logger("migrations")
+
+BACKFILL_CHUNK = 5000
+
+
+def _columns(connection, table):
+    return {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def _backfill_normalized_urls(connection):
+    while True:
+        rows = connection.exec_driver_sql(
+            "SELECT id, url FROM bookmarks WHERE normalized_url IS NULL LIMIT ?", (BACKFILL_CHUNK,)
+        ).all()
+        if not rows:
+            break
+        connection.exec_driver_sql(
+            "UPDATE bookmarks SET normalized_url = ? WHERE id = ?",
+            [(normalize_url(url), bookmark_id) for bookmark_id, url in rows]
+        )
+
+
+def _backfill_folder_ids(connection):
+    # Files existing bookmarks into the folder tree (create_all made the folders table)
+    if "folder_path" in _columns(connection, "bookmarks") and _columns(connection, "folders"):
+        folders.rebuild(connection)
+
+
+def _backfill_pending_changes(connection):
+    # JSON diff_blob -> typed columns, decoded in SQL in one pass, then the blob goes
+    if "diff_blob" not in _columns(connection, "pending_changes"):
+        return
+    connection.exec_driver_sql("""
+        UPDATE pending_changes SET
+            changed = CASE WHEN change_type = 'update' THEN
+                (json_extract(diff_blob, '$.old.title') IS NOT json_extract(diff_blob, '$.new.title'))
+                | ((json_extract(diff_blob, '$.old.folder') IS NOT json_extract(diff_blob, '$.new.folder')) << 1)
+            END,
+            target_id = json_extract(diff_blob, '$.into'),
+            similarity = CASE WHEN json_extract(diff_blob, '$.kind') = 'near'
+                THEN json_extract(diff_blob, '$.similarity') END
+        WHERE diff_blob IS NOT NULL AND json_valid(diff_blob)
+    """)
+    connection.exec_driver_sql("""
+        UPDATE pending_changes SET
+            title = CASE WHEN change_type = 'new' OR changed & 1 THEN coalesce(json_extract(diff_blob, '$.new.title'), json_extract(diff_blob, '$.title')) END,
+            folder = CASE WHEN change_type = 'new' OR changed & 2 THEN coalesce(json_extract(diff_blob, '$.new.folder'), json_extract(diff_blob, '$.folder')) END,
+            url = CASE WHEN change_type = 'new' THEN json_extract(diff_blob, '$.url') END,
+            source = CASE WHEN change_type = 'new' THEN json_extract(diff_blob, '$.source') END
+        WHERE diff_blob IS NOT NULL AND json_valid(diff_blob)
+    """)
+    if sqlite3.sqlite_version_info >= (3, 35):
+        connection.exec_driver_sql("ALTER TABLE pending_changes DROP COLUMN diff_blob")
+    else:
+        connection.exec_driver_sql("UPDATE pending_changes SET diff_blob = NULL")
+
+
+def _rebuild_history(connection):
+    # Old snapshots become keyframes as they are; the table is rebuilt because deltas
+    # need a nullable url and tombstones must not reference bookmarks. The
+    # 'history_compact' job later re-encodes the snapshots as deltas.
+    connection.exec_driver_sql("ALTER TABLE bookmark_history RENAME TO bookmark_history_old")
+    BookmarkHistory.__table__.create(connection)
+    connection.exec_driver_sql(
+        "INSERT INTO bookmark_history (id, bookmark_id, version, changed, url, title, folder_path, event, created_at) "
+        "SELECT id, bookmark_id, version, 7, url, title, folder_path, 'update', created_at FROM bookmark_history_old"
+    )
+    connection.exec_driver_sql("DROP TABLE bookmark_history_old")
+
+
+# (table, column, column DDL, index statements, backfill)
+COLUMNS = [
+    ("bookmarks", "normalized_url", "VARCHAR",
+     ["CREATE INDEX IF NOT EXISTS ix_bookmarks_normalized_url ON bookmarks (normalized_url)"],
+     _backfill_normalized_urls),
+    ("bookmarks", "folder_id", "INTEGER REFERENCES folders(id)",
+     ["CREATE INDEX IF NOT EXISTS ix_bookmarks_folder_id ON bookmarks (folder_id)"],
+     _backfill_folder_ids),
+    ("pending_changes", "title", "VARCHAR", [], None),
+    ("pending_changes", "url", "VARCHAR", [], None),
+    ("pending_changes", "folder", "VARCHAR", [], None),
+    ("pending_changes", "source", "VARCHAR", [], None),
+    ("pending_changes", "changed", "INTEGER", [], None),
+    ("pending_changes", "target_id", "INTEGER", [], None),
+    # Last typed diff column: converts the old JSON diffs once all columns exist
+    ("pending_changes", "similarity", "FLOAT", [], _backfill_pending_changes),
+    # Delta-encoded history (also adds 'event')
+    ("bookmark_history", "changed", "INTEGER NOT NULL DEFAULT 7", [], _rebuild_history),
+    # Sync instrumentation
+    ("sync_batches", "completed_at", "DATETIME", [], None),
+    ("sync_batches", "rows_read", "INTEGER", [], None),
+    ("sync_batches", "rows_new", "INTEGER", [], None),
+    ("sync_batches", "rows_updated", "INTEGER", [], None),
+    ("sync_batches", "rows_deleted", "INTEGER", [], None),
+    ("sync_batches", "rows_committed", "INTEGER DEFAULT 0", [], None),
+]
+
+
+# Indexes added after their tables existed (create_all only indexes new tables)
+# (table, index statement)
+INDEXES = [
+    ("pending_changes", "CREATE INDEX IF NOT EXISTS ix_pending_changes_batch_id ON pending_changes (batch_id, change_type)"),
+]
+
+
+def upgrade(connection):
+    """Adds any missing columns and indexes. Safe to run on every start."""
+    for table, column, ddl, indexes, backfill in COLUMNS:
+        existing = _columns(connection, table)
+        if not existing or column in existing:
+            continue
+        connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+        if backfill:
+            backfill(connection)
+        for statement in indexes:
+            connection.exec_driver_sql(statement)
+        log.info("[MIGRATION] Added %s.%s", table, column)
+    for table, statement in INDEXES:
+        if _columns(connection, table):
+            connection.exec_driver_sql(statement)
+
+
+@event.listens_for(db.metadata, "after_create")
+def _after_create(target, connection, **kw):
+    upgrade(connection)
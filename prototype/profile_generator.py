@@ -0,0 +1,277 @@
+import os
+import json
+import base64
+import random
+import sqlite3
+import zlib
+import argparse
+from html import escape
+
+# Deterministic synthetic browser profiles for benchmarks and tests.
+# One generated tree is written as a Firefox places.sqlite, a Chrome 'Bookmarks'
+# JSON file and a Netscape HTML export; all three read back as the same
+# bookmarks, in the same order and with the same folder paths.
+# Usage: python profile_generator.py OUT_DIR [--bookmarks N] [--depth D] [--seed S]
+
+# Roots every format has: (label, Firefox folder id, Chrome root key)
+ROOTS = [("Bookmarks Toolbar", 3, "bookmark_bar"), ("Other Bookmarks", 5, "other")]
+
+WORDS = ("python sqlite flask recipe travel guide review release notes design pattern tutorial "
+         "benchmark garden history music keyboard privacy weather budget invoice map research "
+         "paper podcast climbing coffee bread camera lens docker kernel rust linux pricing "
+         "roadmap interview bike repair photo album school calendar").split()
+ACCENTED = ["Café", "Über", "naïve", "Ångström", "日本語", "résumé", "Zürich"]
+SITES = ["github", "stackoverflow", "wikipedia", "medium", "nytimes", "reddit", "youtube", "arxiv",
+         "docs.python", "developer.mozilla", "news.ycombinator", "bbc", "lemonde", "spiegel"]
+TLDS = [".com", ".org", ".net", ".io", ".co.uk", ".de", ".fr"]
+
+EPOCH = 1600000000 # Base timestamp (seconds) for add dates
+
+
+def _title(rng):
+    words = rng.sample(WORDS, rng.randint(2, 7))
+    if rng.random() < 0.05:
+        words.insert(rng.randrange(len(words)), rng.choice(ACCENTED))
+    if rng.random() < 0.03:
+        words.insert(1, "&")
+    title = " ".join(words)
+    return title[0].upper() + title[1:]
+
+
+def _url(rng, i):
+    site = rng.choice(SITES)
+    host = f"{site}{rng.choice(TLDS)}" if "." in site else f"{site}{rng.randint(0, 99)}{rng.choice(TLDS)}"
+    slug = "-".join(rng.sample(WORDS, rng.randint(1, 4)))
+    url = f"{rng.choice(['https', 'https', 'http'])}://{rng.choice(['', 'www.'])}{host}/{slug}/{i}"
+    if rng.random() < 0.3:
+        url += f"?id={i}&ref={rng.choice(WORDS)}"
+    if rng.random() < 0.1:
+        url += f"#{rng.choice(WORDS)}"
+    return url
+
+
+def generate(count, depth=4, per_folder=25, seed=42):
+    """
+    A bookmark tree: [(root label, root folder)]. Folders are {"name", "children"},
+    bookmarks {"title", "url", "added"}. Folders nest up to `depth` levels below
+    a root and hold `per_folder` bookmarks on average; ~2% of URLs repeat an
+    earlier one in another folder, as real libraries do.
+    """
+    rng = random.Random(seed)
+    roots = [(label, {"name": label, "children": []}) for label, _, _ in ROOTS]
+    folders = [(folder, 0) for _, folder in roots]
+    for i in range(max(0, count // per_folder - len(roots))):
+        parent, level = rng.choice([f for f in folders if f[1] < depth] or folders)
+        folder = {"name": f"{_title(rng).split(' ')[0]} {i}", "children": []}
+        parent["children"].append(folder)
+        folders.append((folder, level + 1))
+
+    urls = []
+    for i in range(count):
+        url = rng.choice(urls) if urls and rng.random() < 0.02 else _url(rng, i)
+        urls.append(url)
+        folder, _ = rng.choice(folders)
+        folder["children"].append({"title": _title(rng), "url": url, "added": EPOCH + i})
+    for folder, _ in folders:
+        rng.shuffle(folder["children"])
+    return roots
+
+
+def drift(roots, rate=0.1, seed=7):
+    """
+    A later state of the same library: `rate` of the bookmarks retitled, half
+    as many removed, moved to another folder and added.
+    """
+    rng = random.Random(seed)
+    roots = json.loads(json.dumps(roots))
+    folders = [folder for _, folder in iter_folders(roots)]
+    entries = [(folder, child) for folder in folders for child in folder["children"] if "url" in child]
+    for folder, bookmark in entries:
+        roll = rng.random()
+        if roll < rate:
+            bookmark["title"] += " (updated)"
+        elif roll < rate * 1.5:
+            folder["children"].remove(bookmark)
+        elif roll < rate * 2:
+            folder["children"].remove(bookmark)
+            rng.choice(folders)["children"].append(bookmark)
+    for i in range(int(len(entries) * rate / 2)):
+        rng.choice(folders)["children"].append(
+            {"title": _title(rng), "url": _url(rng, len(entries) + i), "added": EPOCH + len(entries) + i})
+    return roots
+
+
+def iter_folders(roots):
+    """(path, folder) for every folder, depth-first in document order."""
+    stack = [(label, folder) for label, folder in reversed(roots)]
+    while stack:
+        path, folder = stack.pop()
+        yield path, folder
+        for child in reversed(folder["children"]):
+            if "children" in child:
+                stack.append((f"{path} > {child['name']}", child))
+
+
+def iter_bookmarks(roots):
+    """(folder path, bookmark) in document order - the order every reader returns them."""
+    stack = [(label, folder, 0) for label, folder in reversed(roots)]
+    while stack:
+        path, folder, index = stack.pop()
+        for position in range(index, len(folder["children"])):
+            child = folder["children"][position]
+            if "children" in child:
+                stack.append((path, folder, position + 1))
+                stack.append((f"{path} > {child['name']}", child, 0))
+                break
+            yield path, child
+
+
+def _guid(rng):
+    return base64.urlsafe_b64encode(rng.randbytes(9)).decode()
+
+
+PLACES_SCHEMA = """
+CREATE TABLE moz_origins (id INTEGER PRIMARY KEY, prefix TEXT NOT NULL, host TEXT NOT NULL,
+    frecency INTEGER NOT NULL, UNIQUE (prefix, host));
+CREATE TABLE moz_places (id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR, rev_host LONGVARCHAR,
+    visit_count INTEGER DEFAULT 0, hidden INTEGER DEFAULT 0 NOT NULL, typed INTEGER DEFAULT 0 NOT NULL,
+    frecency INTEGER DEFAULT -1 NOT NULL, last_visit_date INTEGER, guid TEXT, foreign_count INTEGER DEFAULT 0 NOT NULL,
+    url_hash INTEGER DEFAULT 0 NOT NULL, description TEXT, preview_image_url TEXT, origin_id INTEGER);
+CREATE TABLE moz_bookmarks (id INTEGER PRIMARY KEY, type INTEGER, fk INTEGER DEFAULT NULL, parent INTEGER,
+    position INTEGER, title LONGVARCHAR, keyword_id INTEGER, folder_type TEXT, dateAdded INTEGER,
+    lastModified INTEGER, guid TEXT, syncStatus INTEGER NOT NULL DEFAULT 0, syncChangeCounter INTEGER NOT NULL DEFAULT 1);
+CREATE TABLE moz_bookmarks_deleted (guid TEXT PRIMARY KEY, dateRemoved INTEGER NOT NULL DEFAULT 0);
+CREATE INDEX moz_places_url_hashindex ON moz_places (url_hash);
+CREATE UNIQUE INDEX moz_places_guid_uniqueindex ON moz_places (guid);
+CREATE INDEX moz_bookmarks_itemindex ON moz_bookmarks (fk, type);
+CREATE INDEX moz_bookmarks_parentindex ON moz_bookmarks (parent, position);
+CREATE INDEX moz_bookmarks_itemlastmodifiedindex ON moz_bookmarks (fk, lastModified);
+CREATE UNIQUE INDEX moz_bookmarks_guid_uniqueindex ON moz_bookmarks (guid);
+"""
+
+PLACES_ROOTS = [(1, 0, "", "root________"), (2, 1, "menu", "menu________"), (3, 1, "toolbar", "toolbar_____"),
+                (4, 1, "tags", "tags________"), (5, 1, "unfiled", "unfiled_____"), (6, 1, "mobile", "mobile______")]
+
+
+def write_places(roots, path, seed=42):
+    """Firefox places.sqlite (moz_places/moz_bookmarks as Firefox lays them out)."""
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(PLACES_SCHEMA)
+    conn.executemany("INSERT INTO moz_bookmarks (id, type, parent, position, title, dateAdded, lastModified, guid) "
+                     "VALUES (?, 2, ?, 0, ?, 0, 0, ?)", PLACES_ROOTS)
+    places = {}
+    items = []
+    next_id = [len(PLACES_ROOTS)]
+
+    def add(parent, position, child):
+        next_id[0] += 1
+        item_id = next_id[0]
+        added = child.get("added", EPOCH) * 1000000
+        if "children" in child:
+            items.append((item_id, 2, None, parent, position, child["name"], added, added, _guid(rng)))
+        else:
+            if child["url"] not in places:
+                host = child["url"].split("/")[2]
+                places[child["url"]] = (len(places) + 1, child["url"], child["title"], host[::-1] + ".",
+                                        zlib.crc32(child["url"].encode()), _guid(rng))
+            items.append((item_id, 1, places[child["url"]][0], parent, position, child["title"], added, added, _guid(rng)))
+        return item_id
+
+    # Ids follow document order, like a profile built by hand
+    stack = [(root_id, folder, 0) for (_, folder), (_, root_id, _) in reversed(list(zip(roots, ROOTS)))]
+    while stack:
+        parent, folder, index = stack.pop()
+        for position in range(index, len(folder["children"])):
+            child = folder["children"][position]
+            item_id = add(parent, position, child)
+            if "children" in child:
+                stack.append((parent, folder, position + 1))
+                stack.append((item_id, child, 0))
+                break
+
+    conn.executemany("INSERT INTO moz_places (id, url, title, rev_host, url_hash, guid) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", places.values())
+    conn.executemany("INSERT INTO moz_bookmarks (id, type, fk, parent, position, title, dateAdded, lastModified, guid) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", items)
+    conn.execute("UPDATE moz_places SET foreign_count = (SELECT count(*) FROM moz_bookmarks WHERE fk = moz_places.id)")
+    conn.commit()
+    conn.close()
+
+
+def write_chrome(roots, path, seed=42):
+    """Chrome 'Bookmarks' JSON."""
+    rng = random.Random(seed)
+    next_id = [0]
+
+    def node(child):
+        next_id[0] += 1
+        out = {"id": str(next_id[0]), "guid": _guid(rng), "name": child.get("name", child.get("title")),
+               "date_added": str((child.get("added", EPOCH) + 11644473600) * 1000000)}
+        if "children" in child:
+            out.update(type="folder", children=[node(c) for c in child["children"]])
+        else:
+            out.update(type="url", url=child["url"])
+        return out
+
+    data = {"checksum": "", "roots": {}, "version": 1}
+    for (label, folder), (_, _, key) in zip(roots, ROOTS):
+        data["roots"][key] = node(folder)
+    data["roots"]["synced"] = {"children": [], "id": "0", "name": "Mobile bookmarks", "type": "folder"}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=3)
+
+
+def write_netscape(roots, path):
+    """Netscape HTML export (the layout Firefox and Chrome write)."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<!DOCTYPE NETSCAPE-Bookmark-file-1>\n'
+                '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n'
+                '<TITLE>Bookmarks</TITLE>\n<H1>Bookmarks</H1>\n<DL><p>\n')
+
+        def write(folder, level):
+            indent = "    " * level
+            f.write(f'{indent}<DT><H3 ADD_DATE="{EPOCH}">{escape(folder["name"], quote=False)}</H3>\n{indent}<DL><p>\n')
+            for child in folder["children"]:
+                if "children" in child:
+                    write(child, level + 1)
+                else:
+                    f.write(f'{indent}    <DT><A HREF="{escape(child["url"])}" ADD_DATE="{child["added"]}">'
+                            f'{escape(child["title"], quote=False)}</A>\n')
+            f.write(f'{indent}</DL><p>\n')
+
+        for _, folder in roots:
+            write(folder, 1)
+        f.write('</DL><p>\n')
+
+
+def write_profiles(roots, out_dir, seed=42):
+    """Writes all three formats; returns {"firefox": dir, "chrome": dir, "netscape": file}."""
+    paths = {"firefox": os.path.join(out_dir, "firefox"), "chrome": os.path.join(out_dir, "chrome"),
+             "netscape": os.path.join(out_dir, "bookmarks.html")}
+    os.makedirs(paths["firefox"], exist_ok=True)
+    os.makedirs(paths["chrome"], exist_ok=True)
+    write_places(roots, os.path.join(paths["firefox"], "places.sqlite"), seed)
+    write_chrome(roots, os.path.join(paths["chrome"], "Bookmarks"), seed)
+    write_netscape(roots, paths["netscape"])
+    return paths
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Writes synthetic Firefox, Chrome and Netscape bookmark files.")
+    args.add_argument("out_dir")
+    args.add_argument("--bookmarks", type=int, default=10000)
+    args.add_argument("--depth", type=int, default=4)
+    args.add_argument("--per-folder", type=int, default=25)
+    args.add_argument("--seed", type=int, default=42)
+    args.add_argument("--drift", type=float, default=0, help="write a later state of the library (e.g. 0.1)")
+    opts = args.parse_args()
+
+    tree = generate(opts.bookmarks, opts.depth, opts.per_folder, opts.seed)
+    if opts.drift:
+        tree = drift(tree, opts.drift)
+    paths = write_profiles(tree, opts.out_dir, opts.seed)
+    for kind, path in paths.items():
+        print(f"{kind:<9} {path}")
@@ -0,0 +1,182 @@
+# Response cache for the dashboard's read endpoints.
+# The database holds a monotonic library version. Any transaction that writes
+# (ORM flushes or raw bulk SQL alike) bumps it on commit, so every write path -
+# commits, tagging, reverts, uploads, jobs, other worker processes - is covered
+# without call-site bookkeeping. Read endpoints keep their serialized
+# JSON bodies in a bounded in-process LRU keyed on (endpoint, params, version);
+# a bump makes older entries unreachable and they age out. ETags are derived
+# from the same key, so a client that already has the current body gets a 304
+# before the view runs or the LRU is consulted.
+import functools
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from flask import request, Response
+from sqlalchemy import event
+from database import db
+
+VERSION_TABLE = "library_version"
+
+SCHEMA = [
+    f"""CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        version INTEGER NOT NULL
+    )""",
+    f"INSERT OR IGNORE INTO {VERSION_TABLE} (id, version) VALUES (0, 1)",
+]
+
+READ_VERSION = db.text(f"SELECT version FROM {VERSION_TABLE}")
+BUMP_VERSION = f"UPDATE {VERSION_TABLE} SET version = version + 1"
+
+# Data-changing statements (schema changes alone don't bump)
+_WRITES = re.compile(
+    r"\s*(?:INSERT|UPDATE|DELETE|REPLACE|WITH\b.*\b(?:INSERT|UPDATE|DELETE|REPLACE))\b", re.I | re.S
+)
+_DIRTY = "library_changed"
+
+
+class ResponseCache:
+    """Thread-safe LRU of response bodies, bounded by their total size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.not_modified = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype):
+        # Oversized bodies (e.g. unpaginated listings) would flush everything else
+        if len(body) > self.max_bytes // 4:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+            self.entries[key] = (body, mimetype)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+cache = ResponseCache(32 * 1024 * 1024)
+
+
+def install(connection):
+    for statement in SCHEMA:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(db.metadata, "after_create")
+def _after_create(target, connection, **kw):
+    install(connection)
+
+
+@event.listens_for(db.metadata, "before_drop")
+def _before_drop(target, connection, **kw):
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {VERSION_TABLE}")
+    cache.clear()
+
+
+def version():
+    """Current library version (read before the data it versions)."""
+    return db.session.execute(READ_VERSION).scalar()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not conn.info.get(_DIRTY) and _WRITES.match(statement):
+        conn.info[_DIRTY] = True
+
+
+def _commit(conn):
+    # Same transaction as the changes: readers never see new data under an old version
+    if conn.info.pop(_DIRTY, False):
+        conn.connection.cursor().execute(BUMP_VERSION)
+
+
+def _reset(conn):
+    conn.info.pop(_DIRTY, None)
+
+
+def init_app(app):
+    """Sizes the LRU from RESPONSE_CACHE_MB and hooks version bumps into the app's engine."""
+    cache.max_bytes = int(app.config.get('RESPONSE_CACHE_MB', 32) * 1024 * 1024)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "commit", _commit)
+    event.listen(engine, "begin", _reset)
+    event.listen(engine, "rollback", _reset)
+
+
+def etag_for(key, current):
+    return f'{current}-{hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()}'
+
+
+def cached(view):
+    """
+    Serves GET responses of `view` from the cache. Only successful, non-streamed
+    responses are stored; anything else passes through untouched.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET' or not cache.max_bytes:
+            return view(*args, **kwargs)
+
+        key = (request.endpoint, tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))))
+        current = version()
+        etag = etag_for(key, current)
+        if request.if_none_match.contains(etag):
+            with cache.lock:
+                cache.not_modified += 1
+            return _respond(b"", None, etag, 304)
+
+        entry = cache.get((key, current))
+        if entry is not None:
+            return _respond(entry[0], entry[1], etag)
+
+        response = view(*args, **kwargs)
+        if not isinstance(response, Response) or response.status_code != 200 or response.is_streamed:
+            return response
+        body = response.get_data()
+        cache.put((key, current), body, response.mimetype)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    return wrapper
+
+
+def _respond(body, mimetype, etag, status=200):
+    response = Response(body, status=status, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,159 @@
+import re
+from contextlib import contextmanager
+from sqlalchemy import event, func, literal_column, table, column, text
+from database import db
+
+# FTS5 virtual table mirroring searchable bookmark fields.
+# rowid == bookmarks.id so results can be joined straight back to the ORM.
+FTS_TABLE = "bookmarks_fts"
+DEFERRED_TABLE = "bookmarks_fts_deferred"
+
+# FTS5 automerge level (default 4); crisis merges still bound the segment count
+AUTOMERGE = 16
+
+# Column weights for bm25 ranking: title, url, folder_path, tags
+RANK_WEIGHTS = (10.0, 5.0, 2.0, 5.0)
+
+fts = table(FTS_TABLE, column("rowid"), column("title"), column("url"),
+            column("folder_path"), column("tags"))
+
+_TAGS_FOR = """
+    (SELECT coalesce(group_concat(t.name, ' '), '')
+     FROM bookmark_tags bt JOIN tags t ON t.id = bt.tag_id
+     WHERE bt.bookmark_id = {ref})
+"""
+
+SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, url, folder_path, tags,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""",
+    # Merge segments less eagerly: batched bulk inserts spend far less time re-merging
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('automerge', {AUTOMERGE})",
+    # Holds a row only inside a write transaction that indexes its inserts in bulk
+    f"""CREATE TABLE IF NOT EXISTS {DEFERRED_TABLE} (id INTEGER PRIMARY KEY)""",
+    # Keep the index in sync for every write path (ORM, bulk Core inserts, executemany)
+    # Recreated on install so databases from before deferred indexing get the WHEN clause
+    "DROP TRIGGER IF EXISTS bookmarks_fts_ai",
+    f"""CREATE TRIGGER bookmarks_fts_ai AFTER INSERT ON bookmarks
+        WHEN NOT EXISTS (SELECT 1 FROM {DEFERRED_TABLE}) BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, url, folder_path, tags)
+        VALUES (new.id, new.title, new.url, new.folder_path, '');
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS bookmarks_fts_au AFTER UPDATE OF title, url, folder_path ON bookmarks BEGIN
+        UPDATE {FTS_TABLE} SET title = new.title, url = new.url, folder_path = new.folder_path
+        WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS bookmarks_fts_ad AFTER DELETE ON bookmarks BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS bookmark_tags_fts_ai AFTER INSERT ON bookmark_tags BEGIN
+        UPDATE {FTS_TABLE} SET tags = {_TAGS_FOR.format(ref='new.bookmark_id')}
+        WHERE rowid = new.bookmark_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS bookmark_tags_fts_ad AFTER DELETE ON bookmark_tags BEGIN
+        UPDATE {FTS_TABLE} SET tags = {_TAGS_FOR.format(ref='old.bookmark_id')}
+        WHERE rowid = old.bookmark_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tags_fts_au AFTER UPDATE OF name ON tags BEGIN
+        UPDATE {FTS_TABLE} SET tags = {_TAGS_FOR.format(ref=f'{FTS_TABLE}.rowid')}
+        WHERE rowid IN (SELECT bookmark_id FROM bookmark_tags WHERE tag_id = new.id);
+    END""",
+]
+
+
+def install(connection):
+    """Creates the FTS table and triggers, backfilling the index on first install."""
+    existed = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (FTS_TABLE,)
+    ).first() is not None
+
+    for statement in SCHEMA:
+        connection.exec_driver_sql(statement)
+
+    if not existed:
+        rebuild(connection)
+
+
+def rebuild(connection):
+    """Repopulates the FTS index from the bookmarks and tags tables."""
+    connection.exec_driver_sql(f"DELETE FROM {FTS_TABLE}")
+    connection.exec_driver_sql(f"""
+        INSERT INTO {FTS_TABLE}(rowid, title, url, folder_path, tags)
+        SELECT b.id, b.title, b.url, b.folder_path, {_TAGS_FOR.format(ref='b.id')}
+        FROM bookmarks b
+    """)
+
+
+@contextmanager
+def deferred(connection):
+    """
+    Bulk-insert mode for one write transaction: rows inserted into bookmarks
+    inside the block skip the per-row trigger and are indexed with a single
+    INSERT ... SELECT on exit (several times faster for large batches).
+    SQLite serializes writers, so no other connection sees the flag row.
+    """
+    start = connection.exec_driver_sql("SELECT coalesce(max(id), 0) FROM bookmarks").scalar()
+    connection.exec_driver_sql(f"INSERT INTO {DEFERRED_TABLE} DEFAULT VALUES")
+    try:
+        yield
+    finally:
+        connection.exec_driver_sql(f"DELETE FROM {DEFERRED_TABLE}")
+    connection.exec_driver_sql(f"""
+        INSERT INTO {FTS_TABLE}(rowid, title, url, folder_path, tags)
+        SELECT id, title, url, folder_path, '' FROM bookmarks WHERE id > ?
+    """, (start,))
+
+
+@event.listens_for(db.metadata, "after_create")
+def _after_create(target, connection, **kw):
+    install(connection)
+
+
+@event.listens_for(db.metadata, "before_drop")
+def _before_drop(target, connection, **kw):
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {DEFERRED_TABLE}")
+
+
+def build_match_query(term):
+    """
+    Turns free text into an FTS5 MATCH expression with prefix matching.
+    Each word becomes a quoted prefix token; all tokens must match.
+    Returns None if the term contains nothing searchable.
+    """
+    tokens = re.findall(r"\w+", term or "", re.UNICODE)
+    if not tokens:
+        return None
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def match_clause(match):
+    """SQL clause restricting the FTS table to rows matching `match`."""
+    return literal_column(FTS_TABLE).op("MATCH")(match)
+
+
+def rank_order():
+    """Best matches first (bm25 scores are negative; lower is better)."""
+    return func.bm25(literal_column(FTS_TABLE), *RANK_WEIGHTS)
+
+
+def apply_match(query, model, match):
+    """Restricts a query (ORM Query or Core select) on `model` to FTS hits."""
+    return query.join(fts, fts.c.rowid == model.id).filter(match_clause(match))
+
+
+def apply_search(query, model, match):
+    """Restricts an ORM query on `model` to FTS hits, ordered by relevance."""
+    return (apply_match(query, model, match)
+            .order_by(None)
+            .order_by(rank_order(), model.id.desc()))
+
+
+def count_matches(session, match):
+    """Total hit count straight from the FTS index (no join against bookmarks)."""
+    return session.execute(
+        text(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"),
+        {"match": match}
+    ).scalar()
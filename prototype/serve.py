@@ -0,0 +1,170 @@
+# Production launcher: preforked worker processes, each serving requests on a
+# bounded thread pool, all accepting from one listening socket. The master
+# runs schema setup once, then forks the workers (each builds its own app, so
+# no engine, connection or thread crosses a fork) and replaces any that die.
+# Workers share one database writer: storage's writer lock lets one at a time
+# hold it, so their writes queue instead of racing for SQLite's file lock.
+# Without fork (Windows) the app is served by one process with the thread pool.
+# Usage: python serve.py [--workers N] [--threads N] [--host H] [--port P]
+import os
+import signal
+import socket
+import time
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('FLASK_ENV', 'production')
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from config import Config
+import api
+import jobs
+import storage
+from database import db
+
+# Idle keep-alive connections give their thread back after this many seconds
+KEEPALIVE_TIMEOUT = 5
+# Seconds before a worker that died is replaced (avoids a tight crash loop)
+RESPAWN_DELAY = 1
+
+
+class RequestHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug's server with requests handled on a fixed-size thread pool."""
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd=None):
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def listen(host, port):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(socket.SOMAXCONN)
+    # Workers race to accept: the losers get EAGAIN instead of blocking
+    sock.setblocking(False)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _exit_on_signal(signum, frame):
+    raise SystemExit(0)
+
+
+def serve(app, host, port, threads, sock=None):
+    """Serves `app` until SIGTERM/SIGINT, on `sock` if given."""
+    server = PooledWSGIServer(host, port, app, threads, fd=sock.fileno() if sock else None)
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    try:
+        server.serve_forever()
+    except (SystemExit, KeyboardInterrupt):
+        pass
+    finally:
+        server.server_close() # Stop accepting, then let in-flight requests finish
+        server.pool.shutdown(wait=True)
+
+
+def _worker(sock, host, port, threads, config):
+    code = 0
+    try:
+        signal.signal(signal.SIGINT, _exit_on_signal)
+        serve(api.create_app(config), host, port, threads, sock)
+        jobs.manager.shutdown()
+    except Exception:
+        traceback.print_exc()
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def prepare(config):
+    """Schema setup, once for all workers; leaves no open connections behind."""
+    app = api.create_app(config)
+    api.init_schema(app)
+    with app.app_context():
+        db.engine.dispose()
+    if storage.reader(app) is not None:
+        storage.reader(app).dispose()
+
+
+def run(host, port, workers, threads):
+    config = {}
+    if workers > 1 and not Config.JOB_STATE_DB:
+        config['JOB_STATE_DB'] = os.path.abspath(f"{Config.DATABASE_NAME}-jobs")
+        # Jobs of a previous run are gone
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(config['JOB_STATE_DB'] + suffix):
+                os.remove(config['JOB_STATE_DB'] + suffix)
+    prepare(config)
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        print(f"[SERVE] http://{host}:{port} - 1 process x {threads} threads")
+        serve(api.create_app(config), host, port, threads)
+        jobs.manager.shutdown()
+        return
+
+    sock = listen(host, port)
+    print(f"[SERVE] http://{host}:{port} - {workers} workers x {threads} threads (master {os.getpid()})")
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _worker(sock, host, port, threads, config)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"[SERVE] Worker {pid} exited ({os.waitstatus_to_exitcode(status)}), restarting")
+            time.sleep(RESPAWN_DELAY)
+            if not stopping:
+                spawn()
+    sock.close()
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Serves the bookmark manager with preforked workers.")
+    args.add_argument("--host", default=Config.HOST)
+    args.add_argument("--port", type=int, default=Config.PORT)
+    args.add_argument("--workers", type=int, default=Config.WEB_WORKERS)
+    args.add_argument("--threads", type=int, default=Config.WEB_THREADS)
+    opts = args.parse_args()
+    run(opts.host, opts.port, max(1, opts.workers), max(1, opts.threads))
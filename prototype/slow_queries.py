@@ -0,0 +1,199 @@
+# Opt-in slow-query recorder (SLOW_QUERY_MS > 0).
+# Statements slower than the threshold are normalized into fingerprints
+# (literals and IN/VALUES lists collapsed) and aggregated per fingerprint. The
+# first slow execution of a fingerprint (and the next one after PLAN_TTL)
+# captures its EXPLAIN QUERY PLAN on the same connection and parameters; full
+# scans (SCAN) of tables with at least SLOW_QUERY_LARGE_TABLE_ROWS rows are
+# flagged, as are temp b-tree sorts.
+# Reports are served by GET /admin/slow_queries.
+import hashlib
+import re
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event
+from database import db
+import logs
+import storage
+
+log = logs.get_logger("slow_queries")
+
+# Only statements EXPLAIN QUERY PLAN can describe
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+# Table sizes (max(rowid)) are re-read at most this often
+TABLE_ROWS_TTL = 60
+# A fingerprint is EXPLAINed again on its next slow run after this long, so
+# plans (and scan flags) follow table growth
+PLAN_TTL = 300
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_ROW = r"\(\s*\?(?:\s*,\s*\?)*\s*\)"
+_VALUES = re.compile(rf"({_ROW})(?:\s*,\s*{_ROW})+")
+_SPACE = re.compile(r"\s+")
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+# "FROM bookmarks AS b", "JOIN bookmark_history h": plans name the alias
+_SOURCE = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+([\w.]+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_NOT_ALIAS = {"WHERE", "ON", "USING", "JOIN", "LEFT", "INNER", "CROSS", "OUTER", "NATURAL", "GROUP", "ORDER",
+              "LIMIT", "SET", "VALUES", "SELECT", "UNION", "EXCEPT", "INTERSECT", "HAVING", "WINDOW", "AS",
+              "DEFAULT", "INDEXED", "NOT", "RETURNING", "FULL", "RIGHT", "OFFSET", "WITH"}
+_SCAN = re.compile(r"^SCAN (?:TABLE )?([\w.]+)")
+
+
+def normalize(statement):
+    """The statement with comments, literals and repeated placeholders collapsed."""
+    text = _COMMENT.sub(" ", statement)
+    text = _STRING.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    text = _IN_LIST.sub("IN (...)", text)
+    text = _VALUES.sub(r"\1, ...", text)
+    return _SPACE.sub(" ", text).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.blake2b(normalized.encode(), digest_size=6).hexdigest()
+
+
+def aliases(statement):
+    """{name or alias used in query plans: table name}."""
+    names = {}
+    for table, alias in _SOURCE.findall(statement):
+        table = table.split(".")[-1]
+        names.setdefault(table, table)
+        if alias and alias.upper() not in _NOT_ALIAS:
+            names[alias] = table
+    return names
+
+
+class SlowQueryRecorder:
+    def __init__(self, threshold_ms=0, large_table_rows=10000, max_fingerprints=500):
+        self.configure(threshold_ms, large_table_rows, max_fingerprints)
+        self.queries = {}
+        self.table_rows = {} # table -> (checked at, rows or None)
+        self.lock = threading.Lock()
+
+    def configure(self, threshold_ms, large_table_rows, max_fingerprints):
+        self.threshold = threshold_ms / 1000 if threshold_ms and threshold_ms > 0 else None
+        self.large_table_rows = large_table_rows
+        self.max_fingerprints = max_fingerprints
+
+    @property
+    def enabled(self):
+        return self.threshold is not None
+
+    def reset(self):
+        with self.lock:
+            self.queries.clear()
+
+    def record(self, dbapi_connection, statement, parameters, elapsed, engine):
+        normalized = normalize(statement)
+        key = fingerprint(normalized)
+        with self.lock:
+            entry = self.queries.get(key)
+            if entry is None:
+                if len(self.queries) >= self.max_fingerprints:
+                    # Evict the fingerprint with the least total time
+                    del self.queries[min(self.queries, key=lambda k: self.queries[k]["total_ms"])]
+                entry = self.queries[key] = {
+                    "fingerprint": key, "statement": normalized, "engine": engine, "count": 0,
+                    "total_ms": 0.0, "max_ms": 0.0, "first_seen": datetime.utcnow(), "plan": None,
+                    "scans": [], "temp_btree": False, "explained_at": None
+                }
+            entry["count"] += 1
+            entry["total_ms"] += elapsed * 1000
+            entry["max_ms"] = max(entry["max_ms"], elapsed * 1000)
+            entry["last_seen"] = datetime.utcnow()
+            now = time.monotonic()
+            explain = entry["explained_at"] is None or now - entry["explained_at"] >= PLAN_TTL
+            if explain:
+                entry["explained_at"] = now # Claimed: other threads don't explain it too
+        if explain:
+            plan = self.explain(dbapi_connection, statement, parameters)
+            with self.lock:
+                entry.update(plan)
+            if plan["scans"]:
+                log.warning("[SLOW QUERY] %s: full scan of %s (%.1f ms): %s", key,
+                            ", ".join(s["table"] for s in plan["scans"]), elapsed * 1000, normalized[:200])
+
+    def explain(self, dbapi_connection, statement, parameters):
+        """Plan details, flagged scans of large tables and whether a temp b-tree sorts."""
+        if isinstance(parameters, list):
+            parameters = parameters[0] if parameters else () # executemany: first row
+        try:
+            rows = dbapi_connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+        except Exception as e:
+            return {"plan": [f"EXPLAIN failed: {e}"], "scans": [], "temp_btree": False}
+        names = aliases(statement)
+        scans = []
+        for row in rows:
+            detail = row[3]
+            match = _SCAN.match(detail)
+            if not match or "VIRTUAL TABLE" in detail:
+                continue
+            table = names.get(match.group(1), match.group(1))
+            rows_estimate = self.rows(dbapi_connection, table)
+            if rows_estimate is not None and rows_estimate >= self.large_table_rows:
+                scans.append({"table": table, "rows": rows_estimate, "detail": detail})
+        return {"plan": [row[3] for row in rows], "scans": scans,
+                "temp_btree": any("USE TEMP B-TREE" in row[3] for row in rows)}
+
+    def rows(self, dbapi_connection, table):
+        """Approximate row count (max rowid) of a real table, None for CTEs and views."""
+        now = time.monotonic()
+        with self.lock:
+            cached = self.table_rows.get(table)
+        if cached and now - cached[0] < TABLE_ROWS_TTL:
+            return cached[1]
+        rows = None # Counted without the lock: recording threads never wait on a query
+        try:
+            if dbapi_connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                        (table,)).fetchone():
+                rows = dbapi_connection.execute(f'SELECT max(rowid) FROM "{table}"').fetchone()[0] or 0
+        except Exception:
+            pass # WITHOUT ROWID tables
+        with self.lock:
+            self.table_rows[table] = (now, rows)
+        return rows
+
+    def report(self, sort="total_ms", limit=50, flagged_only=False):
+        with self.lock:
+            entries = [dict(e, scans=list(e["scans"]), plan=list(e["plan"] or ())) for e in self.queries.values()]
+        if flagged_only:
+            entries = [e for e in entries if e["scans"]]
+        for e in entries:
+            del e["explained_at"]
+            e["avg_ms"] = round(e["total_ms"] / e["count"], 3)
+            e["total_ms"] = round(e["total_ms"], 3)
+            e["max_ms"] = round(e["max_ms"], 3)
+        entries.sort(key=lambda e: e[sort], reverse=True)
+        return entries[:limit]
+
+
+recorder = SlowQueryRecorder()
+
+
+def instrument_engine(engine, name):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if recorder.enabled and context is not None:
+            context.slow_query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "slow_query_start", None)
+        if start is None or recorder.threshold is None:
+            return
+        elapsed = time.perf_counter() - start
+        if elapsed >= recorder.threshold and statement.lstrip()[:7].upper().startswith(EXPLAINABLE):
+            recorder.record(cursor.connection, statement, parameters, elapsed, name)
+
+
+def init_app(app):
+    """Configures the recorder from SLOW_QUERY_* and hooks it into the app's engines (after storage.init_app)."""
+    recorder.configure(app.config['SLOW_QUERY_MS'], app.config['SLOW_QUERY_LARGE_TABLE_ROWS'],
+                       app.config['SLOW_QUERY_MAX_FINGERPRINTS'])
+    with app.app_context():
+        instrument_engine(db.engine, "writer")
+    if storage.reader(app) is not None:
+        instrument_engine(storage.reader(app), "reader")
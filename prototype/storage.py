@@ -0,0 +1,156 @@
+# SQLite storage profile for file databases (STORAGE_PROFILE = 'wal').
+# Every connection runs with WAL and tuned pragmas, so readers never block the
+# writer (or each other) and never see "database is locked". GET/HEAD requests
+# are served from a pool of read-only connections. Everything else - write
+# requests and background jobs - goes through the app's own engine, whose pool
+# holds exactly one connection (see Config.SQLALCHEMY_ENGINE_OPTIONS): that
+# pool is the writer queue of a process. serve.py forks several processes,
+# each with its own pool, so the writer connection also holds an exclusive
+# lock on <database>-writer.lock while it is checked out: across workers,
+# writes take turns the same way (POSIX only; elsewhere there's one process).
+# The connection is held from a session's first statement to its commit, so
+# code that does slow non-database work (profile reads, parsing) does it
+# before its first query or after closing the session; long writers that
+# commit per chunk (batch commits, uploads) hand it over between chunks, and
+# jobs' library scans read through the reader pool with read_only().
+import os
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+import logs
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+log = logs.get_logger("storage")
+
+READER = "sqlite_reader"
+READ_METHODS = ("GET", "HEAD")
+# Seconds between attempts on a writer lock held by another worker
+LOCK_POLL_INTERVAL = 0.01
+
+
+def pragmas(config):
+    """Per-connection tuning shared by the writer and the readers."""
+    return [
+        # WAL makes a commit one append; NORMAL syncs at checkpoints, still crash-safe
+        "PRAGMA synchronous = NORMAL",
+        f"PRAGMA cache_size = -{int(config['SQLITE_CACHE_MB'] * 1024)}",
+        f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_MB'] * 1024 * 1024)}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+
+
+def _run_on_connect(engine, statements):
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+
+class WriterLock:
+    """Exclusive flock on `path`, held while the engine's connection is checked out."""
+
+    def __init__(self, path, timeout):
+        self.path = path
+        self.timeout = timeout
+        self.file = None
+        self.pid = None
+        self.held = False
+
+    def acquire(self):
+        # Opened per process: a descriptor inherited over fork shares its lock
+        if self.pid != os.getpid():
+            self.file = open(self.path, "a")
+            self.pid = os.getpid()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self.held = True
+                return
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise PoolTimeout(f"Writer lock {self.path} not acquired within {self.timeout}s")
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    def release(self):
+        if self.held:
+            self.held = False
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+
+    def attach(self, engine):
+        event.listen(engine, "checkout", lambda *args: self.acquire())
+        event.listen(engine, "checkin", lambda *args: self.release())
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that reads through the reader pool during read-only requests."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and g.get("read_only"):
+            reader = current_app.extensions.get(READER)
+            if reader is not None:
+                return reader
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def reader(app):
+    """The app's read-only engine, or None without the 'wal' profile."""
+    return app.extensions.get(READER)
+
+
+@contextmanager
+def read_only():
+    """
+    Routes the session through the reader pool for a read-only stretch outside
+    a GET request (e.g. a job's library scan), so it never holds the writer.
+    Enter it with no uncommitted writes: the session is closed on both sides.
+    """
+    session = current_app.extensions["sqlalchemy"].session
+    session.close()
+    previous = g.get("read_only")
+    g.read_only = True
+    try:
+        yield
+    finally:
+        session.close()
+        g.read_only = previous
+
+
+def init_app(app):
+    """Applies the 'wal' profile to the app's engine and adds the reader pool (call after db.init_app)."""
+    if app.config.get('STORAGE_PROFILE') != 'wal':
+        return
+    db = app.extensions["sqlalchemy"]
+    with app.app_context():
+        writer = db.engine
+    if writer.url.database in (None, "", ":memory:"):
+        log.warning("[STORAGE] In-memory database: 'wal' profile not applied")
+        return
+
+    _run_on_connect(writer, ["PRAGMA journal_mode = WAL"] + pragmas(app.config))
+    if fcntl is not None:
+        WriterLock(f"{writer.url.database}-writer.lock",
+                   app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('pool_timeout', 30)).attach(writer)
+    readers = create_engine(
+        writer.url,
+        pool_size=app.config['SQLITE_READERS'],
+        max_overflow=0,
+        connect_args=app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('connect_args', {})
+    )
+    _run_on_connect(readers, pragmas(app.config) + ["PRAGMA query_only = ON"])
+    app.extensions[READER] = readers
+
+    @app.before_request
+    def _route_reads():
+        g.read_only = request.method in READ_METHODS
+
+    log.info("[STORAGE] WAL profile: %s readers, 1 writer (%s)", app.config['SQLITE_READERS'], writer.url.database)
@@ -0,0 +1,106 @@
+from sqlalchemy import event, table, column
+from database import db, Bookmark, Tag, bookmark_tags
+
+# Tag facets for /api/bookmarks.
+# tag_counts holds the number of bookmarks per tag, kept current by triggers on
+# bookmark_tags (so every write path - ORM, bulk commits, merges - is covered),
+# which makes the unfiltered facet sidebar and GET /tags a read of a few rows.
+# Filtered facets are counted over the result set through the
+# (tag_id, bookmark_id) index.
+COUNTS_TABLE = "tag_counts"
+
+tag_counts = table(COUNTS_TABLE, column("tag_id"), column("count"))
+
+SCHEMA = [
+    f"""CREATE TABLE IF NOT EXISTS {COUNTS_TABLE} (
+        tag_id INTEGER PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    )""",
+    # bookmark_tags' primary key covers bookmark -> tags; this covers tag -> bookmarks
+    "CREATE INDEX IF NOT EXISTS ix_bookmark_tags_tag_id ON bookmark_tags (tag_id, bookmark_id)",
+    f"""CREATE TRIGGER IF NOT EXISTS tag_counts_ai AFTER INSERT ON bookmark_tags BEGIN
+        INSERT INTO {COUNTS_TABLE} (tag_id, count) VALUES (new.tag_id, 1)
+        ON CONFLICT (tag_id) DO UPDATE SET count = count + 1;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tag_counts_ad AFTER DELETE ON bookmark_tags BEGIN
+        UPDATE {COUNTS_TABLE} SET count = count - 1 WHERE tag_id = old.tag_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tags_counts_ad AFTER DELETE ON tags BEGIN
+        DELETE FROM {COUNTS_TABLE} WHERE tag_id = old.id;
+    END""",
+]
+
+
+def install(connection):
+    """Creates the counts table, index and triggers, backfilling counts on first install."""
+    existed = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (COUNTS_TABLE,)
+    ).first() is not None
+
+    for statement in SCHEMA:
+        connection.exec_driver_sql(statement)
+
+    if not existed:
+        rebuild(connection)
+
+
+def rebuild(connection):
+    """Recomputes tag_counts from bookmark_tags."""
+    connection.exec_driver_sql(f"DELETE FROM {COUNTS_TABLE}")
+    connection.exec_driver_sql(f"""
+        INSERT INTO {COUNTS_TABLE} (tag_id, count)
+        SELECT tag_id, count(*) FROM bookmark_tags GROUP BY tag_id
+    """)
+
+
+@event.listens_for(db.metadata, "after_create")
+def _after_create(target, connection, **kw):
+    install(connection)
+
+
+@event.listens_for(db.metadata, "before_drop")
+def _before_drop(target, connection, **kw):
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {COUNTS_TABLE}")
+
+
+def parse_tag_ids(value):
+    """'3,7' -> [3, 7]; raises ValueError on anything that isn't a list of ids."""
+    ids = [int(part) for part in (value or "").split(",") if part.strip()]
+    return sorted(set(ids))
+
+
+def apply_tags(query, tag_ids, match_all=True):
+    """
+    Restricts a query (ORM Query or Core select) to bookmarks carrying all
+    (or, with match_all=False, any) of `tag_ids`.
+    """
+    if not tag_ids:
+        return query
+    tagged = db.select(bookmark_tags.c.bookmark_id).where(bookmark_tags.c.tag_id.in_(tag_ids))
+    if match_all and len(tag_ids) > 1:
+        tagged = tagged.group_by(bookmark_tags.c.bookmark_id).having(
+            db.func.count() == len(tag_ids)
+        )
+    return query.filter(Bookmark.id.in_(tagged))
+
+
+def counts(bookmark_ids=None):
+    """
+    [{"id", "name", "count"}] per tag, most used first. `bookmark_ids` is a
+    select of the current result set; None means the whole library, which is
+    read straight from tag_counts.
+    """
+    if bookmark_ids is None:
+        stmt = (db.select(Tag.id, Tag.name, tag_counts.c.count)
+                .join(tag_counts, tag_counts.c.tag_id == Tag.id)
+                .where(tag_counts.c.count > 0))
+        order = tag_counts.c.count
+    else:
+        hits = db.func.count().label("count")
+        stmt = (db.select(Tag.id, Tag.name, hits)
+                .join(bookmark_tags, bookmark_tags.c.tag_id == Tag.id)
+                .where(bookmark_tags.c.bookmark_id.in_(bookmark_ids))
+                .group_by(Tag.id, Tag.name))
+        order = hits
+    rows = db.session.execute(stmt.order_by(order.desc(), Tag.name))
+    return [{"id": tag_id, "name": name, "count": count} for tag_id, name, count in rows]
@@ -0,0 +1,76 @@
+import re
+
+# URL canonicalization for matching and dedupe (Ref: docs/arch/sync_logic.md).
+# http/https and default ports are folded together, hosts lower-cased, trailing
+# slashes dropped and tracking query params removed (the rest sorted), so
+# variants of the same page share one normalized_url. Only http(s) URLs are
+# rewritten; anything else (place:, javascript:, file:...) is kept as-is.
+
+URL_RE = re.compile(r'([A-Za-z][A-Za-z0-9+.-]*)://([^/?#]*)([^?#]*)(?:\?([^#]*))?(?:#(.*))?', re.DOTALL)
+
+DEFAULT_PORTS = (":80", ":443")
+
+# Exact parameter names dropped from the query; any utm_* is dropped too
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "twclid",
+    "igshid", "mc_cid", "mc_eid", "_ga", "_gl", "_hsenc", "_hsmi", "mkt_tok",
+    "oly_anon_id", "oly_enc_id", "vero_id", "wickedid", "ref_src",
+})
+
+def _clean_query(query):
+    params = [
+        param for param in query.split("&")
+        if param and not _is_tracking(param.split("=", 1)[0])
+    ]
+    params.sort()
+    return "&".join(params)
+
+def _is_tracking(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith("utm_")
+
+def normalize_url(url):
+    """Canonical form of `url` used as its identity (None stays None)."""
+    if url is None:
+        return None
+    url = url.strip()
+    match = URL_RE.fullmatch(url)
+    if match is None:
+        return url
+    scheme, authority, path, query, fragment = match.groups()
+    scheme = scheme.lower()
+    if scheme != "https" and scheme != "http":
+        return url
+
+    authority = authority.lower().rstrip(".")
+    if authority.endswith(DEFAULT_PORTS):
+        authority = authority.rsplit(":", 1)[0].rstrip(".")
+    path = path.rstrip("/") or "/"
+
+    normalized = f"https://{authority}{path}"
+    if query:
+        query = _clean_query(query)
+        if query:
+            normalized = f"{normalized}?{query}"
+    if fragment:
+        normalized = f"{normalized}#{fragment}"
+    return normalized
+
+if __name__ == "__main__":
+    # Throughput check: python url_normalizer.py [count]   (default 1,000,000)
+    import sys
+    import time
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    shapes = [
+        "https://www.example{}.com/path/to/page/",
+        "http://Example{}.com:80/search?q=term&utm_source=news&utm_medium=email",
+        "https://docs.example{}.org/guide/intro.html#section-2",
+        "https://shop.example{}.net/item?id=42&ref_src=twsrc&color=blue&fbclid=abc",
+        "place:parent=toolbar____&id={}",
+    ]
+    urls = [shapes[i % len(shapes)].format(i) for i in range(count)]
+    start = time.perf_counter()
+    for url in urls:
+        normalize_url(url)
+    elapsed = time.perf_counter() - start
+    print(f"normalized {count:,} URLs in {elapsed:.2f}s ({count / elapsed:,.0f} URLs/s)")
@@ -7,6 +7,11 @@ if (Test-Path "venv\Scripts\Activate.ps1") {
     .\venv\Scripts\Activate.ps1
 }
 
-# Run the app from project root
+# Run the app from project root: production server (one process with a thread
+# pool on Windows), or the auto-reloading development server with -Dev
 Write-Host "🚀 Launching Bookmark Manager..." -ForegroundColor Cyan
-python prototype/api.py
+if ($args -contains "-Dev") {
+    python prototype/api.py
+} else {
+    python prototype/serve.py @args
+}
@@ -7,6 +7,11 @@ if [ -d "venv" ]; then
     source venv/bin/activate
 fi
 
-# Run the app from project root
+# Run the app from project root: preforked production server (WEB_WORKERS,
+# WEB_THREADS), or the auto-reloading development server with --dev
 echo "🚀 Launching Bookmark Manager..."
-python3 prototype/api.py
+if [ "$1" = "--dev" ]; then
+    python3 prototype/api.py
+else
+    python3 prototype/serve.py "$@"
+fi
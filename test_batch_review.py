@@ -0,0 +1,58 @@
+import pytest
+import sys
+import os
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db, SyncBatch, PendingChange
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        big, small = SyncBatch(source="firefox_manual"), SyncBatch(source="chrome_manual")
+        db.session.add_all([big, small, SyncBatch(source="old", status="committed")])
+        db.session.flush()
+        kinds = ["new", "update", "new", "mark_deleted", "new"]
+        db.session.add_all([
+            PendingChange(batch_id=big.id, change_type=kinds[i % 5], url=f"https://r{i}.example", title=f"R{i}")
+            for i in range(25)
+        ] + [PendingChange(batch_id=small.id, change_type="new", url="https://s.example")])
+        db.session.commit()
+
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def test_pending_batches_are_counted_per_type(client):
+    batches = client.get('/sync/batches').get_json()['batches']
+    assert [(b['source'], b['count']) for b in batches] == [("firefox_manual", 25), ("chrome_manual", 1)]
+    assert batches[0]['counts'] == {"new": 15, "update": 5, "mark_deleted": 5}
+
+def test_batch_details_are_paged_and_filterable(client):
+    batch_id = client.get('/sync/batches').get_json()['batches'][0]['id']
+
+    seen, cursor = [], ""
+    while True:
+        batch = client.get(f'/sync/batch/{batch_id}?limit=10&cursor={cursor}').get_json()['batch']
+        assert batch['total'] == 25 and len(batch['changes']) <= 10
+        seen += [c['id'] for c in batch['changes']]
+        if batch['next_cursor'] is None:
+            break
+        cursor = batch['next_cursor']
+    assert len(seen) == 25 and seen == sorted(seen)
+    assert batch['changes'][-1]['diff']['title'] == "R24"
+
+    updates = client.get(f'/sync/batch/{batch_id}?type=update&limit=3').get_json()['batch']
+    assert [c['type'] for c in updates['changes']] == ["update"] * 3 and updates['next_cursor']
+    rest = client.get(f'/sync/batch/{batch_id}?type=update&cursor={updates["next_cursor"]}').get_json()['batch']
+    assert len(rest['changes']) == 2 and rest['next_cursor'] is None
+
+    assert client.get(f'/sync/batch/{batch_id}?type=bogus').status_code == 400
+    assert client.get(f'/sync/batch/{batch_id}?cursor=x').status_code == 400
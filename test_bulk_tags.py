@@ -0,0 +1,67 @@
+import pytest
+import sys
+import os
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db, Bookmark, Tag
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        old = Tag(name="b-old")
+        db.session.add_all([
+            Bookmark(title="Alpha guide", url="https://alpha.example", folder_path="Proj", tags=[old]),
+            Bookmark(title="Beta guide", url="https://beta.example", folder_path="Proj > Sub", tags=[old]),
+            Bookmark(title="Gamma notes", url="https://gamma.example", folder_path="Other"),
+        ])
+        db.session.commit()
+
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def tags_of():
+    with app.app_context():
+        return {b.title: sorted(t.name for t in b.tags) for b in Bookmark.query.filter(Bookmark.url.like("%.example"))}
+
+def test_bulk_tag_by_ids_query_and_folder(client):
+    with app.app_context():
+        ids = {b.title: b.id for b in Bookmark.query.all()}
+        proj = Bookmark.query.filter_by(title="Alpha guide").one().folder_id
+
+    res = client.post('/bookmarks/tags', json={"ids": [ids["Alpha guide"], ids["Gamma notes"], 999999], "add": ["b-new"]})
+    assert res.get_json() == {"status": "success", "matched": 2, "added": 2, "removed": 0}
+
+    # Re-adding is a no-op; removal and addition in the same transaction
+    data = client.post('/bookmarks/tags', json={"q": "guide", "add": ["b-new"], "remove": ["b-old"]}).get_json()
+    assert (data['matched'], data['added'], data['removed']) == (2, 1, 2)
+    assert tags_of() == {"Alpha guide": ["b-new"], "Beta guide": ["b-new"], "Gamma notes": ["b-new"]}
+
+    data = client.post('/bookmarks/tags', json={"folder_id": proj, "remove": "b-new"}).get_json()
+    assert (data['matched'], data['removed']) == (1, 1)
+    data = client.post('/bookmarks/tags', json={"folder_id": proj, "recursive": True, "add": ["b-proj"]}).get_json()
+    assert (data['matched'], data['added']) == (2, 2)
+    assert tags_of()["Beta guide"] == ["b-new", "b-proj"]
+
+    # Bulk changes are visible to search and tag counts
+    found = client.get('/bookmarks?q=b-proj').get_json()['bookmarks']
+    assert sorted(b['title'] for b in found) == ["Alpha guide", "Beta guide"]
+    counts = {t['name']: t['count'] for t in client.get('/tags').get_json()['data']}
+    assert counts["b-proj"] == 2 and counts["b-old"] == 0
+
+def test_bulk_tag_validation(client):
+    assert client.post('/bookmarks/tags', json={"add": ["x"]}).status_code == 400
+    assert client.post('/bookmarks/tags', json={"ids": [1]}).status_code == 400
+    assert client.post('/bookmarks/tags', json={"ids": "1", "add": ["x"]}).status_code == 400
+    for selection in ({"tags": "1,2"}, {"tags": [{"a": 1}]}, {"folder_id": "3"}, {"q": ["x"]},
+                      {"tags": [1], "tag_mode": "some"}):
+        res = client.post('/bookmarks/tags', json={"add": ["x"], **selection})
+        assert res.status_code == 400 and res.get_json()["status"] == "error"
@@ -0,0 +1,73 @@
+import pytest
+import sys
+import os
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db, Bookmark, Tag
+import response_cache
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Bookmark(title="Cached", url="https://cached.example", tags=[Tag(name="c-one")]))
+        db.session.commit()
+
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def stats():
+    return response_cache.cache.stats()
+
+def test_hits_etags_and_invalidation(client):
+    before = stats()
+    first = client.get('/tags')
+    second = client.get('/tags')
+    assert first.data == second.data and first.headers['ETag'] == second.headers['ETag']
+    assert stats()['hits'] == before['hits'] + 1 and stats()['misses'] == before['misses'] + 1
+
+    # Unchanged: 304 without a body
+    res = client.get('/tags', headers={'If-None-Match': first.headers['ETag']})
+    assert res.status_code == 304 and res.data == b""
+    assert stats()['not_modified'] == before['not_modified'] + 1
+
+    # Params are part of the key
+    assert client.get('/api/bookmarks?q=cached').headers['ETag'] != client.get('/api/bookmarks').headers['ETag']
+
+    # Any committed write bumps the version: API paths and direct ORM writes alike
+    client.post('/tags', json={"name": "c-two"})
+    res = client.get('/tags', headers={'If-None-Match': first.headers['ETag']})
+    assert res.status_code == 200 and "c-two" in [t['name'] for t in res.get_json()['data']]
+
+    etag = client.get('/api/bookmarks').headers['ETag']
+    with app.app_context():
+        Bookmark.query.filter_by(url="https://cached.example").one().title = "Renamed"
+        db.session.commit()
+    res = client.get('/api/bookmarks', headers={'If-None-Match': etag})
+    assert res.status_code == 200 and res.headers['ETag'] != etag
+    assert "Renamed" in [b['title'] for b in res.get_json()['bookmarks']]
+
+def test_reads_and_rollbacks_keep_the_version(client):
+    version = client.get('/cache/stats').get_json()['version']
+    client.get('/api/bookmarks?q=cached')
+    client.get('/folders')
+    with app.app_context():
+        db.session.add(Tag(name="c-discarded"))
+        db.session.flush()
+        db.session.rollback()
+    assert client.get('/cache/stats').get_json()['version'] == version
+
+def test_errors_and_streams_are_not_cached(client):
+    before = stats()['entries']
+    assert client.get('/api/bookmarks?tags=abc').status_code == 400
+    res = client.get('/api/bookmarks?format=ndjson')
+    assert res.status_code == 200 and 'ETag' not in res.headers
+    assert stats()['entries'] == before
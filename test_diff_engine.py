@@ -0,0 +1,195 @@
+import pytest
+import sys
+import os
+import json
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db, Bookmark, PendingChange
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    
+    with app.app_context():
+        db.create_all()
+        # Existing chrome state: one unchanged, one renamed, one gone, plus a firefox row
+        db.session.add_all([
+            Bookmark(title="Same", url="https://same.com", folder_path="Bookmarks Toolbar", source_browser="Chrome JSON"),
+            Bookmark(title="Old Title", url="https://renamed.com", folder_path="Bookmarks Toolbar", source_browser="Chrome JSON"),
+            Bookmark(title="Gone", url="https://gone.com", folder_path="Bookmarks Toolbar", source_browser="Chrome JSON"),
+            Bookmark(title="Firefox Only", url="https://ff.com", folder_path="Bookmarks Menu", source_browser="Firefox"),
+        ])
+        db.session.commit()
+        
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def write_chrome_profile(tmp_path, children):
+    bookmarks = {"roots": {"bookmark_bar": {"name": "Bookmarks bar", "children": children}}}
+    (tmp_path / "Bookmarks").write_text(json.dumps(bookmarks))
+    return str(tmp_path)
+
+def test_chrome_sync_stages_set_based_diff(client, tmp_path):
+    profile = write_chrome_profile(tmp_path, [
+        {"type": "url", "name": "Same", "url": "https://same.com"},
+        {"type": "url", "name": "New Title", "url": "https://renamed.com"},
+        {"type": "url", "name": "Brand New", "url": "https://new.com"},
+        {"type": "url", "name": "Duplicate", "url": "https://new.com"},
+    ])
+    res = client.post('/sync_chrome', json={"path": profile})
+    data = json.loads(res.data)
+    assert data['status'] == 'success'
+    counts = data['counts']
+    assert (counts['new'], counts['updated'], counts['to_delete'], counts['total_changes']) == (1, 1, 1, 3)
+
+    with app.app_context():
+        changes = {c.change_type: c for c in PendingChange.query.filter_by(batch_id=data['batch_id'])}
+        # First occurrence of a duplicated URL wins
+        assert changes['new'].get_diff() == {"title": "Brand New", "url": "https://new.com",
+                                             "folder": "Bookmarks Toolbar", "source": "Chrome JSON"}
+        update = changes['update'].get_diff()
+        assert update['old'] == {"title": "Old Title", "folder": "Bookmarks Toolbar"}
+        assert update['new']['title'] == "New Title"
+        # Firefox rows are never considered for deletion by a chrome sync
+        assert changes['mark_deleted'].get_diff() == {"title": "Gone", "url": "https://gone.com"}
+
+    # Committing makes the next sync idempotent
+    client.post(f"/sync/commit/{data['batch_id']}", json={})
+    data = json.loads(client.post('/sync_chrome', json={"path": profile}).data)
+    assert data['counts']['total_changes'] == 0
+
+def test_large_chrome_files_are_parsed_before_taking_the_writer(client, tmp_path, monkeypatch):
+    import chrome_parser
+    import jobs
+    monkeypatch.setattr(chrome_parser, "STREAM_THRESHOLD", 0) # Every file takes the spooled path
+    offload = jobs.offload
+    open_transactions = []
+
+    def record(func, *args):
+        open_transactions.append(db.session().in_transaction())
+        return offload(func, *args)
+    monkeypatch.setattr(jobs, "offload", record)
+
+    profile = write_chrome_profile(tmp_path, [
+        {"type": "url", "name": "Same", "url": "https://same.com"},
+        {"type": "url", "name": "Brand New", "url": "https://new.com"},
+    ])
+    data = client.post('/sync_chrome', json={"path": profile}).get_json()
+    assert data['status'] == 'success' and open_transactions == [False]
+    assert (data['counts']['processed'], data['counts']['new'], data['counts']['to_delete']) == (2, 1, 2)
+    assert os.listdir(tmp_path) == ["Bookmarks"]
+
+def test_bulk_commit_applies_grouped_changes(client, tmp_path):
+    from api import BookmarkHistory
+    import batch_commit
+
+    profile = write_chrome_profile(tmp_path, [
+        {"type": "url", "name": "Same", "url": "https://same.com"},
+        {"type": "url", "name": "New Title", "url": "https://renamed.com"},
+    ] + [{"type": "url", "name": f"New {i}", "url": f"https://new{i}.com"} for i in range(7)])
+    batch_id = json.loads(client.post('/sync_chrome', json={"path": profile}).data)['batch_id']
+
+    with app.app_context():
+        # Partial commit: only the update and the deletion
+        ids = [c.id for c in PendingChange.query.filter(
+            PendingChange.batch_id == batch_id, PendingChange.change_type != 'new')]
+    res = client.post(f'/sync/commit/{batch_id}', json={"change_ids": ids})
+    data = json.loads(res.data)
+    assert (data['count'], data['remaining']) == (2, 7)
+
+    with app.app_context():
+        renamed = Bookmark.query.filter_by(url="https://renamed.com").one()
+        assert (renamed.title, renamed.version) == ("New Title", 2)
+        snapshot = BookmarkHistory.query.filter_by(bookmark_id=renamed.id).one()
+        assert (snapshot.title, snapshot.version) == ("Old Title", 1)
+        assert Bookmark.query.filter_by(url="https://gone.com").count() == 0
+
+        # Remaining inserts go through in chunks with progress reports
+        from api import SyncBatch
+        progress = []
+        count, remaining = batch_commit.commit_changes(
+            db.session.get(SyncBatch, batch_id), chunk_size=3,
+            progress=lambda done, total: progress.append((done, total)))
+        assert (count, remaining) == (7, 0)
+        assert progress == [(3, 7), (6, 7), (7, 7)]
+        new = Bookmark.query.filter_by(url="https://new0.com").one()
+        assert (new.title, new.source_browser, new.version, new.status) == ("New 0", "Chrome JSON", 1, "synced")
+
+def test_streaming_chrome_parser_matches_full_parse(tmp_path):
+    from chrome_parser import parse_chrome_bookmarks, stream_chrome_bookmarks
+
+    # Chrome writes keys alphabetically: 'children' comes before a folder's 'name'
+    bookmarks = {"checksum": "x", "roots": {
+        "bookmark_bar": {"children": [
+            {"children": [{"meta_info": {"k": [1, 2.5e3, True, None]}, "name": "A \"quoted\" \u00e9", "type": "url", "url": "https://a.com"}],
+             "name": "Folder A", "type": "folder"},
+            {"name": "Top", "type": "url", "url": "https://top.com"},
+        ], "name": "Bookmarks bar", "type": "folder"},
+        "other": {"children": [], "name": "Other", "type": "folder"},
+        "custom": {"children": [{"name": "C", "type": "url", "url": "https://c.com"}], "name": "Custom", "type": "folder"},
+    }, "version": 1}
+    path = tmp_path / "Bookmarks"
+    path.write_text(json.dumps(bookmarks, indent=3))
+
+    full = parse_chrome_bookmarks(str(path))
+    metadata = {}
+    assert list(stream_chrome_bookmarks(str(path), metadata)) == full['bookmarks']
+    assert metadata == full['metadata'] == {"source_total": 3, "processed": 3}
+    assert full['bookmarks'][0]['title'] == 'A "quoted" \u00e9'
+    assert full['bookmarks'][0]['folder'] == "Bookmarks Toolbar > Folder A"
+
+    # Nesting deeper than json.load's recursion limit still streams
+    depth = 5000
+    deep = ('{"children": [' * depth
+            + '{"name": "Deep", "type": "url", "url": "https://deep.com"}'
+            + ''.join(f'], "name": "D{i}", "type": "folder"}}' for i in range(depth)))
+    path.write_text('{"roots": {"other": ' + '{"children": [' + deep + '], "name": "Other", "type": "folder"}}}')
+    streamed = list(stream_chrome_bookmarks(str(path)))
+    assert len(streamed) == 1
+    assert streamed[0]['folder'].startswith("Other Bookmarks > D4999 > D4998")
+    assert streamed[0]['folder'].endswith("D1 > D0")
+
+def test_migration_converts_json_diffs(tmp_path):
+    import sqlite3
+    import migrations
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE pending_changes (id INTEGER PRIMARY KEY, batch_id INTEGER, bookmark_id INTEGER, "
+                 "change_type VARCHAR, diff_blob VARCHAR)")
+    old = [
+        ("new", {"title": "N", "url": "https://n.com", "folder": "F", "source": "Firefox"}),
+        ("update", {"old": {"title": "Was", "folder": "F"},
+                    "new": {"title": "Is", "url": "https://u.com", "folder": "F", "source": "Firefox"}}),
+        ("mark_deleted", {"title": "D", "url": "https://d.com"}),
+        ("merge", {"kind": "near", "similarity": 0.8, "into": 7, "survivor": {"url": "https://s.com"},
+                   "url": "https://m.com", "title": "M", "folder": "F"}),
+    ]
+    conn.executemany("INSERT INTO pending_changes (batch_id, change_type, diff_blob) VALUES (1, ?, ?)",
+                     [(kind, json.dumps(diff)) for kind, diff in old])
+    conn.commit()
+    conn.close()
+
+    engine = db.create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+        migrations.upgrade(connection) # Idempotent
+        rows = connection.exec_driver_sql(
+            "SELECT change_type, title, url, folder, source, changed, target_id, similarity FROM pending_changes ORDER BY id"
+        ).all()
+        columns = migrations._columns(connection, "pending_changes")
+    engine.dispose()
+
+    assert "diff_blob" not in columns
+    # Only what differs from the bookmark is kept
+    assert [tuple(row) for row in rows] == [
+        ("new", "N", "https://n.com", "F", "Firefox", None, None, None),
+        ("update", "Is", None, None, None, 1, None, None),
+        ("mark_deleted", None, None, None, None, None, None, None),
+        ("merge", None, None, None, None, None, 7, 0.8),
+    ]
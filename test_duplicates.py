@@ -0,0 +1,123 @@
+import pytest
+import sys
+import os
+import time
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db, Bookmark, Tag
+from duplicates import find_duplicates
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        tag = Tag(name="dup-test")
+        db.session.add_all([
+            Bookmark(title="Python Docs", url="https://docs.python.org/3/", source_browser="Firefox"),
+            Bookmark(title="Python documentation", url="http://docs.python.org/3", source_browser="Firefox", tags=[tag]),
+            Bookmark(title="Rust Book chapter four ownership", url="https://doc.rust-lang.org/book/ch04", source_browser="Firefox"),
+            Bookmark(title="Rust Book chapter four ownership", url="https://www.doc.rust-lang.org/book/ch04?lang=en", source_browser="Firefox"),
+            Bookmark(title="Python Docs", url="https://docs.python.org/3", source_browser="Chrome JSON"),
+            Bookmark(title="Unrelated", url="https://docs.python.org/2/library", source_browser="Firefox"),
+        ])
+        db.session.commit()
+
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def test_find_duplicates_exact_near_and_scope():
+    rows = [
+        (1, "https://a.com/x", "A", "Firefox"),
+        (2, "https://a.com/x", "A copy", "Firefox"),
+        (3, "https://a.com/x", "A", "Chrome JSON"),
+        (4, "https://www.b.com/guide/intro", "Getting started guide", "Upload: one.html"),
+        (5, "https://b.com/guide/intro?print", "Getting started guide", "Upload: two.json"),
+        (6, "https://b.com/other", "Something else entirely", "Upload: one.html"),
+    ]
+    groups = find_duplicates(rows)
+    assert groups == [
+        {"survivor": 1, "duplicates": [(2, "exact", 1.0)]},
+        {"survivor": 4, "duplicates": [(5, "near", 0.8)]},
+    ]
+
+    assert find_duplicates(rows, near=False) == groups[:1]
+    assert find_duplicates(rows, cross_source=True)[0]["duplicates"] == [(2, "exact", 1.0), (3, "exact", 1.0)]
+
+def test_lsh_path_for_large_sites(monkeypatch):
+    import duplicates
+    monkeypatch.setattr(duplicates, 'DIRECT_COMPARE', 2)
+    rows = [(i, f"https://big.com/page{i}", f"Topic {i} words here", "Firefox") for i in range(1, 50)]
+    rows.append((50, "https://big.com/page7?tab=1", "Topic 7 words here", "Firefox"))
+    assert find_duplicates(rows) == [{"survivor": 7, "duplicates": [(50, "near", 0.8)]}]
+
+def test_near_groups_are_not_transitive():
+    # 2 is near 1 and 3 is near 2, but 3 is not near 1: it must not be merged into 1
+    rows = [
+        (1, "https://c.com/x", "alpha beta gamma delta epsilon", "Firefox"),
+        (2, "https://c.com/y", "beta gamma delta epsilon zeta", "Firefox"),
+        (3, "https://c.com/z", "gamma delta epsilon zeta eta", "Firefox"),
+    ]
+    assert find_duplicates(rows, threshold=0.6) == [{"survivor": 1, "duplicates": [(2, "near", 0.667)]}]
+
+    # An exact copy of 2 under a title unlike 1's goes along with 2: it is never lost
+    rows.append((4, "https://c.com/y", "zeta eta theta", "Firefox"))
+    assert find_duplicates(rows, threshold=0.6) == [{"survivor": 1, "duplicates": [(2, "near", 0.667), (4, "near", 0.667)]}]
+    assert find_duplicates(rows, near=False) == [{"survivor": 2, "duplicates": [(4, "exact", 1.0)]}]
+
+def get_report(client, query="", timeout=10):
+    """GET /duplicates, polling its job until the report is ready."""
+    deadline = time.time() + timeout
+    while True:
+        res = client.get(f'/duplicates{query}')
+        if res.status_code == 200 or time.time() > deadline:
+            return res
+        assert res.status_code == 202 and res.get_json()["job_id"]
+        time.sleep(0.05)
+
+def test_report_runs_as_a_job_per_library_version(client):
+    first = client.get('/duplicates?near=0')
+    assert first.status_code == 202
+    job_id = first.get_json()["job_id"]
+    assert get_report(client, '?near=0').get_json()["summary"]["exact"] == 1
+    assert client.get('/duplicates?near=0').status_code == 200 # Served from the finished job
+
+    # A write bumps the library version: the next GET starts a fresh scan
+    with app.app_context():
+        db.session.add(Bookmark(title="Python Docs", url="https://Docs.Python.org/3/", source_browser="Firefox"))
+        db.session.commit()
+    res = client.get('/duplicates?near=0')
+    assert res.status_code == 202 and res.get_json()["job_id"] != job_id
+    assert get_report(client, '?near=0').get_json()["summary"]["exact"] == 2
+
+def test_stage_and_commit_merge_batch(client):
+    with app.app_context():
+        ids = {(b.url, b.source_browser): b.id for b in Bookmark.query.all()}
+    keep = ids[("https://docs.python.org/3/", "Firefox")]
+    dup = ids[("http://docs.python.org/3", "Firefox")]
+    rust = ids[("https://www.doc.rust-lang.org/book/ch04?lang=en", "Firefox")]
+
+    data = get_report(client).get_json()
+    groups = {g["survivor"]: g["duplicates"] for g in data["groups"]}
+    assert groups[keep] == [[dup, "exact", 1.0]]
+    assert [d[:2] for d in groups[ids[("https://doc.rust-lang.org/book/ch04", "Firefox")]]] == [[rust, "near"]]
+
+    staged = client.post('/duplicates/batch', json={}).get_json()
+    batch = client.get(f"/sync/batch/{staged['batch_id']}").get_json()['batch']
+    merges = {c['diff']['into']: c for c in batch['changes'] if c['type'] == 'merge'}
+    assert merges[keep]['diff']['kind'] == 'exact'
+    assert merges[keep]['diff']['url'] == "http://docs.python.org/3"
+
+    client.post(f"/sync/commit/{staged['batch_id']}", json={})
+    with app.app_context():
+        assert db.session.get(Bookmark, dup) is None and db.session.get(Bookmark, rust) is None
+        assert [t.name for t in db.session.get(Bookmark, keep).tags] == ["dup-test"]
+        # Chrome's copy is left alone: a Chrome sync would re-add it
+        assert Bookmark.query.filter_by(source_browser="Chrome JSON").count() == 1
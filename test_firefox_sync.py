@@ -0,0 +1,217 @@
+import pytest
+import sys
+import os
+import json
+import sqlite3
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db, Bookmark, SyncState
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    
+    with app.app_context():
+        db.create_all()
+        
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+class Places:
+    """Minimal places.sqlite with the columns the reader uses."""
+
+    def __init__(self, profile_dir):
+        self.path = os.path.join(profile_dir, "places.sqlite")
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript("""
+            CREATE TABLE moz_places (id INTEGER PRIMARY KEY, url TEXT);
+            CREATE TABLE moz_bookmarks (id INTEGER PRIMARY KEY, type INTEGER, fk INTEGER,
+                parent INTEGER, title TEXT, lastModified INTEGER, guid TEXT);
+            CREATE TABLE moz_bookmarks_deleted (guid TEXT PRIMARY KEY, dateRemoved INTEGER);
+            INSERT INTO moz_bookmarks VALUES (1, 2, NULL, 0, '', 1, 'root________');
+            INSERT INTO moz_bookmarks VALUES (2, 2, NULL, 1, 'menu', 1, 'menu________');
+            INSERT INTO moz_bookmarks VALUES (3, 2, NULL, 1, 'toolbar', 1, 'toolbar_____');
+            INSERT INTO moz_bookmarks VALUES (4, 2, NULL, 1, 'tags', 1, 'tags________');
+            INSERT INTO moz_bookmarks VALUES (5, 2, NULL, 1, 'unfiled', 1, 'unfiled_____');
+        """)
+        self.clock = 100
+
+    def tick(self):
+        self.clock += 1
+        return self.clock
+
+    def add_folder(self, parent, title):
+        cur = self.conn.execute("INSERT INTO moz_bookmarks (type, parent, title, lastModified) VALUES (2, ?, ?, ?)",
+                                (parent, title, self.tick()))
+        self.touch(parent)
+        return cur.lastrowid
+
+    def add_bookmark(self, parent, title, url):
+        fk = self.conn.execute("INSERT INTO moz_places (url) VALUES (?)", (url,)).lastrowid
+        cur = self.conn.execute("INSERT INTO moz_bookmarks (type, fk, parent, title, lastModified) VALUES (1, ?, ?, ?, ?)",
+                                (fk, parent, title, self.tick()))
+        self.touch(parent)
+        return cur.lastrowid
+
+    def update(self, item_id, **fields):
+        for column, value in fields.items():
+            self.conn.execute(f"UPDATE moz_bookmarks SET {column} = ? WHERE id = ?", (value, item_id))
+        self.touch(item_id)
+
+    def remove(self, item_id):
+        parent = self.conn.execute("SELECT parent FROM moz_bookmarks WHERE id = ?", (item_id,)).fetchone()[0]
+        self.conn.execute("DELETE FROM moz_bookmarks WHERE id = ?", (item_id,))
+        self.touch(parent)
+
+    def touch(self, item_id):
+        self.conn.execute("UPDATE moz_bookmarks SET lastModified = ? WHERE id = ?", (self.tick(), item_id))
+        self.conn.commit()
+
+def sync(client, profile, incremental=True):
+    data = json.loads(client.post('/sync_firefox', json={"path": profile, "incremental": incremental}).data)
+    assert data['status'] == 'success', data
+    return data
+
+def test_incremental_firefox_sync(client, tmp_path):
+    places = Places(str(tmp_path))
+    work = places.add_folder(3, "Work")
+    places.add_bookmark(work, "Docs", "https://docs.example.com")
+    stale = places.add_bookmark(2, "Stale", "https://stale.example.com")
+    places.add_bookmark(2, "Keep", "https://keep.example.com")
+
+    # No mark yet: falls back to a full read
+    data = sync(client, str(tmp_path))
+    assert data['counts']['mode'] == 'full'
+    assert data['counts']['new'] == 3
+    client.post(f"/sync/commit/{data['batch_id']}", json={})
+
+    # Nothing changed: incremental read is empty and the mark advances on its own
+    data = sync(client, str(tmp_path))
+    assert data['counts']['mode'] == 'incremental'
+    assert (data['counts']['processed'], data['counts']['total_changes']) == (0, 0)
+
+    # Folder rename re-emits its subtree, deletion bumps the parent folder
+    places.update(work, title="Office")
+    places.remove(stale)
+    places.add_bookmark(2, "Fresh", "https://fresh.example.com")
+    data = sync(client, str(tmp_path))
+    counts = data['counts']
+    assert counts['mode'] == 'incremental'
+    assert (counts['new'], counts['updated'], counts['to_delete']) == (1, 1, 1)
+    client.post(f"/sync/commit/{data['batch_id']}", json={})
+
+    with app.app_context():
+        docs = Bookmark.query.filter_by(url="https://docs.example.com").one()
+        assert docs.folder_path == "Bookmarks Toolbar > Office"
+        assert Bookmark.query.filter_by(url="https://stale.example.com").count() == 0
+        state = SyncState.query.one()
+        assert state.high_water_mark == places.clock
+        assert state.pending_batch_id is None
+
+def test_incremental_sync_after_url_edit(client, tmp_path):
+    places = Places(str(tmp_path))
+    item = places.add_bookmark(2, "Moved page", "https://old.example.com")
+    data = sync(client, str(tmp_path))
+    client.post(f"/sync/commit/{data['batch_id']}", json={})
+
+    # Editing the URL points the item at another place; its folder is untouched
+    fk = places.conn.execute("INSERT INTO moz_places (url) VALUES ('https://new.example.com')").lastrowid
+    places.update(item, fk=fk)
+    data = sync(client, str(tmp_path))
+    counts = data['counts']
+    assert counts['mode'] == 'incremental'
+    assert (counts['new'], counts['to_delete']) == (1, 1)
+    client.post(f"/sync/commit/{data['batch_id']}", json={})
+
+    with app.app_context():
+        assert [b.url for b in Bookmark.query.all()] == ["https://new.example.com"]
+
+def test_profile_is_read_without_holding_the_writer(client, tmp_path, monkeypatch):
+    import jobs
+    places = Places(str(tmp_path))
+    places.add_bookmark(2, "One", "https://one.example.com")
+    client.post(f"/sync/commit/{sync(client, str(tmp_path))['batch_id']}", json={})
+
+    offload = jobs.offload
+    open_transactions = []
+
+    def record(func, *args):
+        open_transactions.append(db.session().in_transaction())
+        return offload(func, *args)
+    monkeypatch.setattr(jobs, "offload", record)
+
+    places.add_bookmark(2, "Two", "https://two.example.com")
+    data = sync(client, str(tmp_path))
+    assert data['counts']['mode'] == "incremental" and data['counts']['new'] == 1
+    assert open_transactions == [False] # The SyncState lookup was closed before the read
+
+def test_rejected_batch_keeps_mark(client, tmp_path):
+    places = Places(str(tmp_path))
+    places.add_bookmark(2, "One", "https://one.example.com")
+    client.post(f"/sync/commit/{sync(client, str(tmp_path))['batch_id']}", json={})
+
+    places.add_bookmark(2, "Two", "https://two.example.com")
+    client.post(f"/sync/reject/{sync(client, str(tmp_path))['batch_id']}")
+
+    # The rejected change is read again by the next incremental sync
+    assert sync(client, str(tmp_path))['counts']['new'] == 1
+
+def test_nested_folder_paths(tmp_path):
+    from firefox_reader import get_firefox_bookmarks
+
+    places = Places(str(tmp_path))
+    parent = 3
+    for depth in range(4):
+        parent = places.add_folder(parent, f"Level {depth}")
+    for i in range(3):
+        places.add_bookmark(parent, f"Deep {i}", f"https://deep{i}.example.com")
+    untitled = places.add_folder(2, "")
+    places.add_bookmark(untitled, None, "https://untitled.example.com")
+
+    result = get_firefox_bookmarks(places.path)
+    folders = {bm['url']: bm['folder'] for bm in result['bookmarks']}
+    assert folders["https://deep2.example.com"] == "Bookmarks Toolbar > Level 0 > Level 1 > Level 2 > Level 3"
+    # Untitled folders are skipped in the path
+    assert folders["https://untitled.example.com"] == "Bookmarks Menu"
+    assert result['bookmarks'][-1]['title'] == "No Title"
+
+def test_reader_tolerates_locked_profile(tmp_path, monkeypatch):
+    import firefox_reader
+    from firefox_reader import get_firefox_bookmarks
+    monkeypatch.setattr(firefox_reader, "LOCK_TIMEOUT", 0)
+
+    places = Places(str(tmp_path))
+    places.add_bookmark(2, "Saved", "https://saved.example.com")
+
+    # Unlocked: read in place, no copy
+    assert get_firefox_bookmarks(places.path)['metadata']['read_mode'] == 'live'
+
+    # Exclusive lock, nothing pending in a WAL: read the file as immutable
+    places.conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+    places.conn.execute("BEGIN EXCLUSIVE")
+    result = get_firefox_bookmarks(places.path)
+    assert result['metadata']['read_mode'] == 'immutable'
+    assert result['metadata']['processed'] == 1
+    places.conn.rollback()
+    places.conn.close()
+
+    # Exclusive WAL connection with uncheckpointed frames: copy db + WAL
+    writer = sqlite3.connect(places.path)
+    writer.execute("PRAGMA journal_mode=WAL")
+    writer.execute("PRAGMA wal_autocheckpoint=0")
+    writer.execute("PRAGMA locking_mode=EXCLUSIVE")
+    writer.execute("INSERT INTO moz_places (id, url) VALUES (99, 'https://wal.example.com')")
+    writer.execute("INSERT INTO moz_bookmarks (type, fk, parent, title, lastModified) VALUES (1, 99, 2, 'In WAL', 500)")
+    writer.commit()
+    try:
+        result = get_firefox_bookmarks(places.path)
+        assert result['metadata']['read_mode'] == 'copy'
+        assert "https://wal.example.com" in [bm['url'] for bm in result['bookmarks']]
+    finally:
+        writer.close()
@@ -0,0 +1,127 @@
+import pytest
+import sys
+import os
+import json
+import sqlite3
+from io import BytesIO
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db, Bookmark, Folder
+import folders
+import migrations
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Bookmark(title="Docs", url="https://docs.example", folder_path="Work > Dev", source_browser="Chrome JSON"),
+            Bookmark(title="Mail", url="https://mail.example", folder_path="Work", source_browser="Chrome JSON"),
+        ])
+        db.session.commit()
+
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def tree_counts(client):
+    """{path: (count, total)} over the whole tree."""
+    counts = {}
+    def walk(nodes, prefix):
+        for node in nodes:
+            path = prefix + node['name']
+            counts[path] = (node['count'], node['total'])
+            walk(node['children'], path + " > ")
+    walk(client.get('/folders').get_json()['folders'], "")
+    return counts
+
+def test_orm_writes_maintain_tree_and_counts(client):
+    data = client.get('/folders').get_json()
+    work = next(f for f in data['folders'] if f['name'] == "Work")
+    assert (work['count'], work['total']) == (1, 2)
+    assert [(c['name'], c['count'], c['total']) for c in work['children']] == [("Dev", 1, 1)]
+
+    with app.app_context():
+        bookmark = Bookmark.query.filter_by(url="https://docs.example").one()
+        bookmark.folder_path = "Work > Ops"
+        db.session.commit()
+    counts = tree_counts(client)
+    assert counts["Work > Ops"] == (1, 1) and counts["Work > Dev"] == (0, 0) and counts["Work"] == (1, 2)
+
+    with app.app_context():
+        db.session.delete(Bookmark.query.filter_by(url="https://docs.example").one())
+        db.session.commit()
+    assert tree_counts(client)["Work"] == (1, 1)
+
+def test_batch_commit_and_upload_update_counts(client, tmp_path):
+    bookmarks = {"roots": {"bookmark_bar": {"name": "Bookmarks bar", "children": [
+        {"type": "url", "name": "Docs", "url": "https://docs.example"},
+        {"type": "folder", "name": "Work", "children": [
+            {"type": "url", "name": "New", "url": "https://new.example"},
+        ]},
+    ]}}}
+    (tmp_path / "Bookmarks").write_text(json.dumps(bookmarks))
+    batch_id = client.post('/sync_chrome', json={"path": str(tmp_path)}).get_json()['batch_id']
+    client.post(f"/sync/commit/{batch_id}", json={})
+
+    # Docs moved to the toolbar, Mail was deleted, New landed in Toolbar > Work
+    counts = tree_counts(client)
+    assert counts["Bookmarks Toolbar"] == (1, 2) and counts["Bookmarks Toolbar > Work"] == (1, 1)
+    assert counts["Work"] == (0, 0) and counts["Work > Dev"] == (0, 0)
+    with app.app_context():
+        new = Bookmark.query.filter_by(url="https://new.example").one()
+        assert folders.paths([new.folder_id]) == {new.folder_id: "Bookmarks Toolbar > Work"}
+
+    html = '<DL><p><DT><H3>Reading</H3><DL><p><DT><A HREF="https://a.example">A</A><DT><A HREF="https://b.example">B</A></DL><p></DL>'
+    client.post('/upload_bulk', data={"file": (BytesIO(html.encode()), 'x.html')}, content_type='multipart/form-data')
+    assert tree_counts(client)["Reading"] == (2, 2)
+
+def test_rename_and_move_touch_only_folders(client):
+    with app.app_context():
+        dev = Folder.query.filter_by(source_path="Work > Dev").one().id
+        work = Folder.query.filter_by(source_path="Work").one().id
+
+    res = client.patch(f'/folders/{dev}', json={"name": "Engineering", "parent_id": None})
+    assert res.get_json()['folder'] == {"id": dev, "parent_id": None, "name": "Engineering", "count": 1, "total": 1}
+    assert tree_counts(client)["Work"] == (1, 1)
+
+    found = client.get(f'/api/bookmarks?folder_id={dev}').get_json()
+    assert found['total'] == 1 and found['bookmarks'][0]['folder'] == "Engineering"
+    with app.app_context():
+        # The synced path is untouched, and later syncs of it land in the renamed folder
+        assert Bookmark.query.filter_by(url="https://docs.example").one().folder_path == "Work > Dev"
+        assert folders.ensure_paths(db.session.connection(), ["Work > Dev"])["Work > Dev"] == dev
+
+    assert client.patch(f'/folders/{work}', json={"parent_id": dev}).status_code == 200
+    assert tree_counts(client)["Engineering > Work"] == (1, 1)
+    assert tree_counts(client)["Engineering"] == (1, 2)
+    assert client.patch(f'/folders/{dev}', json={"parent_id": work}).status_code == 400
+    assert client.patch(f'/folders/{dev}', json={"parent_id": 999999}).status_code == 404
+
+def test_migration_files_existing_bookmarks(tmp_path):
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE bookmarks (id INTEGER PRIMARY KEY, url VARCHAR NOT NULL, title VARCHAR, folder_path VARCHAR)")
+    conn.executemany("INSERT INTO bookmarks (url, folder_path) VALUES (?, ?)",
+                     [("https://a.com", "A > B"), ("https://b.com", "A"), ("https://c.com", "")])
+    conn.commit()
+    conn.close()
+
+    engine = db.create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        Folder.__table__.create(connection)
+        migrations.upgrade(connection)
+        rows = connection.exec_driver_sql(
+            "SELECT b.url, f.name, f.bookmark_count, f.total_count FROM bookmarks b "
+            "LEFT JOIN folders f ON f.id = b.folder_id ORDER BY b.id"
+        ).all()
+    engine.dispose()
+
+    assert rows == [("https://a.com", "B", 1, 1), ("https://b.com", "A", 1, 2), ("https://c.com", None, None, None)]
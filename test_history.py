@@ -0,0 +1,150 @@
+import pytest
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db, Bookmark, BookmarkHistory, SyncBatch, PendingChange
+import batch_commit
+import history
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Bookmark(title="T0", url="https://h.example/0", folder_path="F0", source_browser="Firefox"))
+        db.session.commit()
+
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def edit(bookmark, **changes):
+    new = dict(history.fields(bookmark), **changes)
+    history.record(db.session.connection(), bookmark.id, bookmark.version, history.fields(bookmark), new)
+    for name, value in changes.items():
+        setattr(bookmark, name, value)
+    bookmark.version += 1
+
+def make_versions(count):
+    """Edits the bookmark `count` times; returns {version: state}."""
+    bookmark = Bookmark.query.one()
+    states = {}
+    for i in range(1, count + 1):
+        states[bookmark.version] = history.fields(bookmark)
+        edit(bookmark, **({"title": f"T{i}"} if i % 3 else {"folder_path": f"F{i}"}))
+    db.session.commit()
+    return bookmark.id, states
+
+def test_versions_are_deltas_with_keyframes(client):
+    with app.app_context():
+        bookmark_id, states = make_versions(24)
+        rows = BookmarkHistory.query.order_by(BookmarkHistory.version).all()
+        assert [r.version for r in rows if r.changed == history.FULL] == [10, 20]
+        # Deltas only hold the one field that changed
+        assert rows[0].changed == history.TITLE and (rows[0].title, rows[0].url) == ("T0", None)
+        assert all(history.rebuild(r.id)[1] == states[r.version] for r in rows)
+
+    listed = client.get(f'/bookmarks/{bookmark_id}/history').get_json()['history']
+    assert [h['version'] for h in listed] == list(range(24, 0, -1))
+    assert all((h['title'], h['folder'], h['url']) == tuple(states[h['version']][k] for k in ('title', 'folder_path', 'url'))
+               for h in listed)
+
+    target = listed[-3]
+    assert client.post(f'/bookmarks/{bookmark_id}/revert/{target["id"]}').status_code == 200
+    current = client.get(f'/bookmarks/{bookmark_id}/history').get_json()
+    assert (current['current']['title'], current['current']['folder']) == (target['title'], target['folder'])
+    assert current['history'][0]['event'] == "revert" and current['history'][0]['title'] == "T23"
+
+def test_deleted_bookmarks_leave_tombstones(client):
+    with app.app_context():
+        bookmark_id, states = make_versions(3)
+        batch = SyncBatch(source="firefox_manual")
+        db.session.add(batch)
+        db.session.flush()
+        db.session.add(PendingChange(batch_id=batch.id, bookmark_id=bookmark_id, change_type="mark_deleted"))
+        db.session.commit()
+        batch_commit.commit_changes(batch)
+
+        orm = Bookmark(title="ORM", url="https://h.example/orm")
+        db.session.add(orm)
+        db.session.commit()
+        db.session.delete(orm)
+        db.session.commit()
+
+    feed = client.get('/api/history').get_json()['history']
+    assert [(h['event'], h['title']) for h in feed[:2]] == [("deleted", "ORM"), ("deleted", "T2")]
+    assert [(h['version'], h['title']) for h in feed[2:]] == [(3, "T2"), (2, "T1"), (1, "T0")]
+    assert client.get('/api/history?limit=1').get_json()['history'][0]['title'] == "ORM"
+
+def test_compaction_reencodes_and_prunes(client):
+    with app.app_context():
+        bookmark_id, states = make_versions(12)
+        # Snapshots written before deltas existed are stored in full
+        db.session.execute(history.history.delete())
+        db.session.execute(history.history.insert(), [
+            dict(bookmark_id=bookmark_id, version=v, changed=history.FULL, event="update", **state)
+            for v, state in states.items()
+        ])
+        db.session.commit()
+
+        assert history.compact() == {"pruned": 0, "reencoded": 11}
+        rows = BookmarkHistory.query.order_by(BookmarkHistory.version).all()
+        assert [r.version for r in rows if r.changed == history.FULL] == [10]
+        assert all(history.rebuild(r.id)[1] == states[r.version] for r in rows)
+
+        assert history.compact(keep_versions=5)["pruned"] == 7
+        assert [r.version for r in BookmarkHistory.query.order_by(BookmarkHistory.version)] == [8, 9, 10, 11, 12]
+
+        db.session.delete(Bookmark.query.one())
+        db.session.commit()
+        old = datetime.utcnow() - timedelta(days=10)
+        BookmarkHistory.query.filter_by(event="deleted").one().created_at = old
+        db.session.commit()
+        assert history.compact(tombstone_days=30)["pruned"] == 0
+        assert history.compact(tombstone_days=5)["pruned"] == 6
+        assert BookmarkHistory.query.count() == 0
+
+def test_compaction_job(client):
+    assert client.post('/jobs', json={"type": "history_compact", "keep_days": -1}).status_code == 400
+    job_id = client.post('/jobs', json={"type": "history_compact", "keep_versions": 2}).get_json()['job_id']
+    deadline = time.time() + 10
+    while (job := client.get(f'/jobs/{job_id}').get_json()['job'])['status'] not in ('succeeded', 'failed'):
+        assert time.time() < deadline
+        time.sleep(0.05)
+    assert job['status'] == "succeeded" and job['result'] == {"pruned": 0, "reencoded": 0}
+
+def test_migration_rebuilds_history_as_keyframes(tmp_path):
+    import sqlite3
+    import migrations
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE bookmarks (id INTEGER PRIMARY KEY, url VARCHAR NOT NULL)")
+    conn.execute("CREATE TABLE bookmark_history (id INTEGER PRIMARY KEY, bookmark_id INTEGER NOT NULL REFERENCES bookmarks(id), "
+                 "version INTEGER NOT NULL, url VARCHAR NOT NULL, title VARCHAR, folder_path VARCHAR, created_at DATETIME)")
+    conn.execute("INSERT INTO bookmark_history VALUES (5, 1, 1, 'https://o.com', 'Old', 'F', '2024-01-01 00:00:00')")
+    conn.commit()
+    conn.close()
+
+    engine = db.create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+        migrations.upgrade(connection) # Idempotent
+        rows = connection.exec_driver_sql(
+            "SELECT id, changed, url, title, folder_path, event FROM bookmark_history"
+        ).all()
+        url_required = [c[3] for c in connection.exec_driver_sql("PRAGMA table_info(bookmark_history)") if c[1] == "url"]
+        indexes = {row[1] for row in connection.exec_driver_sql("PRAGMA index_list(bookmark_history)")}
+    engine.dispose()
+
+    assert [tuple(row) for row in rows] == [(5, history.FULL, "https://o.com", "Old", "F", "update")]
+    assert url_required == [0]
+    assert {"ix_bookmark_history_bookmark_version", "ix_bookmark_history_created_at"} <= indexes
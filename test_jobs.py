@@ -0,0 +1,109 @@
+import pytest
+import sys
+import os
+import json
+import time
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from flask import Flask
+from api import app, db, Bookmark
+import jobs
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    
+    with app.app_context():
+        db.create_all()
+        
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def wait_for(client, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = json.loads(client.get(f'/jobs/{job_id}').data)['job']
+        if job['status'] in ('succeeded', 'failed', 'cancelled'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+def test_sync_and_commit_jobs(client, tmp_path):
+    children = [{"type": "url", "name": f"Link {i}", "url": f"https://{i}.com"} for i in range(5)]
+    (tmp_path / "Bookmarks").write_text(json.dumps({"roots": {"bookmark_bar": {"children": children}}}))
+
+    # Enqueue returns immediately with a job id
+    res = client.post('/jobs', json={"type": "sync_chrome", "path": str(tmp_path)})
+    assert res.status_code == 202
+    job = wait_for(client, json.loads(res.data)['job_id'])
+    assert job['status'] == 'succeeded'
+    assert job['result']['counts']['new'] == 5
+
+    res = client.post('/jobs', json={"type": "commit", "batch_id": job['result']['batch_id']})
+    job = wait_for(client, json.loads(res.data)['job_id'])
+    assert job['status'] == 'succeeded'
+    assert job['result'] == {"count": 5, "remaining": 0}
+    assert job['progress'] == {"done": 5, "total": 5}
+
+    with app.app_context():
+        assert Bookmark.query.count() == 5
+
+def test_job_errors_and_cancel(client, tmp_path):
+    res = client.post('/jobs', json={"type": "sync_chrome", "path": str(tmp_path / "missing")})
+    job = wait_for(client, json.loads(res.data)['job_id'])
+    assert job['status'] == 'failed'
+    assert "not found" in job['error']
+
+    assert client.post('/jobs', json={"type": "bogus"}).status_code == 400
+    assert client.get('/jobs/nope').status_code == 404
+
+    # A job that hits a checkpoint after cancel stops as 'cancelled'
+    release = jobs.threading.Event()
+    def slow(steps):
+        for i in range(steps):
+            release.wait(5)
+            jobs.report("work", i, steps)
+        return "done"
+    jobs.manager.register('slow', slow)
+    job = jobs.manager.submit('slow', {"steps": 3})
+    client.post(f'/jobs/{job.id}/cancel')
+    release.set()
+    assert wait_for(client, job.id)['status'] == 'cancelled'
+
+def test_job_state_is_shared_between_workers(tmp_path, monkeypatch):
+    # Two managers on one state file stand in for two worker processes
+    worker = Flask(__name__)
+    worker.config['JOB_STATE_DB'] = str(tmp_path / "jobs.db")
+    owner, other = jobs.JobManager(), jobs.JobManager()
+    owner.init_app(worker)
+    other.init_app(worker)
+    monkeypatch.setattr(jobs, 'manager', owner) # report() publishes through the module's manager
+
+    release = jobs.threading.Event()
+    def slow():
+        for i in range(100):
+            release.wait(5)
+            jobs.report("work", i, 100)
+            time.sleep(0.01)
+    owner.register('slow', slow)
+    try:
+        job = owner.submit('slow', {})
+        remote = other.get(job.id)
+        assert isinstance(remote, jobs.RemoteJob) and remote.to_dict()["status"] in ('queued', 'running')
+        assert [j.to_dict()["id"] for j in other.list()] == [job.id]
+
+        # Cancelled from the other worker: picked up at a later checkpoint
+        other.cancel(job.id)
+        release.set()
+        job.future.result(5)
+        assert job.status == 'cancelled' and other.get(job.id).to_dict()["status"] == 'cancelled'
+        assert other.get("nope") is None
+    finally:
+        owner.shutdown()
+        other.shutdown()
@@ -0,0 +1,95 @@
+import pytest
+import sys
+import os
+import json
+import logging
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db, Bookmark, SyncBatch
+import metrics
+import logs
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Bookmark(title="Gone", url="https://gone.com", folder_path="Bookmarks Toolbar",
+                                source_browser="Chrome JSON"))
+        db.session.commit()
+
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def sample(text, line_prefix):
+    """Value of the exposition line starting with `line_prefix` (0 if absent)."""
+    for line in text.splitlines():
+        if line.startswith(line_prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0
+
+def scrape(client):
+    res = client.get('/metrics')
+    assert res.status_code == 200 and res.content_type.startswith("text/plain; version=0.0.4")
+    return res.get_data(as_text=True)
+
+def test_sync_records_stages_rows_and_request_metrics(client, tmp_path):
+    before = scrape(client)
+    children = [{"type": "url", "name": f"Site {i}", "url": f"https://site{i}.com"} for i in range(3)]
+    (tmp_path / "Bookmarks").write_text(json.dumps({"roots": {"bookmark_bar": {"children": children}}}))
+
+    batch_id = client.post('/sync_chrome', json={"path": str(tmp_path)}).get_json()["batch_id"]
+    assert client.post(f'/sync/commit/{batch_id}').get_json()["count"] == 4
+
+    with app.app_context():
+        batch = db.session.get(SyncBatch, batch_id)
+        assert batch.row_counts() == {"read": 3, "new": 3, "updated": 0, "deleted": 1, "committed": 4}
+        assert batch.completed_at is not None
+    assert client.get(f'/sync/batch/{batch_id}').get_json()["batch"]["rows"]["committed"] == 4
+
+    text = scrape(client)
+    route = 'http_request_duration_seconds_count{method="POST",route="/sync_chrome",status="200"}'
+    assert sample(text, route) == sample(before, route) + 1
+    assert sample(text, 'http_request_sql_statements_count{route="/sync/commit/<int:batch_id>"}') >= 1
+    assert sample(text, 'http_request_sql_statements_sum{route="/sync_chrome"}') > 0
+    assert sample(text, 'sql_statements_total{engine="writer"}') > sample(before, 'sql_statements_total{engine="writer"}')
+    for stage in ("parse", "diff", "stage", "commit"):
+        key = f'sync_stage_seconds_count{{source="chrome",stage="{stage}"}}'
+        assert sample(text, key) == sample(before, key) + 1
+    for kind, amount in (("read", 3), ("new", 3), ("deleted", 1), ("committed", 4)):
+        key = f'sync_rows_total{{source="chrome",kind="{kind}"}}'
+        assert sample(text, key) == sample(before, key) + amount
+    assert '# TYPE response_cache_bytes gauge' in text
+
+def test_histogram_exposition():
+    histogram = metrics.Histogram("test_latency_seconds", "Test.", ("route",), (0.1, 1))
+    metrics.REGISTRY.remove(histogram)
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, route='/a"b')
+    assert histogram.render()[2:] == [
+        'test_latency_seconds_bucket{route="/a\\"b",le="0.1"} 1',
+        'test_latency_seconds_bucket{route="/a\\"b",le="1.0"} 2',
+        'test_latency_seconds_bucket{route="/a\\"b",le="+Inf"} 3',
+        'test_latency_seconds_sum{route="/a\\"b"} 5.55',
+        'test_latency_seconds_count{route="/a\\"b"} 3',
+    ]
+
+def test_rate_limited_logger():
+    logger = logs.get_logger("test")
+    limit = logs.RateLimit(interval=60, burst=2)
+    records = [logger.makeRecord(logger.name, logging.INFO, __file__, 0, "Processed %s", (i,), None)
+               for i in range(5)]
+    assert [limit.filter(r) for r in records] == [True, True, False, False, False]
+    warning = logger.makeRecord(logger.name, logging.WARNING, __file__, 0, "Processed %s", (9,), None)
+    assert limit.filter(warning)
+
+    limit.interval = 0 # Next window: reports what was dropped
+    record = logger.makeRecord(logger.name, logging.INFO, __file__, 0, "Processed %s", (5,), None)
+    assert limit.filter(record) and record.getMessage() == "Processed 5 (+3 similar suppressed)"
@@ -0,0 +1,50 @@
+import io
+import sys
+import os
+
+sys.path.append(os.path.abspath('prototype'))
+
+from parser import parse_netscape_bookmarks, iter_netscape_bookmarks
+
+EXPORT = """<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<TITLE>Bookmarks</TITLE>
+<H1>Bookmarks</H1>
+<DL><p>
+    <DT><H3 ADD_DATE="1">Dev &amp; Ops</H3>
+    <DL><p>
+        <DT><A HREF="https://a.com/?x=1&amp;y=2" ADD_DATE="1700000000" ICON="data:image/png;base64,AAA" TAGS="work, python">A
+            wrapped title</A>
+        <DT><H3>Inner</H3><DL><p><DT><A HREF="https://inner.com">Inner link</A></DL><p>
+        <DT><a href="https://lower.com" icon="data:l" tags="x">lower</a>
+    </DL><p>
+    <DT><A HREF="https://top.com" LAST_VISIT="5" TAGS="t" ICON="data:t" ADD_DATE="1600000000">Top</A>
+</DL><p>
+"""
+
+def test_parses_folders_attributes_and_irregular_layout():
+    bookmarks = parse_netscape_bookmarks(EXPORT)
+
+    assert [(b['folder'], b['title'], b['url']) for b in bookmarks] == [
+        ("Dev & Ops", "A wrapped title", "https://a.com/?x=1&y=2"),
+        ("Dev & Ops > Inner", "Inner link", "https://inner.com"),
+        ("Dev & Ops", "lower", "https://lower.com"),
+        ("Root", "Top", "https://top.com"),
+    ]
+    assert bookmarks[0]['add_date'] == 1700000000
+    assert bookmarks[0]['tags'] == ("work", "python")
+    assert bookmarks[2]['tags'] == ("x",)
+    assert bookmarks[1]['add_date'] is None and bookmarks[1]['tags'] == ()
+    # Attributes out of the usual order
+    assert bookmarks[3]['add_date'] == 1600000000 and bookmarks[3]['tags'] == ("t",)
+    assert bookmarks[0]['icon'] == "data:image/png;base64,AAA"
+    assert bookmarks[1]['icon'] is None
+    assert (bookmarks[2]['icon'], bookmarks[3]['icon']) == ("data:l", "data:t")
+    # Skipping icons changes nothing else
+    assert parse_netscape_bookmarks(EXPORT, icons=False) == [dict(b, icon=None) for b in bookmarks]
+
+def test_streaming_matches_in_memory_parse():
+    expected = parse_netscape_bookmarks(EXPORT)
+    # Tiny reads force tokens to straddle chunk boundaries
+    for chunk_size in (1, 7, 64):
+        assert list(iter_netscape_bookmarks(io.StringIO(EXPORT), chunk_size=chunk_size)) == expected
+    assert parse_netscape_bookmarks(EXPORT.encode('utf-8')) == expected
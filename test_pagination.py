@@ -0,0 +1,65 @@
+import pytest
+import sys
+import os
+import json
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db, Bookmark, Tag
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    
+    with app.app_context():
+        db.create_all()
+        # Seed 25 bookmarks, every fifth one tagged
+        tag = Tag(name="Every5")
+        for i in range(1, 26):
+            bm = Bookmark(title=f"Page {i}", url=f"https://example.com/{i}", source_browser="test")
+            if i % 5 == 0:
+                bm.tags.append(tag)
+            db.session.add(bm)
+        db.session.commit()
+        
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def test_keyset_pagination(client):
+    seen = []
+    cursor = ''
+    pages = 0
+    while True:
+        res = client.get(f'/api/bookmarks?cursor={cursor}&limit=10')
+        assert res.status_code == 200
+        data = json.loads(res.data)
+        seen.extend(b['id'] for b in data['bookmarks'])
+        pages += 1
+        if not data['next_cursor']:
+            break
+        cursor = data['next_cursor']
+
+    assert pages == 3
+    assert seen == list(range(25, 0, -1))
+
+    # Cursors compose with search
+    data = json.loads(client.get('/api/bookmarks?cursor=20&q=page').data)
+    assert [b['id'] for b in data['bookmarks']] == list(range(19, 0, -1))
+
+    assert client.get('/api/bookmarks?cursor=abc').status_code == 400
+
+def test_ndjson_stream(client):
+    res = client.get('/api/bookmarks?format=ndjson')
+    assert res.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in res.data.decode().splitlines()]
+    assert [r['id'] for r in rows] == list(range(25, 0, -1))
+
+    # Streamed rows have the same shape as the JSON listing
+    listed = json.loads(client.get('/api/bookmarks').data)['bookmarks']
+    assert rows == listed
+    assert rows[0]['tags'] == [{"id": 1, "name": "Every5"}]
@@ -0,0 +1,48 @@
+import sys
+import os
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db
+from firefox_reader import get_firefox_bookmarks
+from chrome_parser import parse_chrome_bookmarks
+from parser import parse_netscape_bookmarks
+import profile_generator
+import bench_suite
+
+def entries(bookmarks):
+    return [(b["title"], b["url"], b["folder"]) for b in bookmarks]
+
+def test_all_formats_read_back_the_same_tree(tmp_path):
+    tree = profile_generator.generate(600, depth=3, seed=1)
+    assert profile_generator.generate(600, depth=3, seed=1) == tree # Deterministic
+    expected = [(b["title"], b["url"], path) for path, b in profile_generator.iter_bookmarks(tree)]
+    assert len(expected) == 600 and max(path.count(" > ") for _, _, path in expected) == 3
+
+    paths = profile_generator.write_profiles(tree, str(tmp_path), seed=1)
+    assert entries(get_firefox_bookmarks(os.path.join(paths["firefox"], "places.sqlite"))["bookmarks"]) == expected
+    assert entries(parse_chrome_bookmarks(os.path.join(paths["chrome"], "Bookmarks"))["bookmarks"]) == expected
+    with open(paths["netscape"], encoding="utf-8") as f:
+        assert entries(parse_netscape_bookmarks(f.read())) == expected
+
+def test_suite_runs_and_compares(tmp_path):
+    try:
+        with app.test_client() as client:
+            results = bench_suite.run_size(client, 300, str(tmp_path), rounds=1)
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    by_name = {r["benchmark"]: r for r in results}
+    assert by_name["read_firefox"]["items"] == by_name["parse_netscape"]["items"] == 300
+    assert by_name["commit_firefox"]["items"] == by_name["sync_firefox"]["items"] > 0
+    assert 0 < by_name["resync_firefox"]["items"] < by_name["sync_firefox"]["items"]
+    assert by_name["list_first_page"]["items"] == 100
+
+    baseline = {"results": results}
+    slower = {"results": [dict(r, seconds=r["seconds"] * (2 if r["benchmark"] == "parse_chrome" else 1))
+                          for r in results]}
+    rows, regressions = bench_suite.compare(baseline, slower)
+    assert len(rows) == len(results) and [r[0] for r in regressions] == ["parse_chrome"]
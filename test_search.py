@@ -7,7 +7,7 @@ os.environ['FLASK_ENV'] = 'testing'
 # Add prototype to path so internal imports in api.py work
 sys.path.append(os.path.abspath('prototype'))
 
-from api import app, db, Bookmark
+from api import app, db, Bookmark, Tag
 import json
 
 @pytest.fixture
@@ -27,32 +27,72 @@ def client():
     with app.test_client() as client:
         yield client
 
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
 def test_search_bookmarks(client):
     # Test 1: Search for "Python" (Should find b1)
     response = client.get('/bookmarks?q=Python')
     data = json.loads(response.data)
-    print(f"DEBUG: Found {len(data['data'])} items for 'Python': {data['data']}")
-    assert len(data['data']) == 1
-    assert data['data'][0]['title'] == "Python Documentation"
+    print(f"DEBUG: Found {len(data['bookmarks'])} items for 'Python': {data['bookmarks']}")
+    assert len(data['bookmarks']) == 1
+    assert data['bookmarks'][0]['title'] == "Python Documentation"
 
     # Test 2: Search for "search" (Should find b2 by Title)
     response = client.get('/bookmarks?q=search')
     data = json.loads(response.data)
-    assert len(data['data']) == 1
-    assert data['data'][0]['title'] == "Google Search"
+    assert len(data['bookmarks']) == 1
+    assert data['bookmarks'][0]['title'] == "Google Search"
 
     # Test 3: Search for "flask" (Should find b3 by URL or Title)
     response = client.get('/bookmarks?q=flask')
     data = json.loads(response.data)
-    assert len(data['data']) == 1
-    assert data['data'][0]['title'] == "Flask Tutorial"
+    assert len(data['bookmarks']) == 1
+    assert data['bookmarks'][0]['title'] == "Flask Tutorial"
 
     # Test 4: Search for "nonexistent" (Should find nothing)
     response = client.get('/bookmarks?q=nonexistent')
     data = json.loads(response.data)
-    assert len(data['data']) == 0
+    assert len(data['bookmarks']) == 0
 
     # Test 5: No Query (Should find all)
     response = client.get('/bookmarks')
     data = json.loads(response.data)
-    assert len(data['data']) == 3
+    assert len(data['bookmarks']) == 3
+
+def test_search_prefix_and_ranking(client):
+    # Partial words match as prefixes
+    response = client.get('/bookmarks?q=Pyth doc')
+    data = json.loads(response.data)
+    assert data['total'] == 1
+    assert data['bookmarks'][0]['title'] == "Python Documentation"
+
+    # Title hits rank above URL-only hits
+    with app.app_context():
+        db.session.add(Bookmark(title="Misc", url="https://example.com/python", source_browser="test"))
+        db.session.commit()
+    response = client.get('/bookmarks?q=python')
+    data = json.loads(response.data)
+    assert data['total'] == 2
+    assert data['bookmarks'][0]['title'] == "Python Documentation"
+
+def test_search_index_follows_writes(client):
+    with app.app_context():
+        bm = db.session.get(Bookmark, 2)
+        bm.title = "Web Engine"
+        bm.folder_path = "Reference > Engines"
+        bm.tags.append(Tag(name="frequent"))
+        db.session.delete(db.session.get(Bookmark, 3))
+        db.session.commit()
+
+    # Updated title and folder are searchable, old title is gone
+    assert json.loads(client.get('/bookmarks?q=engines').data)['total'] == 1
+    assert json.loads(client.get('/bookmarks?q=search').data)['total'] == 0
+
+    # Tag names are indexed
+    data = json.loads(client.get('/bookmarks?q=frequent').data)
+    assert [b['title'] for b in data['bookmarks']] == ["Web Engine"]
+
+    # Deleted bookmarks drop out of the index
+    assert json.loads(client.get('/bookmarks?q=flask').data)['total'] == 0
@@ -0,0 +1,64 @@
+import pytest
+import sys
+import os
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db, Bookmark
+import slow_queries
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Bookmark(title=f"Site {i}", url=f"https://site{i}.com", folder_path="Toolbar",
+                                     source_browser="Firefox") for i in range(5)])
+        db.session.commit()
+
+    recorder = slow_queries.recorder
+    recorder.configure(0.000001, 3, 500) # Record everything; 3+ rows is "large"
+    recorder.reset()
+    with app.test_client() as client:
+        yield client
+    recorder.configure(app.config['SLOW_QUERY_MS'], app.config['SLOW_QUERY_LARGE_TABLE_ROWS'],
+                       app.config['SLOW_QUERY_MAX_FINGERPRINTS'])
+    recorder.reset()
+    recorder.table_rows.clear()
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def test_fingerprints_collapse_literals_and_lists():
+    a = slow_queries.normalize("SELECT * FROM t WHERE id IN (?, ?, ?) AND title = 'x'  AND n > 10")
+    b = slow_queries.normalize("SELECT *\n FROM t WHERE id IN (?) AND title = 'it''s' AND n > 2.5 -- note")
+    assert a == b == "SELECT * FROM t WHERE id IN (...) AND title = ? AND n > ?"
+    assert slow_queries.normalize("INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)") == \
+        "INSERT INTO t (a, b) VALUES (?, ?), ..."
+    assert slow_queries.aliases("SELECT * FROM bookmarks AS b JOIN bookmark_history h ON h.id = b.id WHERE 1") == \
+        {"bookmarks": "bookmarks", "b": "bookmarks", "bookmark_history": "bookmark_history", "h": "bookmark_history"}
+
+def test_scans_of_large_tables_are_flagged(client):
+    with app.app_context():
+        for term in ("%Site 1%", "%Site 2%"):
+            db.session.execute(db.text("SELECT b.id FROM bookmarks b WHERE b.title LIKE :term"), {"term": term})
+        db.session.execute(db.text("SELECT id FROM bookmarks WHERE id = 1"))
+
+    res = client.get('/admin/slow_queries?flagged=1&sort=avg_ms')
+    body = res.get_json()
+    assert res.status_code == 200 and body["enabled"]
+    like = [q for q in body["queries"] if "LIKE" in q["statement"]]
+    assert len(like) == 1 and like[0]["count"] == 2
+    assert like[0]["scans"] == [{"table": "bookmarks", "rows": 5, "detail": "SCAN b"}]
+    assert not any("WHERE id = ?" in q["statement"] for q in body["queries"]) # Primary key search
+
+    everything = client.get('/admin/slow_queries?limit=1000').get_json()["queries"]
+    lookup = next(q for q in everything if q["statement"] == "SELECT id FROM bookmarks WHERE id = ?")
+    assert lookup["plan"] and lookup["plan"][0].startswith("SEARCH") and not lookup["scans"]
+
+    assert client.get('/admin/slow_queries?sort=bogus').status_code == 400
+    assert client.delete('/admin/slow_queries').status_code == 200
+    assert slow_queries.recorder.report() == []
@@ -0,0 +1,137 @@
+import pytest
+import sys
+import os
+import threading
+import time
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeout
+from api import db, Tag
+import storage
+
+def make_wal_app(path, pool_timeout=10):
+    # A file-backed app with the production storage profile
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}",
+        SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 30}, 'pool_size': 1, 'max_overflow': 0,
+                                   'pool_timeout': pool_timeout},
+        STORAGE_PROFILE='wal', SQLITE_READERS=2, SQLITE_CACHE_MB=8, SQLITE_MMAP_MB=16
+    )
+    db.init_app(app)
+    storage.init_app(app)
+    return app
+
+def dispose(app):
+    with app.app_context():
+        db.engine.dispose()
+    storage.reader(app).dispose()
+
+@pytest.fixture
+def wal_app(tmp_path):
+    app = make_wal_app(tmp_path / 'wal.db')
+    with app.app_context():
+        db.create_all()
+    yield app
+    dispose(app)
+
+def count_tags():
+    return db.session.execute(db.select(db.func.count()).select_from(Tag)).scalar()
+
+def test_reads_use_the_read_only_pool(wal_app):
+    with wal_app.app_context():
+        connection = db.session.connection()
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+        assert connection.exec_driver_sql("PRAGMA temp_store").scalar() == 2
+
+    with wal_app.test_request_context('/tags', method='GET'):
+        wal_app.preprocess_request()
+        assert db.session.get_bind() is storage.reader(wal_app)
+        assert db.session.connection().exec_driver_sql("PRAGMA cache_size").scalar() == -8 * 1024
+        with pytest.raises(OperationalError, match="readonly"):
+            db.session.execute(db.text("INSERT INTO tags (name) VALUES ('nope')"))
+
+    with wal_app.test_request_context('/tags', method='POST'):
+        wal_app.preprocess_request()
+        assert db.session.get_bind() is db.engine
+
+def test_writers_queue_while_readers_proceed(wal_app):
+    events = []
+    holding = threading.Event()
+
+    def write(name, hold=0):
+        with wal_app.test_request_context('/tags', method='POST'):
+            wal_app.preprocess_request()
+            db.session.add(Tag(name=name))
+            db.session.flush()
+            holding.set()
+            time.sleep(hold)
+            db.session.commit()
+            events.append(f"{name} committed")
+
+    first = threading.Thread(target=write, args=("first", 0.3))
+    first.start()
+    holding.wait(5)
+    second = threading.Thread(target=write, args=("second",))
+    second.start()
+
+    # While the first write transaction is open, reads are served (without its row)
+    with wal_app.test_request_context('/tags', method='GET'):
+        wal_app.preprocess_request()
+        assert count_tags() == 0
+        events.append("read")
+
+    first.join(5)
+    second.join(5)
+    assert events == ["read", "first committed", "second committed"]
+    with wal_app.app_context():
+        assert count_tags() == 2
+
+def test_job_scans_read_without_the_writer(wal_app):
+    with wal_app.app_context():
+        with storage.read_only():
+            assert db.session.get_bind() is storage.reader(wal_app)
+            assert count_tags() == 0 # A read transaction is open on a reader connection
+
+            def write():
+                with wal_app.app_context():
+                    db.session.add(Tag(name="during scan"))
+                    db.session.commit()
+            # The one writer connection is free for others meanwhile
+            writer = threading.Thread(target=write)
+            writer.start()
+            writer.join(5)
+        assert db.session.get_bind() is db.engine
+        assert count_tags() == 1
+
+@pytest.mark.skipif(storage.fcntl is None, reason="the writer lock needs fcntl")
+def test_writer_lock_serializes_workers(wal_app, tmp_path):
+    # A second app on the same file stands in for another serve.py worker:
+    # its own one-connection pool, the same writer lock
+    other = make_wal_app(tmp_path / 'wal.db', pool_timeout=0.2)
+
+    def write_other(name):
+        with other.test_request_context('/tags', method='POST'):
+            other.preprocess_request()
+            db.session.add(Tag(name=name))
+            db.session.commit()
+
+    try:
+        with wal_app.test_request_context('/tags', method='POST'):
+            wal_app.preprocess_request()
+            db.session.add(Tag(name="first"))
+            db.session.flush()
+            # The first worker's write transaction is open: the other waits, then gives up
+            with pytest.raises(PoolTimeout, match="Writer lock"):
+                write_other("blocked")
+            db.session.commit()
+
+        write_other("second") # Released at commit
+        with wal_app.app_context():
+            assert sorted(db.session.execute(db.select(Tag.name)).scalars()) == ["first", "second"]
+    finally:
+        dispose(other)
@@ -0,0 +1,92 @@
+import pytest
+import sys
+import os
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from sqlalchemy import inspect
+from api import app, db, Bookmark, Tag
+import tag_facets
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        py, web, doc = Tag(name="f-python"), Tag(name="f-web"), Tag(name="f-docs")
+        db.session.add_all([
+            Bookmark(title="Flask", url="https://flask.example", tags=[py, web, doc]),
+            Bookmark(title="Django", url="https://django.example", tags=[py, web]),
+            Bookmark(title="NumPy", url="https://numpy.example", tags=[py]),
+            Bookmark(title="MDN", url="https://mdn.example", tags=[web, doc]),
+        ])
+        db.session.commit()
+
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def tag_ids(*names):
+    with app.app_context():
+        ids = {t.name: t.id for t in Tag.query.all()}
+    return [ids[name] for name in names]
+
+def titles(data):
+    return sorted(b['title'] for b in data['bookmarks'])
+
+def facet_map(data, ids):
+    return {f['name']: f['count'] for f in data['facets'] if f['id'] in ids}
+
+def test_filter_all_and_any_with_facets(client):
+    py, web, doc = ids = tag_ids("f-python", "f-web", "f-docs")
+
+    data = client.get(f'/api/bookmarks?tags={py},{web}&facets=1').get_json()
+    assert titles(data) == ["Django", "Flask"] and data['total'] == 2
+    assert facet_map(data, ids) == {"f-python": 2, "f-web": 2, "f-docs": 1}
+
+    data = client.get(f'/api/bookmarks?tags={py},{doc}&tag_mode=any&facets=1&limit=1').get_json()
+    assert data['total'] == 4 and len(data['bookmarks']) == 1
+    # Facets cover the whole result set, not just the page
+    assert facet_map(data, ids) == {"f-python": 3, "f-web": 3, "f-docs": 2}
+
+    data = client.get(f'/api/bookmarks?tags={doc}&q=flask&facets=1').get_json()
+    assert titles(data) == ["Flask"] and data['total'] == 1
+
+    data = client.get(f'/api/bookmarks?tags={web}&cursor=&limit=10').get_json()
+    assert titles(data) == ["Django", "Flask", "MDN"]
+
+    assert client.get('/api/bookmarks?tags=abc').status_code == 400
+
+def test_tag_counts_follow_every_write_path(client):
+    ids = tag_ids("f-python", "f-web", "f-docs")
+
+    def counts():
+        return {t['name']: t['count'] for t in client.get('/tags').get_json()['data'] if t['id'] in ids}
+
+    assert counts() == {"f-python": 3, "f-web": 3, "f-docs": 2}
+
+    with app.app_context():
+        numpy = Bookmark.query.filter_by(url="https://numpy.example").one().id
+    client.post(f'/bookmarks/{numpy}/tags', json={"name": "f-docs"})
+    client.delete(f'/bookmarks/{numpy}/tags/{ids[0]}')
+    assert counts() == {"f-python": 2, "f-web": 3, "f-docs": 3}
+
+    with app.app_context():
+        db.session.delete(Bookmark.query.filter_by(url="https://flask.example").one())
+        db.session.commit()
+    assert counts() == {"f-python": 1, "f-web": 2, "f-docs": 2}
+
+    with app.app_context():
+        tag_facets.rebuild(db.session.connection())
+        db.session.commit()
+    assert counts() == {"f-python": 1, "f-web": 2, "f-docs": 2}
+
+def test_loading_tags_does_not_load_bookmarks(client):
+    with app.app_context():
+        tags = Tag.query.all()
+        assert tags and all('bookmarks' not in inspect(t).dict for t in tags)
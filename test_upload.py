@@ -0,0 +1,89 @@
+import pytest
+import sys
+import os
+import io
+import json
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db, Bookmark
+import bulk_upload
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Bookmark(title="Existing", url="https://existing.com", source_browser="Firefox"))
+        db.session.commit()
+
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def upload(client, name, content):
+    data = {"file": (io.BytesIO(content.encode('utf-8')), name)}
+    return client.post('/upload_bulk', data=data, content_type='multipart/form-data')
+
+def test_json_upload_batches_and_dedupes(client, monkeypatch):
+    monkeypatch.setattr(bulk_upload, 'UPLOAD_BATCH', 2)
+    items = [
+        {"url": "https://a.com", "title": "A", "folder": "F"},
+        "https://existing.com",
+        {"url": "https://a.com", "title": "A again"},
+        "https://b.com",
+        {"title": "No URL"},
+    ]
+    res = upload(client, 'export.json', json.dumps({"version": 1, "bookmarks": items}))
+    data = res.get_json()
+
+    assert res.status_code == 200
+    assert data['count'] == 2
+    assert data['received'] == 4 and data['duplicates'] == 2
+    assert data['batches'] == [
+        {"batch": 1, "received": 2, "inserted": 1},
+        {"batch": 2, "received": 2, "inserted": 1},
+    ]
+    with app.app_context():
+        rows = {b.url: b for b in Bookmark.query.filter(Bookmark.url.like("https://%")).all()}
+        assert set(rows) == {"https://existing.com", "https://a.com", "https://b.com"}
+        assert rows["https://a.com"].folder_path == "F"
+        assert rows["https://b.com"].title == "Imported Bookmark"
+        assert rows["https://b.com"].source_browser == "Upload: export.json"
+        assert rows["https://b.com"].version == 1
+
+def test_html_and_chrome_uploads(client):
+    html = '<DL><p><DT><H3>Dev</H3><DL><p><DT><A HREF="https://mdn.io">MDN</A></DL><p></DL>'
+    assert upload(client, 'bookmarks.html', html).get_json()['count'] == 1
+
+    chrome = {"checksum": "x", "roots": {"bookmark_bar": {"children": [
+        {"name": "C", "type": "url", "url": "https://c.com"},
+        {"name": "MDN", "type": "url", "url": "https://mdn.io"},
+    ], "name": "Bookmarks bar", "type": "folder"}}, "version": 1}
+    data = upload(client, 'Bookmarks', json.dumps(chrome)).get_json()
+    assert (data['count'], data['duplicates']) == (1, 1)
+
+    # Bulk-inserted rows are indexed for search too
+    found = client.get('/bookmarks?q=bookmarks toolbar').get_json()['bookmarks']
+    assert [b['url'] for b in found] == ["https://c.com"]
+
+    with app.app_context():
+        assert Bookmark.query.filter_by(url="https://mdn.io").one().folder_path == "Dev"
+        assert Bookmark.query.filter_by(url="https://c.com").one().folder_path == "Bookmarks Toolbar"
+
+def test_malformed_upload_keeps_committed_batches(client, monkeypatch):
+    monkeypatch.setattr(bulk_upload, 'UPLOAD_BATCH', 2)
+    content = '["https://one.com", "https://two.com", "https://three.com", {"url": '
+    res = upload(client, 'broken.json', content)
+    data = res.get_json()
+
+    assert res.status_code == 400
+    assert data['inserted'] == 2 and len(data['batches']) == 1
+    with app.app_context():
+        assert Bookmark.query.filter_by(url="https://two.com").count() == 1
+        assert Bookmark.query.filter_by(url="https://three.com").count() == 0
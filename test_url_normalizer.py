@@ -0,0 +1,82 @@
+import pytest
+import sys
+import os
+import json
+import sqlite3
+
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.append(os.path.abspath('prototype'))
+
+from api import app, db, Bookmark, PendingChange
+from url_normalizer import normalize_url
+import migrations
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Bookmark(title="Example", url="https://example.com/page", folder_path="Bookmarks Toolbar",
+                                source_browser="Chrome JSON"))
+        db.session.commit()
+
+    with app.test_client() as client:
+        yield client
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def test_normalize_url_folds_common_variants():
+    variants = [
+        "https://example.com/page",
+        "http://example.com/page/",
+        "HTTPS://Example.COM:443/page",
+        "http://example.com:80/page?utm_source=news&utm_medium=email",
+        "https://example.com/page?fbclid=abc#",
+    ]
+    assert {normalize_url(u) for u in variants} == {"https://example.com/page"}
+    assert normalize_url("https://x.com/?b=2&a=1&gclid=z") == "https://x.com/?a=1&b=2"
+    assert normalize_url("https://x.com:8080/a#top") == "https://x.com:8080/a#top"
+    assert normalize_url(" place:parent=toolbar ") == "place:parent=toolbar"
+
+def test_sync_and_lookup_match_url_variants(client, tmp_path):
+    with app.app_context():
+        assert Bookmark.query.one().normalized_url == "https://example.com/page"
+
+    bookmarks = {"roots": {"bookmark_bar": {"name": "Bookmarks bar", "children": [
+        {"type": "url", "name": "Example", "url": "http://example.com/page/?utm_campaign=x"},
+        {"type": "url", "name": "Other", "url": "https://other.com"},
+    ]}}}
+    (tmp_path / "Bookmarks").write_text(json.dumps(bookmarks))
+    data = client.post('/sync_chrome', json={"path": str(tmp_path)}).get_json()
+    assert (data['counts']['new'], data['counts']['updated'], data['counts']['to_delete']) == (1, 0, 0)
+
+    # Rows inserted by the bulk commit path get their normalized_url from the column default
+    client.post(f"/sync/commit/{data['batch_id']}", json={})
+    res = client.get('/bookmarks/lookup?url=HTTP://OTHER.COM/')
+    found = res.get_json()
+    assert found['normalized_url'] == "https://other.com/"
+    assert [b['url'] for b in found['bookmarks']] == ["https://other.com"]
+    assert client.get('/bookmarks/lookup').status_code == 400
+
+def test_migration_adds_and_backfills_normalized_url(tmp_path):
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE bookmarks (id INTEGER PRIMARY KEY, url VARCHAR NOT NULL, title VARCHAR)")
+    conn.executemany("INSERT INTO bookmarks (url, title) VALUES (?, ?)",
+                     [("http://a.com/x/", "A"), ("https://b.com", "B")])
+    conn.commit()
+    conn.close()
+
+    engine = db.create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+        migrations.upgrade(connection) # Idempotent
+        rows = connection.exec_driver_sql("SELECT url, normalized_url FROM bookmarks ORDER BY id").all()
+        indexes = [row[1] for row in connection.exec_driver_sql("PRAGMA index_list(bookmarks)")]
+    engine.dispose()
+
+    assert rows == [("http://a.com/x/", "https://a.com/x"), ("https://b.com", "https://b.com/")]
+    assert "ix_bookmarks_normalized_url" in indexes